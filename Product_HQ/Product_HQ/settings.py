@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -21,6 +22,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.QueryInstrumentationMiddleware',
+    'product.routers.ReplicaReadMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,12 +53,73 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Product_HQ.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# База данных задаётся переменными окружения. По умолчанию используется
+# SQLite; при DB_ENGINE=django.db.backends.postgresql — PostgreSQL
+# с постоянными соединениями (DB_CONN_MAX_AGE, секунды) и проверкой
+# их работоспособности перед переиспользованием (DB_CONN_HEALTH_CHECKS).
+# При DB_POOL=1 соединения PostgreSQL берутся из пула процесса
+# (product.backends.postgresql_pool, нужен psycopg_pool), что полезно
+# под ASGI-сервером. Если задан DB_REPLICA_HOST, GET-запросы
+# к представлениям из DATABASE_REPLICA_VIEWS читают данные с реплики.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+DB_POOL = os.environ.get('DB_POOL') == '1'
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': (
+                'product.backends.postgresql_pool' if DB_POOL else DB_ENGINE
+            ),
+            'NAME': os.environ.get('DB_NAME', 'product_hq'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # С пулом соединения возвращаются в пул после каждого запроса.
+            'CONN_MAX_AGE': (
+                0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60))
+            ),
+            'CONN_HEALTH_CHECKS': (
+                os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1'
+            ),
+            'OPTIONS': {},
+        }
+    }
+    if DB_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        }
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['DB_REPLICA_HOST'],
+            'PORT': os.environ.get('DB_REPLICA_PORT', ''),
+            'OPTIONS': {**DATABASES['default']['OPTIONS']},
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['product.routers.ReplicaRouter']
+
+# Представления (имена URL), GET-запросы к которым читают данные
+# с реплики (product.routers.ReplicaReadMiddleware). Эндпоинты данных
+# пользователей (api:users и api:async-users) сюда не входят: они
+# заполняют кэши, общие с кодом, читающим основную базу данных,
+# и вычисляют ETag, поэтому данные отстающей реплики остались бы в кэше
+# под новым ETag.
+DATABASE_REPLICA_VIEWS = [
+    'api:main-statistics',
+    'api:async-main-statistics',
+    'api:statistics-timeseries',
+]
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -88,3 +152,94 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # если выше или равно указанного значения,
 # то будет установлен статус True, иначе False.
 PERCENTAGE_STATUS_TRUE = 0.8
+
+# Кэш сериализованных данных пользователей (api.cache.user_payload_cache).
+# Записи хранятся по ETag, поэтому изменения из других процессов видны
+# сразу; время жизни ограничивает память под устаревшие записи. Для кэша,
+# общего для нескольких процессов, используйте бэкенд
+# 'product.cache.DjangoCacheBackend' с параметрами alias и timeout.
+USER_PAYLOAD_CACHE = {
+    'BACKEND': 'product.cache.LRUCacheBackend',
+    'OPTIONS': {
+        'max_entries': 1024,
+        'timeout': 60,
+    },
+}
+
+REST_FRAMEWORK = {
+    # FastJSONRenderer использует orjson, если он установлен.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Бюджеты SQL-запросов эндпоинтов по имени URL
+# (api.instrumentation). При превышении бюджета в журнал записывается
+# предупреждение ('warn') или вызывается исключение ('raise'), например
+# в тестах.
+API_QUERY_BUDGETS = {
+    'api:users': 8,
+    'api:main-statistics': 2,
+    'api:async-users': 7,
+    'api:async-main-statistics': 2,
+    'api:statistics-timeseries': 3,
+}
+API_QUERY_BUDGET_ACTION = 'warn'
+
+# Реестр метрик (product.metrics), выводимых по адресу /metrics.
+# Для нескольких процессов WSGI используйте
+# 'product.metrics.FileMetricsBackend' с OPTIONS {'directory': ...}.
+METRICS = {
+    'BACKEND': 'product.metrics.LocalMetricsBackend',
+}
+
+# Быстрые сериализаторы данных пользователя (api.fast_serializers)
+# вместо эталонных сериализаторов rest_framework.
+API_FAST_SERIALIZERS = True
+
+# Каталог сериализованных уроков продуктов (api.catalogue). Записи
+# хранятся по дате изменения продукта, поэтому изменения уроков из других
+# процессов видны сразу; время жизни ограничивает память под устаревшие
+# записи.
+PRODUCT_CATALOGUE_CACHE = {
+    'BACKEND': 'product.cache.LRUCacheBackend',
+    'OPTIONS': {
+        'max_entries': 4096,
+        'timeout': 300,
+    },
+}
+
+# Максимальное количество событий в одном запросе к эндпоинтам записи
+# прогресса просмотра (statistics/bulk/, statistics/heartbeat/).
+PROGRESS_EVENTS_MAX_BATCH = 1000
+
+# Буфер отложенной записи прогресса просмотра (product.buffer).
+PROGRESS_BUFFER = {
+    'max_keys': 100000,
+    'flush_size': 1000,
+    'flush_interval': 1.0,
+}
+
+# Агрегация событий просмотра (product.rollups): количество событий
+# за один запуск и задержка в секундах, после которой записанные события
+# агрегируются.
+WATCH_ROLLUP = {
+    'batch_size': 10000,
+    'settle_seconds': 60,
+}
+
+# Максимальное количество интервалов во временном ряде просмотров.
+WATCH_TIMESERIES_MAX_POINTS = 744
+
+# Индекс прав доступа (product.entitlements.access_index). Время жизни
+# записей ограничивает задержку, с которой процесс видит изменения
+# доступов из других процессов; для общего кэша используйте
+# 'product.cache.DjangoCacheBackend'.
+ACCESS_INDEX_CACHE = {
+    'BACKEND': 'product.cache.LRUCacheBackend',
+    'OPTIONS': {
+        'max_entries': 10000,
+        'timeout': 60,
+    },
+}
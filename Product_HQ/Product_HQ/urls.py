@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from product.metrics import metrics_view
+
 urlpatterns = [
 
     path(
@@ -11,5 +13,11 @@ urlpatterns = [
     path(
         'api/v1/',
         include('api.urls', namespace='api'),
-    )
+    ),
+
+    path(
+        'metrics',
+        metrics_view,
+        name='metrics',
+    ),
 ]
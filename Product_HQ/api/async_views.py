@@ -0,0 +1,213 @@
+"""
+Модуль, содержащий асинхронные представления API для работы с продуктами
+и пользователями.
+
+Представления повторяют представления по умолчанию модуля api.views,
+но обращаются к базе данных через асинхронный ORM и не занимают поток
+на время обработки запроса. Независимые запросы собираются
+в asyncio.gather, но в Django 4.2 асинхронный ORM выполняет их через
+sync_to_async(thread_sensitive=True), то есть по очереди в одном общем
+потоке: время ответа не уменьшается, выигрыш — в количестве
+одновременно обслуживаемых запросов. Параметры запроса синхронных
+эндпоинтов (пагинация, выбор полей, потоковая отдача) не
+поддерживаются: такие запросы получают ответ 400. APIView
+из rest_framework не поддерживает асинхронные обработчики, поэтому
+представления наследуются от django.views.View, а ответ формируется
+FastJSONRenderer.
+"""
+
+import asyncio
+
+from django.http import HttpResponse
+from django.views import View
+
+from rest_framework import status
+
+from api.cache import user_payload_cache
+from api.conditional import aget_validators, not_modified, set_validators
+from api.instrumentation import measure
+from api.loaders import alist, aload_user_products
+from api.renderers import encode_json
+from api.serializers import MainProductSerializer, UserSerializer
+from api.statistics import annotate_main_statistics
+from product.models import Access, Product, User
+from product.stats import aget_platform_user_count
+
+# Параметры запроса синхронных эндпоинтов, не поддерживаемые
+# асинхронными.
+USER_UNSUPPORTED_PARAMS = ('limit', 'cursor', 'fields', 'omit')
+MAIN_STATISTICS_UNSUPPORTED_PARAMS = ('stream',)
+
+
+def render_json(data, status_code=status.HTTP_200_OK):
+    """
+    Формирует HTTP-ответ с данными в формате JSON.
+    - data: Данные для вывода.
+    - status_code: Код статуса ответа.
+    """
+    return HttpResponse(
+        encode_json(data),
+        content_type='application/json',
+        status=status_code,
+    )
+
+
+def not_found():
+    """
+    Возвращает ответ 404 в формате ответа rest_framework.
+    """
+    return render_json({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+
+
+def unsupported_params(request, params):
+    """
+    Возвращает ответ 400, если запрос содержит параметры, которые
+    асинхронное представление не поддерживает, иначе None.
+    - request: Объект запроса HTTP.
+    - params: Неподдерживаемые параметры.
+    """
+    found = [param for param in params if param in request.GET]
+    if not found:
+        return None
+    return render_json(
+        {
+            param: ['Параметр не поддерживается асинхронным эндпоинтом, '
+                    'используйте синхронный.']
+            for param in found
+        },
+        status.HTTP_400_BAD_REQUEST,
+    )
+
+
+async def _aget_or_none(queryset, **kwargs):
+    """
+    Асинхронно получает объект выборки или None, если он не найден.
+    """
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        return None
+
+
+async def aserialize_user_products(user, product=None):
+    """
+    Сериализует данные пользователя в представлении по умолчанию.
+    - user: Объект пользователя.
+    - product: Объект продукта; если указан, выводится только он.
+    Возвращает данные пользователя.
+    """
+    loaded = await aload_user_products(user, product=product)
+    with measure('serialize'):
+        return UserSerializer(
+            user,
+            context={'product': product, 'loaded': loaded},
+        ).data
+
+
+class AsyncUserProductsListView(View):
+    """
+    Асинхронное представление для просмотра списка продуктов пользователя.
+    """
+    async def get(self, request, user_slug):
+        """
+        Обработчик GET-запроса для получения списка продуктов пользователя.
+        - user_slug: Строка - Слаг пользователя.
+        Возвращает данные пользователя в виде HTTP-ответа или ответ 400
+        при параметрах из USER_UNSUPPORTED_PARAMS.
+        """
+        response = unsupported_params(request, USER_UNSUPPORTED_PARAMS)
+        if response is not None:
+            return response
+        user = await _aget_or_none(User.objects, username=user_slug)
+        if user is None:
+            return not_found()
+        validators = await aget_validators(user)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        data = await user_payload_cache.aget_or_build(
+            validators[0],
+            lambda: aserialize_user_products(user),
+        )
+        return set_validators(render_json(data), validators)
+
+
+class AsyncUserProductsDetailView(View):
+    """
+    Асинхронное представление для просмотра деталей продукта пользователя.
+    """
+    async def get(self, request, user_slug, product_slug):
+        """
+        Обработчик GET-запроса для получения деталей продукта пользователя.
+        - user_slug: Строка — Слаг пользователя.
+        - product_slug: Строка — Слаг продукта.
+        Возвращает данные пользователя в виде HTTP-ответа или ответ 400
+        при параметрах из USER_UNSUPPORTED_PARAMS. Пользователь, продукт
+        и доступ к продукту запрашиваются независимо, одним
+        asyncio.gather.
+        """
+        response = unsupported_params(request, USER_UNSUPPORTED_PARAMS)
+        if response is not None:
+            return response
+        user, product, has_access = await asyncio.gather(
+            _aget_or_none(User.objects, username=user_slug),
+            _aget_or_none(
+                Product.objects.select_related('owner'),
+                slug=product_slug,
+            ),
+            Access.objects.filter(
+                user__username=user_slug,
+                product__slug=product_slug,
+                access_granted=True,
+            ).aexists(),
+        )
+        if user is None or product is None:
+            return not_found()
+        if not has_access:
+            return render_json(
+                {
+                    'detail': 'У данного пользователя нет доступа '
+                              'к данному продукту',
+                },
+                status.HTTP_403_FORBIDDEN,
+            )
+        validators = await aget_validators(user, product=product)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        data = await user_payload_cache.aget_or_build(
+            validators[0],
+            lambda: aserialize_user_products(user, product=product),
+        )
+        return set_validators(render_json(data), validators)
+
+
+class AsyncMainStatisticsView(View):
+    """
+    Асинхронное представление для получения основной статистики.
+    """
+    async def get(self, request):
+        """
+        Обработчик GET-запроса для получения основной статистики.
+        - request: Объект запроса HTTP.
+        Возвращает данные основной статистики в виде HTTP-ответа или
+        ответ 400 при параметрах из MAIN_STATISTICS_UNSUPPORTED_PARAMS.
+        Статистика продуктов и количество пользователей запрашиваются
+        независимо, одним asyncio.gather.
+        """
+        response = unsupported_params(
+            request, MAIN_STATISTICS_UNSUPPORTED_PARAMS)
+        if response is not None:
+            return response
+        products, num_users = await asyncio.gather(
+            alist(annotate_main_statistics(Product.objects.all())),
+            aget_platform_user_count(),
+        )
+        serializer = MainProductSerializer(
+            products,
+            many=True,
+            context={'num_users': num_users},
+        )
+        with measure('serialize'):
+            data = serializer.data
+        return render_json(data)
@@ -0,0 +1,330 @@
+"""
+Модуль, содержащий нагрузочные измерения эндпоинтов API.
+
+Для каждого эндпоинта измеряются задержки (p50, p99, среднее),
+пропускная способность и количество SQL-запросов на запрос. Запросы
+выполняются через тестовый клиент Django, а также через локальный
+WSGI-сервер и, если установлен uvicorn, локальный ASGI-сервер.
+Отдельно сравниваются эталонные и быстрые сериализаторы, а также
+рендереры JSON.
+"""
+
+import json
+import random
+import statistics as pystatistics
+import threading
+import time
+import urllib.request
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+
+from api.cache import user_payload_cache
+from api.renderers import FastJSONRenderer
+from api.serializers import MainProductSerializer
+from api.statistics import get_main_statistics
+from api.views import serialize_user_products
+from product.models import Access, Product, User
+
+
+def percentile(values, fraction):
+    """
+    Вычисляет перцентиль методом ближайшего ранга.
+    - values: Отсортированный список значений.
+    - fraction: Доля, например 0.99.
+    """
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def summarize(latencies, elapsed, queries=None):
+    """
+    Сводит результаты измерений одного эндпоинта.
+    - latencies: Задержки запросов в секундах.
+    - elapsed: Общее время измерения в секундах.
+    - queries: Количество SQL-запросов на каждый запрос или None.
+    Возвращает словарь показателей; задержки — в миллисекундах.
+    """
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': pystatistics.fmean(latencies) * 1000 if latencies else 0,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+    }
+    if queries:
+        result['queries_mean'] = pystatistics.fmean(queries)
+        result['queries_max'] = max(queries)
+    return result
+
+
+def sample_urls(requests, seed=0):
+    """
+    Выбирает адреса для измерения каждого эндпоинта, синхронного
+    и асинхронного.
+    - requests: Количество адресов на эндпоинт.
+    - seed: Начальное значение генератора случайных чисел.
+    Возвращает словарь {имя эндпоинта: список адресов}.
+    """
+    rnd = random.Random(seed)
+    accesses = list(
+        Access.objects.filter(access_granted=True).order_by('pk').values_list(
+            'user__username', 'product__slug')[:10000]
+    )
+    usernames = [username for username, _ in accesses] or list(
+        User.objects.values_list('username', flat=True)[:10000])
+    urls = {}
+    for prefix in ('', 'async-'):
+        urls[f'{prefix}users'] = [
+            reverse(f'api:{prefix}users', args=[rnd.choice(usernames)])
+            for _ in range(requests)
+        ] if usernames else []
+        urls[f'{prefix}users-products'] = [
+            reverse(f'api:{prefix}users', args=rnd.choice(accesses))
+            for _ in range(requests)
+        ] if accesses else []
+        urls[f'{prefix}main-statistics'] = [
+            reverse(f'api:{prefix}main-statistics')] * requests
+    return urls
+
+
+def run_test_client(urls, cold=False):
+    """
+    Измеряет эндпоинты через тестовый клиент Django.
+    - urls: Словарь {имя эндпоинта: список адресов}.
+    - cold: Очищать кэш данных пользователей перед каждым запросом.
+    Возвращает словарь {имя эндпоинта: показатели}.
+    """
+    client = Client()
+    results = {}
+    for name, endpoint_urls in urls.items():
+        latencies = []
+        queries = []
+        started = time.perf_counter()
+        for url in endpoint_urls:
+            if cold:
+                user_payload_cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - request_started)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f'{url}: статус ответа {response.status_code}')
+            queries.append(len(captured))
+        results[name] = summarize(
+            latencies, time.perf_counter() - started, queries)
+    return results
+
+
+def run_serializers(requests, seed=0):
+    """
+    Сравнивает эталонные и быстрые сериализаторы данных пользователя
+    на одних и тех же пользователях и продуктах без кэша данных
+    пользователей. Проверяет, что оба пути дают одинаковые данные.
+    - requests: Количество сериализаций для каждого пути.
+    - seed: Начальное значение генератора случайных чисел.
+    Возвращает словарь {путь: показатели}.
+    """
+    rnd = random.Random(seed)
+    accesses = list(
+        Access.objects.filter(access_granted=True).order_by('pk').values_list(
+            'user_id', 'product_id')[:10000]
+    )
+    if not accesses:
+        return {}
+    users = User.objects.in_bulk({user_id for user_id, _ in accesses})
+    products = Product.objects.in_bulk(
+        {product_id for _, product_id in accesses})
+    samples = [
+        (users[user_id], products[product_id] if rnd.random() < 0.5 else None)
+        for user_id, product_id in (
+            rnd.choice(accesses) for _ in range(requests))
+    ]
+
+    results = {}
+    outputs = {}
+    for name, fast in (('reference', False), ('fast', True)):
+        latencies = []
+        outputs[name] = []
+        with override_settings(API_FAST_SERIALIZERS=fast):
+            started = time.perf_counter()
+            for user, product in samples:
+                request_started = time.perf_counter()
+                outputs[name].append(json.dumps(
+                    serialize_user_products(user, product=product),
+                    ensure_ascii=False,
+                ))
+                latencies.append(time.perf_counter() - request_started)
+            results[name] = summarize(
+                latencies, time.perf_counter() - started)
+    if outputs['reference'] != outputs['fast']:
+        raise RuntimeError('Быстрые сериализаторы дают другие данные')
+    return results
+
+
+def run_renderers(requests, repeat=20, seed=0):
+    """
+    Сравнивает JSONRenderer REST framework и FastJSONRenderer на данных
+    пользователей, продуктов пользователей и основной статистики.
+    Проверяет, что оба рендерера дают одинаковый JSON.
+    - requests: Количество данных каждого вида.
+    - repeat: Количество кодирований каждых данных.
+    - seed: Начальное значение генератора случайных чисел.
+    Возвращает словарь {вид данных: {рендерер: показатели}}.
+    """
+    rnd = random.Random(seed)
+    accesses = list(
+        Access.objects.filter(access_granted=True).order_by('pk').values_list(
+            'user_id', 'product_id')[:10000]
+    )
+    products, num_users = get_main_statistics()
+    payloads = {
+        'main-statistics': [MainProductSerializer(
+            products, many=True, context={'num_users': num_users}).data],
+    }
+    if accesses:
+        samples = [rnd.choice(accesses) for _ in range(requests)]
+        users = User.objects.in_bulk({user_id for user_id, _ in samples})
+        products = Product.objects.in_bulk(
+            {product_id for _, product_id in samples})
+        payloads['users'] = [
+            serialize_user_products(users[user_id])
+            for user_id, _ in samples
+        ]
+        payloads['users-products'] = [
+            serialize_user_products(
+                users[user_id], product=products[product_id])
+            for user_id, product_id in samples
+        ]
+
+    results = {}
+    for name, data in payloads.items():
+        results[name] = {}
+        outputs = {}
+        for renderer in (JSONRenderer(), FastJSONRenderer()):
+            renderer_name = type(renderer).__name__
+            latencies = []
+            started = time.perf_counter()
+            for item in data:
+                request_started = time.perf_counter()
+                for _ in range(repeat):
+                    output = renderer.render(item)
+                latencies.append(
+                    (time.perf_counter() - request_started) / repeat)
+                outputs.setdefault(renderer_name, []).append(output)
+            results[name][renderer_name] = summarize(
+                latencies, (time.perf_counter() - started) / repeat)
+        if len(set(map(tuple, outputs.values()))) != 1:
+            raise RuntimeError(f'{name}: рендереры дают разный JSON')
+    return results
+
+
+def run_http(base_url, urls, concurrency=1):
+    """
+    Измеряет эндпоинты по HTTP.
+    - base_url: Адрес сервера, например http://127.0.0.1:8000.
+    - urls: Словарь {имя эндпоинта: список адресов}.
+    - concurrency: Количество параллельных клиентов.
+    Возвращает словарь {имя эндпоинта: показатели}.
+    """
+    results = {}
+    for name, endpoint_urls in urls.items():
+        latencies = []
+        lock = threading.Lock()
+        pending = iter(endpoint_urls)
+
+        def worker():
+            while True:
+                with lock:
+                    url = next(pending, None)
+                if url is None:
+                    return
+                request_started = time.perf_counter()
+                with urllib.request.urlopen(base_url + url) as response:
+                    response.read()
+                elapsed = time.perf_counter() - request_started
+                with lock:
+                    latencies.append(elapsed)
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=worker) for _ in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[name] = summarize(latencies, time.perf_counter() - started)
+    return results
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def run_wsgi(urls, concurrency=1):
+    """
+    Измеряет эндпоинты через локальный многопоточный WSGI-сервер.
+    - urls: Словарь {имя эндпоинта: список адресов}.
+    - concurrency: Количество параллельных клиентов.
+    Возвращает словарь {имя эндпоинта: показатели}.
+    """
+    from Product_HQ.wsgi import application
+
+    server = make_server(
+        '127.0.0.1', 0, application,
+        server_class=_ThreadingWSGIServer,
+        handler_class=_QuietHandler,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        return run_http(
+            f'http://127.0.0.1:{server.server_port}', urls, concurrency)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_asgi(urls, concurrency=1):
+    """
+    Измеряет эндпоинты через локальный ASGI-сервер uvicorn.
+    - urls: Словарь {имя эндпоинта: список адресов}.
+    - concurrency: Количество параллельных клиентов.
+    Возвращает словарь {имя эндпоинта: показатели} или None,
+    если uvicorn не установлен.
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        return None
+    from Product_HQ.asgi import application
+
+    config = uvicorn.Config(
+        application, host='127.0.0.1', port=0, log_level='warning')
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        return run_http(f'http://127.0.0.1:{port}', urls, concurrency)
+    finally:
+        server.should_exit = True
+        thread.join()
@@ -0,0 +1,83 @@
+"""
+Модуль, содержащий кэш сериализованных данных пользователей.
+
+Данные UserSerializer хранятся по ключу ETag, вычисленному по базе
+данных (api.conditional). Любое изменение данных пользователя меняет
+его ETag, поэтому записи не нужно удалять при изменениях: устаревшие
+записи перестают находиться и вытесняются бэкендом. Процессы с кэшем
+в своей памяти не могут вернуть данные, устаревшие относительно ETag
+ответа, даже если изменения сделаны в другом процессе.
+"""
+
+from django.conf import settings
+
+from product.cache import CacheCounters, create_backend
+
+
+class UserPayloadCache:
+    """
+    Кэш сериализованных данных пользователя для представлений
+    UserProductsListView и UserProductsDetailView.
+
+    Параметры:
+    - backend: Бэкенд кэша из модуля product.cache.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = CacheCounters('user_payload')
+
+    @staticmethod
+    def _payload_key(etag):
+        """
+        Возвращает ключ данных пользователя с указанным ETag.
+        """
+        return f'user-payload:{etag}'
+
+    def get_or_build(self, etag, build):
+        """
+        Получает данные пользователя из кэша или строит их.
+        - etag: ETag данных пользователя, вычисленный до построения
+          данных; определяет пользователя, продукт, представление
+          и состояние данных.
+        - build: Функция без аргументов, возвращающая данные.
+        Возвращает данные пользователя.
+        """
+        key = self._payload_key(etag)
+        data = self.backend.get(key)
+        if data is not None:
+            self.counters.hit()
+            return data
+        self.counters.miss()
+        data = build()
+        self.backend.set(key, data)
+        return data
+
+    async def aget_or_build(self, etag, build):
+        """
+        Асинхронный вариант get_or_build.
+        - build: Функция без аргументов, возвращающая сопрограмму,
+          результат которой — данные пользователя.
+        Обращения к бэкенду кэша выполняются синхронно: для бэкенда
+        в памяти процесса они не блокируют цикл событий.
+        """
+        key = self._payload_key(etag)
+        data = self.backend.get(key)
+        if data is not None:
+            self.counters.hit()
+            return data
+        self.counters.miss()
+        data = await build()
+        self.backend.set(key, data)
+        return data
+
+    def clear(self):
+        """
+        Очищает кэш и счётчики попаданий.
+        """
+        self.backend.clear()
+        self.counters.reset()
+
+
+user_payload_cache = UserPayloadCache(
+    create_backend(settings.USER_PAYLOAD_CACHE))
@@ -0,0 +1,135 @@
+"""
+Модуль, содержащий каталог сериализованных уроков продуктов.
+
+Описание уроков продукта одинаково для всех пользователей, поэтому
+оно сериализуется один раз и хранится в кэше в порядке вывода
+по продукту и дате его изменения. При ответе пользователю к урокам
+каталога добавляется только его статистика. Изменение урока или списка
+уроков продукта обновляет дату изменения продукта (product.signals),
+поэтому записи не нужно удалять при изменениях: устаревшие записи
+перестают находиться во всех процессах и вытесняются бэкендом.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+
+from product.cache import CacheCounters, create_backend
+from product.models import Product
+
+# Поля LessonSerializer, хранящиеся в каталоге: все, кроме статистики.
+CATALOGUE_LESSON_FIELDS = (
+    'name', 'slug', 'text', 'created_at', 'video_url', 'video_duration',
+)
+
+
+class ProductCatalogue:
+    """
+    Кэш сериализованных списков уроков продуктов.
+
+    Параметры:
+    - backend: Бэкенд кэша из модуля product.cache.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = CacheCounters('product_catalogue')
+
+    @staticmethod
+    def _key(product_id, updated_at):
+        return f'product-lessons:{product_id}:{updated_at.isoformat()}'
+
+    @staticmethod
+    def _links(product_ids):
+        """
+        Возвращает выборку связей продуктов с уроками в порядке вывода.
+        """
+        return Product.lessons.through.objects.filter(
+            product_id__in=product_ids,
+        ).select_related('lesson').order_by(
+            '-lesson__created_at', 'lesson__id')
+
+    def _get_cached(self, versions):
+        """
+        Получает записи каталога из кэша.
+        - versions: Словарь {id продукта: дата изменения продукта}.
+        Возвращает кортеж (найденные записи, id ненайденных продуктов).
+        """
+        keys = {
+            self._key(product_id, updated_at): product_id
+            for product_id, updated_at in versions.items()
+        }
+        found = {
+            keys[key]: value
+            for key, value in self.backend.get_many(list(keys)).items()
+        }
+        missing = set(versions) - set(found)
+        self.counters.hit(len(found))
+        self.counters.miss(len(missing))
+        return found, missing
+
+    def _store(self, versions, product_ids, links):
+        """
+        Сериализует уроки продуктов и сохраняет их в кэше.
+        - versions: Словарь {id продукта: дата изменения продукта}.
+        - product_ids: Идентификаторы сохраняемых продуктов.
+        - links: Связи продуктов с уроками в порядке вывода.
+        Возвращает словарь {id продукта: список (id урока, данные урока)}.
+        """
+        from api.serializers import LessonSerializer
+
+        lessons = defaultdict(list)
+        for link in links:
+            lessons[link.product_id].append(link.lesson)
+        entries = {}
+        for product_id in product_ids:
+            items = lessons.get(product_id, [])
+            data = LessonSerializer(
+                items,
+                many=True,
+                context={'lesson_fields': CATALOGUE_LESSON_FIELDS},
+            ).data
+            entries[product_id] = [
+                (lesson.pk, dict(item)) for lesson, item in zip(items, data)
+            ]
+            self.backend.set(
+                self._key(product_id, versions[product_id]),
+                entries[product_id],
+            )
+        return entries
+
+    def get_lessons(self, versions):
+        """
+        Получает сериализованные уроки продуктов, загружая отсутствующие
+        в кэше продукты одним запросом.
+        - versions: Словарь {id продукта: дата изменения продукта}.
+          Дата должна быть прочитана до вызова: тогда уроки,
+          загруженные из базы данных, не старше сохраняемой версии.
+        Возвращает словарь {id продукта: список (id урока, данные урока)}.
+        """
+        entries, missing = self._get_cached(versions)
+        if missing:
+            entries.update(
+                self._store(versions, missing, self._links(missing)))
+        return entries
+
+    async def aget_lessons(self, versions):
+        """
+        Асинхронный вариант get_lessons.
+        """
+        entries, missing = self._get_cached(versions)
+        if missing:
+            links = [link async for link in self._links(missing)]
+            entries.update(self._store(versions, missing, links))
+        return entries
+
+    def clear(self):
+        """
+        Очищает каталог и счётчики попаданий.
+        """
+        self.backend.clear()
+        self.counters.reset()
+
+
+product_catalogue = ProductCatalogue(
+    create_backend(settings.PRODUCT_CATALOGUE_CACHE))
@@ -0,0 +1,162 @@
+"""
+Модуль, содержащий валидаторы условных HTTP-запросов (ETag,
+Last-Modified) к данным пользователя.
+
+Валидаторы вычисляются одним запросом по версии данных пользователя,
+дате последнего просмотра урока и датам изменения продуктов и уроков,
+без сериализации данных и без загрузки уроков и статистики. Запрос
+с совпавшим If-None-Match или If-Modified-Since получает ответ 304.
+"""
+
+import hashlib
+
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from product.models import Access, Counter, Lesson, Product, Statistic, User
+from product.versions import user_version_name
+
+# Значения, из которых строятся валидаторы.
+STATE_FIELDS = (
+    'version', 'version_updated', 'last_viewed', 'products_updated',
+    'lessons_updated',
+)
+
+
+def _latest(queryset, field):
+    """
+    Превращает выборку в подзапрос с наибольшим значением поля.
+    """
+    return Subquery(
+        queryset.filter(**{f'{field}__isnull': False}).order_by(
+            f'-{field}').values(field)[:1]
+    )
+
+
+def user_products_state(user, product=None):
+    """
+    Возвращает выборку из одной строки со значениями STATE_FIELDS
+    для данных пользователя.
+    - user: Объект пользователя.
+    - product: Объект продукта или None для всех продуктов пользователя.
+    """
+    if product is None:
+        product_ids = Access.objects.filter(
+            user=user,
+            access_granted=True,
+        ).order_by().values('product_id')
+    else:
+        product_ids = [product.pk]
+    counter = Counter.objects.filter(name=user_version_name(user.pk))
+    return User.objects.filter(pk=user.pk).annotate(
+        version=Subquery(counter.values('value')[:1]),
+        version_updated=Subquery(counter.values('updated_at')[:1]),
+        last_viewed=_latest(
+            Statistic.objects.filter(
+                user=OuterRef('pk'),
+                product_id__in=product_ids,
+            ),
+            'last_viewed_date',
+        ),
+        products_updated=_latest(
+            Product.objects.filter(pk__in=product_ids),
+            'updated_at',
+        ),
+        lessons_updated=_latest(
+            Lesson.objects.filter(products__in=product_ids),
+            'updated_at',
+        ),
+    ).values(*STATE_FIELDS)
+
+
+def make_validators(user, product, state, query_params=None):
+    """
+    Строит валидаторы по значениям user_products_state.
+    - user: Объект пользователя.
+    - product: Объект продукта или None.
+    - state: Словарь значений STATE_FIELDS.
+    - query_params: Параметры запроса; разные представления данных
+      получают разные ETag.
+    Возвращает кортеж (etag, last_modified), где last_modified —
+    дата последнего изменения или None.
+    """
+    params = sorted(query_params.lists()) if query_params else []
+    source = repr((
+        user.pk,
+        product and product.pk,
+        [state[field] for field in STATE_FIELDS],
+        params,
+    ))
+    etag = 'W/"{}"'.format(
+        hashlib.md5(source.encode(), usedforsecurity=False).hexdigest())
+    dates = [
+        state[field] for field in STATE_FIELDS[1:]
+        if state[field] is not None
+    ]
+    return etag, max(dates, default=None)
+
+
+def get_validators(user, product=None, query_params=None):
+    """
+    Вычисляет валидаторы данных пользователя одним запросом.
+    Параметры описаны в user_products_state и make_validators.
+    """
+    state = user_products_state(user, product).get()
+    return make_validators(user, product, state, query_params)
+
+
+async def aget_validators(user, product=None, query_params=None):
+    """
+    Асинхронный вариант get_validators.
+    """
+    state = await user_products_state(user, product).aget()
+    return make_validators(user, product, state, query_params)
+
+
+def not_modified(request, validators):
+    """
+    Проверяет условия запроса If-None-Match и If-Modified-Since.
+    - request: Объект запроса HTTP.
+    - validators: Кортеж (etag, last_modified).
+    Возвращает ответ 304 с заголовками ETag и Last-Modified или None,
+    если данные изменились. Last-Modified имеет точность до секунды,
+    поэтому клиентам следует передавать If-None-Match.
+    """
+    etag, last_modified = validators
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(last_modified.timestamp()),
+    )
+    if response is not None:
+        set_validators(response, validators)
+    return response
+
+
+def conditional_response(request, validators, respond):
+    """
+    Отвечает на условный запрос.
+    - request: Объект запроса HTTP.
+    - validators: Кортеж (etag, last_modified).
+    - respond: Функция без аргументов, возвращающая полный ответ;
+      вызывается, только если данные изменились.
+    Возвращает ответ 304 или ответ respond() с заголовками ETag
+    и Last-Modified.
+    """
+    response = not_modified(request, validators)
+    if response is None:
+        response = set_validators(respond(), validators)
+    return response
+
+
+def set_validators(response, validators):
+    """
+    Добавляет к ответу заголовки ETag и Last-Modified.
+    """
+    etag, last_modified = validators
+    response.headers.setdefault('ETag', etag)
+    if last_modified is not None:
+        response.headers.setdefault(
+            'Last-Modified', http_date(last_modified.timestamp()))
+    return response
@@ -0,0 +1,170 @@
+"""
+Модуль, содержащий потоковую выгрузку статистики просмотров.
+
+Строки Statistic вместе с идентификаторами пользователя, продукта
+и урока читаются из базы данных пакетами по возрастанию первичного
+ключа: каждый пакет — отдельный запрос values_list() с условием
+id > последнего выгруженного id. Поэтому потребление памяти
+не зависит от размера таблицы, длинная транзакция или серверный
+курсор не удерживаются на время выгрузки, а прерванную выгрузку можно
+продолжить с последнего полученного id (параметр after).
+"""
+
+import csv
+import zlib
+
+from api.renderers import encode_json
+from product.models import Statistic
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Выгружаемые столбцы: (имя в выгрузке, столбец для values_list()).
+EXPORT_COLUMNS = (
+    ('id', 'pk'),
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('product_id', 'product_id'),
+    ('product', 'product__slug'),
+    ('lesson_id', 'lesson_id'),
+    ('lesson', 'lesson__slug'),
+    ('time_duration', 'time_duration'),
+    ('status', 'status'),
+    ('last_viewed_date', 'last_viewed_date'),
+)
+EXPORT_FIELDS = tuple(name for name, _ in EXPORT_COLUMNS)
+
+# Количество строк, читаемых из базы данных одним запросом.
+EXPORT_CHUNK_SIZE = 5000
+
+# Размер частей выгрузки в байтах, отдаваемых за один раз.
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+def iter_statistic_rows(after=0, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Читает строки статистики пакетами по возрастанию первичного ключа.
+    - after: Первичный ключ, после которого начинается выгрузка.
+    - chunk_size: Количество строк в пакете.
+    Возвращает генератор кортежей в порядке EXPORT_COLUMNS.
+    """
+    columns = [column for _, column in EXPORT_COLUMNS]
+    while True:
+        rows = list(Statistic.objects.filter(
+            pk__gt=after,
+        ).order_by('pk').values_list(*columns)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][0]
+
+
+class _LineBuffer:
+    """
+    Файлоподобный объект, возвращающий записанную строку, чтобы
+    csv.writer кодировал строки по одной.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """
+    Кодирует строки выгрузки в CSV с заголовком.
+    - rows: Кортежи в порядке EXPORT_COLUMNS.
+    """
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS).encode()
+    for row in rows:
+        yield writer.writerow(
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        ).encode()
+
+
+def iter_ndjson(rows):
+    """
+    Кодирует строки выгрузки в NDJSON: по одному объекту JSON на строку.
+    - rows: Кортежи в порядке EXPORT_COLUMNS.
+    """
+    for row in rows:
+        yield encode_json(dict(zip(EXPORT_FIELDS, row))) + b'\n'
+
+
+def iter_buffered(chunks, size=EXPORT_BUFFER_SIZE):
+    """
+    Объединяет короткие байтовые строки в части не меньше size байт,
+    кроме последней.
+    - chunks: Итерируемая последовательность байтовых строк.
+    - size: Минимальный размер части.
+    """
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks, level=6):
+    """
+    Сжимает последовательность байтовых строк в формат gzip по мере
+    их поступления.
+    - chunks: Итерируемая последовательность байтовых строк.
+    - level: Уровень сжатия.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Проверяет, принимает ли клиент ответ, сжатый gzip, по значению
+    заголовка Accept-Encoding с учётом весов q (RFC 9110): кодирование
+    с q=0 не принимается, а '*' относится к gzip, только если gzip
+    не указан явно.
+    - accept_encoding: Значение заголовка Accept-Encoding.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding.lower()] = weight
+    weight = weights.get('gzip', weights.get('x-gzip', weights.get('*', 0)))
+    return weight > 0
+
+
+def export_statistics(export_format='csv', after=0, compress=False,
+                      chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Выгружает статистику просмотров.
+    - export_format: 'csv' или 'ndjson'.
+    - after: Первичный ключ, после которого начинается выгрузка.
+    - compress: Сжимать ли выгрузку в формат gzip.
+    - chunk_size: Количество строк, читаемых одним запросом.
+    Возвращает генератор байтовых строк выгрузки.
+    """
+    rows = iter_statistic_rows(after=after, chunk_size=chunk_size)
+    chunks = iter_buffered(
+        iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows))
+    return iter_gzip(chunks) if compress else chunks
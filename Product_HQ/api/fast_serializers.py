@@ -0,0 +1,172 @@
+"""
+Модуль, содержащий быстрые сериализаторы данных пользователя.
+
+Сериализаторы модуля api.serializers остаются эталонными. Быстрые
+сериализаторы строят тот же JSON из кортежей values_list(): для каждого
+поля заранее вычисляется функция получения значения из кортежа, а даты
+форматируются без обращения к полям rest_framework. Уроки берутся
+из каталога уроков уже сериализованными. Быстрый путь включается
+настройкой API_FAST_SERIALIZERS и не поддерживает пагинацию.
+"""
+
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.catalogue import product_catalogue
+from api.pagination import PRODUCT_ORDERING
+from product.models import Product, Statistic
+
+# Вид поля, значение которого форматируется как дата и время.
+DATETIME = 'datetime'
+
+
+def make_datetime_formatter():
+    """
+    Возвращает функцию форматирования даты и времени в формате
+    "%Y-%m-%d %H:%M" в текущем часовом поясе, как DateTimeField
+    rest_framework. Часовой пояс определяется один раз.
+    """
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def format_datetime(value):
+        if value is None:
+            return None
+        if tz is not None and value.tzinfo is not None:
+            value = value.astimezone(tz)
+        return (
+            f'{value.year:04d}-{value.month:02d}-{value.day:02d} '
+            f'{value.hour:02d}:{value.minute:02d}'
+        )
+
+    return format_datetime
+
+
+class CompiledSerializer:
+    """
+    Сериализатор, строящий словари из кортежей values_list().
+
+    Параметры:
+    - fields: Последовательность кортежей (имя поля в ответе, столбец
+      для values_list(), вид поля): None для значений как есть
+      или DATETIME для дат.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+
+    @property
+    def columns(self):
+        """
+        Столбцы для values_list() в порядке полей.
+        """
+        return tuple(column for _, column, _ in self.fields)
+
+    def select(self, names):
+        """
+        Возвращает сериализатор только с указанными полями.
+        - names: Имена полей или None для всех полей.
+        """
+        if names is None:
+            return self
+        return CompiledSerializer(
+            field for field in self.fields if field[0] in names)
+
+    def compile(self, offset=0):
+        """
+        Возвращает функцию, преобразующую кортеж в словарь.
+        - offset: Индекс первого столбца сериализатора в кортеже.
+        """
+        format_datetime = make_datetime_formatter()
+        getters = []
+        for index, (name, _, kind) in enumerate(self.fields, offset):
+            getter = itemgetter(index)
+            if kind == DATETIME:
+                getter = (
+                    lambda row, get=getter: format_datetime(get(row)))
+            getters.append((name, getter))
+
+        def serialize(row):
+            return {name: getter(row) for name, getter in getters}
+
+        return serialize
+
+
+# Соответствуют ProductSerializer без уроков и StatisticSerializer.
+PRODUCT_SERIALIZER = CompiledSerializer((
+    ('name', 'name', None),
+    ('slug', 'slug', None),
+    ('text', 'text', None),
+    ('created_at', 'created_at', DATETIME),
+    ('owner', 'owner__username', None),
+))
+STATISTIC_SERIALIZER = CompiledSerializer((
+    ('time_duration', 'time_duration', None),
+    ('status', 'status', None),
+    ('last_viewed_date', 'last_viewed_date', DATETIME),
+))
+
+
+def serialize_user_products_fast(user, product=None, product_fields=None,
+                                 lesson_fields=None):
+    """
+    Сериализует данные пользователя так же, как UserSerializer.
+    - user: Объект пользователя.
+    - product: Объект продукта; если указан, выводится только он.
+    - product_fields: Выводимые поля ProductSerializer или None для всех.
+    - lesson_fields: Выводимые поля LessonSerializer или None для всех.
+    Возвращает данные пользователя.
+    """
+    product_serializer = PRODUCT_SERIALIZER.select(product_fields)
+    products = Product.objects.all()
+    if product is None:
+        products = products.filter(
+            access__user=user,
+            access__access_granted=True,
+        ).order_by(*PRODUCT_ORDERING)
+    else:
+        products = products.filter(pk=product.pk)
+    rows = list(products.values_list(
+        'pk', 'updated_at', *product_serializer.columns))
+    serialize_product = product_serializer.compile(offset=2)
+
+    with_lessons = product_fields is None or 'lessons' in product_fields
+    with_statistics = lesson_fields is None or 'statistics' in lesson_fields
+    catalogue = {}
+    statistics = {}
+    if with_lessons:
+        product_ids = [row[0] for row in rows]
+        catalogue = product_catalogue.get_lessons(
+            {row[0]: row[1] for row in rows})
+        if with_statistics:
+            serialize_statistic = STATISTIC_SERIALIZER.compile(offset=2)
+            for row in Statistic.objects.filter(
+                user=user,
+                product_id__in=product_ids,
+            ).order_by().values_list(
+                'product_id', 'lesson_id', *STATISTIC_SERIALIZER.columns,
+            ):
+                statistics.setdefault((row[0], row[1]), []).append(
+                    serialize_statistic(row))
+
+    output = []
+    for row in rows:
+        data = serialize_product(row)
+        if with_lessons:
+            lessons = []
+            for lesson_id, lesson in catalogue.get(row[0], ()):
+                if lesson_fields is None:
+                    lesson = dict(lesson)
+                else:
+                    lesson = {
+                        name: value for name, value in lesson.items()
+                        if name in lesson_fields
+                    }
+                if with_statistics:
+                    lesson['statistics'] = statistics.get(
+                        (row[0], lesson_id), [])
+                lessons.append(lesson)
+            data['lessons'] = lessons
+        output.append(data)
+    return {'username': user.username, 'products': output}
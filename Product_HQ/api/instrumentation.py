@@ -0,0 +1,315 @@
+"""
+Модуль, содержащий инструментирование запросов к API.
+
+Для каждого запроса записываются количество SQL-запросов, суммарное
+время их выполнения, повторяющиеся формы запросов (один и тот же SQL
+с разными параметрами — признак N+1), время сериализации и время
+отрисовки ответа. Показатели передаются в заголовке Server-Timing
+и в журнал api.instrumentation, а количество SQL-запросов сверяется
+с бюджетом из настройки API_QUERY_BUDGETS по имени URL. Запросы,
+выполняемые при чтении потокового ответа, добавляются к показателям
+запроса, а бюджет такого ответа сверяется по окончании чтения.
+
+SQL-запросы перехватываются обёрткой, устанавливаемой на каждое
+соединение с базой данных, и записываются в показатели текущего
+запроса из contextvars, поэтому учитываются и запросы асинхронного
+ORM, выполняемые в других потоках.
+"""
+
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from product.metrics import metrics as registry
+
+logger = logging.getLogger(__name__)
+
+# Показатели текущего запроса.
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+# Списки параметров IN (%s, %s, ...) разной длины дают одну форму.
+_IN_PARAMS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Количество SQL-запросов превысило бюджет эндпоинта.
+    """
+
+
+def query_shape(sql):
+    """
+    Возвращает форму SQL-запроса: текст без параметров, в котором
+    списки параметров IN приведены к одному виду.
+    """
+    return _IN_PARAMS.sub('(%s, ...)', sql)
+
+
+class RequestMetrics:
+    """
+    Показатели одного запроса.
+
+    Параметры:
+    - parent: Объемлющие показатели, в которые также записываются
+      SQL-запросы, например показатели теста вокруг запроса.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.timings = {}
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.shapes[query_shape(sql)] += 1
+        if self.parent is not None:
+            self.parent.record_query(sql, duration)
+
+    @property
+    def duplicates(self):
+        """
+        Словарь {форма запроса: количество выполнений} для форм,
+        выполненных больше одного раза.
+        """
+        return {
+            shape: count for shape, count in self.shapes.items() if count > 1
+        }
+
+    def add_timing(self, name, duration):
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+
+    def server_timing(self):
+        """
+        Возвращает значение заголовка Server-Timing; длительности
+        указываются в миллисекундах.
+        """
+        duplicated = sum(count - 1 for count in self.duplicates.values())
+        entries = [
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.queries} queries, {duplicated} duplicated"'
+        ]
+        entries.extend(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.timings.items()
+        )
+        return ', '.join(entries)
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'duplicates': self.duplicates,
+            'timings_ms': {
+                name: round(duration * 1000, 3)
+                for name, duration in self.timings.items()
+            },
+        }
+
+
+def _record_query(execute, sql, params, many, context):
+    """
+    Обёртка выполнения SQL-запросов, записывающая их в показатели
+    текущего запроса.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Устанавливает обёртку записи SQL-запросов на новое соединение.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def collect_metrics():
+    """
+    Записывает показатели запросов, выполненных внутри блока.
+    Возвращает объект RequestMetrics.
+    """
+    metrics = RequestMetrics(parent=_current_metrics.get())
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+@contextmanager
+def measure(name):
+    """
+    Добавляет время выполнения блока к показателю name текущего запроса,
+    например measure('serialize') вокруг сериализации данных.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            metrics.add_timing(name, time.perf_counter() - started)
+
+
+def check_budget(url_name, metrics):
+    """
+    Сверяет количество SQL-запросов с бюджетом эндпоинта из настройки
+    API_QUERY_BUDGETS. При превышении, в зависимости от настройки
+    API_QUERY_BUDGET_ACTION, записывает предупреждение в журнал ('warn')
+    или вызывает исключение QueryBudgetExceeded ('raise').
+    - url_name: Имя URL, например 'api:users'.
+    - metrics: Объект RequestMetrics.
+    """
+    budget = settings.API_QUERY_BUDGETS.get(url_name)
+    if budget is None or metrics.queries <= budget:
+        return
+    message = (
+        f'{url_name}: {metrics.queries} SQL-запросов при бюджете {budget}; '
+        f'повторяющиеся запросы: {metrics.duplicates}'
+    )
+    if settings.API_QUERY_BUDGET_ACTION == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Промежуточный слой, записывающий показатели каждого запроса.
+    Поддерживает синхронные и асинхронные обработчики.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with collect_metrics() as metrics:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        with collect_metrics() as metrics:
+            started = time.perf_counter()
+            response = await self.get_response(request)
+            return self.finish(request, response, metrics, started)
+
+    def process_template_response(self, request, response):
+        """
+        Измеряет время отрисовки ответов REST framework.
+        """
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.add_timing('render', time.perf_counter() - started)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, metrics, started):
+        """
+        Добавляет к ответу заголовок Server-Timing, записывает показатели
+        в журнал и сверяет их с бюджетом эндпоинта.
+        """
+        metrics.add_timing('total', time.perf_counter() - started)
+        response['Server-Timing'] = metrics.server_timing()
+        response.request_metrics = metrics
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        logger.info(
+            'Показатели запроса %s %s',
+            request.method,
+            request.path,
+            extra={
+                'url_name': url_name,
+                'status_code': response.status_code,
+                **metrics.as_dict(),
+            },
+        )
+        view = url_name or 'unknown'
+        registry.inc(
+            'api_requests_total', view=view, status=response.status_code)
+        registry.observe(
+            'api_request_duration_seconds', metrics.timings['total'],
+            view=view)
+        registry.inc('api_db_queries_total', metrics.queries, view=view)
+        if response.streaming:
+            instrument_stream(response, metrics, url_name, view)
+        else:
+            check_budget(url_name, metrics)
+        return response
+
+
+def instrument_stream(response, metrics, url_name, view):
+    """
+    Записывает в показатели запроса SQL-запросы, выполняемые при чтении
+    потокового ответа, уже после выхода из промежуточного слоя.
+    По окончании чтения запросы добавляются к метрике
+    api_db_queries_total, а их общее количество сверяется с бюджетом.
+    - response: Объект StreamingHttpResponse.
+    - metrics: Объект RequestMetrics запроса.
+    - url_name: Имя URL эндпоинта.
+    - view: Значение метки view метрик.
+    """
+    counted = metrics.queries
+    content = response.streaming_content
+
+    def finish_stream():
+        registry.inc(
+            'api_db_queries_total', metrics.queries - counted, view=view)
+        check_budget(url_name, metrics)
+
+    def stream():
+        iterator = iter(content)
+        while True:
+            token = _current_metrics.set(metrics)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                _current_metrics.reset(token)
+            yield chunk
+        finish_stream()
+
+    async def astream():
+        iterator = aiter(content)
+        while True:
+            token = _current_metrics.set(metrics)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                break
+            finally:
+                _current_metrics.reset(token)
+            yield chunk
+        finish_stream()
+
+    response.streaming_content = (
+        astream() if response.is_async else stream())
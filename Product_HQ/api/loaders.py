@@ -0,0 +1,217 @@
+"""
+Модуль, содержащий функции множественной загрузки данных для сериализаторов.
+
+Вместо запроса к базе данных на каждый урок каждого продукта данные
+загружаются фиксированным числом запросов и связываются в памяти.
+"""
+
+import asyncio
+from collections import defaultdict, namedtuple
+
+from api.catalogue import product_catalogue
+from api.pagination import (PRODUCT_ORDERING, lesson_keyset_filter,
+                            product_keyset_filter)
+from product.models import Access, Product, Statistic
+
+# Загруженные данные пользователя:
+# - products: Список продуктов, к которым у пользователя есть доступ.
+# - lessons: Словарь {id продукта: список уроков продукта}.
+# - statistics: Словарь {(id продукта, id урока): список статистик}.
+# - next: Ключ последнего элемента страницы, если есть следующая
+#   страница, иначе None.
+# - catalogue: Словарь {id продукта: список (id урока, данные урока)}
+#   из каталога уроков; если указан, вместо lessons используется он.
+UserProducts = namedtuple(
+    'UserProducts',
+    ('products', 'lessons', 'statistics', 'next', 'catalogue'),
+    defaults=(None,),
+)
+
+# Поля сериализаторов, хранящиеся в столбцах моделей.
+PRODUCT_COLUMNS = ('name', 'slug', 'text', 'created_at')
+LESSON_COLUMNS = (
+    'name', 'slug', 'text', 'created_at', 'video_url', 'video_duration',
+)
+STATISTIC_COLUMNS = (
+    'product', 'lesson', 'time_duration', 'status', 'last_viewed_date',
+)
+
+
+def _take_page(queryset, page, key):
+    """
+    Выбирает страницу из упорядоченной выборки.
+    - queryset: Выборка, отфильтрованная по ключу предыдущей страницы.
+    - page: Объект KeysetPage.
+    - key: Функция, возвращающая ключ элемента.
+    Возвращает кортеж (список элементов, ключ для следующей страницы).
+    """
+    items = list(queryset[:page.limit + 1])
+    if len(items) <= page.limit:
+        return items, None
+    items = items[:page.limit]
+    return items, key(items[-1])
+
+
+def load_user_products(user, product=None, product_fields=None,
+                       lesson_fields=None, page=None):
+    """
+    Загружает продукты пользователя, их уроки и статистику просмотров.
+    - user: Объект пользователя.
+    - product: Объект продукта; если указан, загружается только он.
+    - product_fields: Выводимые поля ProductSerializer или None для всех;
+      невыводимые столбцы не загружаются из базы данных.
+    - lesson_fields: Выводимые поля LessonSerializer или None для всех.
+    - page: Объект KeysetPage; при загрузке всех продуктов задаёт
+      страницу продуктов, при загрузке одного продукта — страницу
+      его уроков.
+    Уроки, выводимые полностью, берутся из каталога уроков; уроки
+    загружаются из базы данных только для страницы уроков продукта.
+    Возвращает объект UserProducts.
+    """
+    next_key = None
+    if product is None:
+        products = Product.objects.filter(
+            access__user=user,
+            access__access_granted=True,
+        ).order_by(*PRODUCT_ORDERING)
+        if product_fields is None or 'owner' in product_fields:
+            products = products.select_related('owner')
+        if product_fields is not None:
+            columns = ['name', 'updated_at'] + [
+                field for field in PRODUCT_COLUMNS if field in product_fields
+            ]
+            if 'owner' in product_fields:
+                columns.append('owner__username')
+            products = products.only(*columns)
+        if page is None:
+            products = list(products)
+        else:
+            if page.after is not None:
+                products = products.filter(product_keyset_filter(page.after))
+            products, next_key = _take_page(
+                products, page, lambda item: (item.name, item.pk))
+    else:
+        products = [product]
+    product_ids = [item.pk for item in products]
+
+    lessons = defaultdict(list)
+    statistics = defaultdict(list)
+    if product_fields is not None and 'lessons' not in product_fields:
+        return UserProducts(products, lessons, statistics, next_key)
+
+    if product is None or page is None:
+        # Уроки выводятся полностью и берутся из каталога уроков.
+        catalogue = product_catalogue.get_lessons(
+            {item.pk: item.updated_at for item in products})
+        if lesson_fields is None or 'statistics' in lesson_fields:
+            _group_statistics(statistics, Statistic.objects.filter(
+                user=user,
+                product_id__in=product_ids,
+            ).only(*STATISTIC_COLUMNS).order_by())
+        return UserProducts(
+            products, lessons, statistics, next_key, catalogue)
+
+    links = Product.lessons.through.objects.filter(
+        product_id__in=product_ids,
+    ).select_related('lesson').order_by('-lesson__created_at', 'lesson__id')
+    if lesson_fields is not None:
+        links = links.only('product', 'lesson__created_at', *[
+            f'lesson__{field}'
+            for field in LESSON_COLUMNS if field in lesson_fields
+        ])
+    if page.after is not None:
+        links = links.filter(lesson_keyset_filter(page.after, 'lesson__'))
+    links, next_key = _take_page(
+        links, page,
+        lambda item: (item.lesson.created_at, item.lesson.pk))
+    _group_lessons(lessons, links)
+
+    if lesson_fields is not None and 'statistics' not in lesson_fields:
+        return UserProducts(products, lessons, statistics, next_key)
+
+    _group_statistics(statistics, Statistic.objects.filter(
+        user=user,
+        product=product,
+        lesson_id__in=[lesson.pk for lesson in lessons[product.pk]],
+    ).only(*STATISTIC_COLUMNS).order_by())
+
+    return UserProducts(products, lessons, statistics, next_key)
+
+
+def _group_lessons(lessons, links):
+    """
+    Группирует уроки по продуктам.
+    - lessons: Словарь {id продукта: список уроков} для заполнения.
+    - links: Связи продуктов и уроков с загруженными уроками.
+    """
+    for link in links:
+        lessons[link.product_id].append(link.lesson)
+
+
+def _group_statistics(statistics, rows):
+    """
+    Группирует статистику по продуктам и урокам.
+    - statistics: Словарь {(id продукта, id урока): список статистик}
+      для заполнения.
+    - rows: Объекты статистики.
+    """
+    for statistic in rows:
+        statistics[statistic.product_id, statistic.lesson_id].append(
+            statistic)
+
+
+async def alist(queryset):
+    """
+    Выполняет выборку с помощью асинхронной итерации.
+    """
+    return [item async for item in queryset]
+
+
+async def aload_user_products(user, product=None):
+    """
+    Асинхронный вариант load_user_products для представления по умолчанию,
+    без пагинации и выбора полей.
+
+    Продукты и статистика выбираются независимыми запросами (продукты
+    пользователя задаются подзапросом к Access), которые выполняются
+    конкурентно; уроки берутся из каталога уроков.
+    - user: Объект пользователя.
+    - product: Объект продукта с загруженным владельцем; если указан,
+      загружается только он.
+    Возвращает объект UserProducts.
+    """
+    if product is None:
+        product_ids = Access.objects.filter(
+            user=user,
+            access_granted=True,
+        ).order_by().values('product_id')
+    else:
+        product_ids = [product.pk]
+    rows = alist(
+        Statistic.objects.filter(
+            user=user,
+            product_id__in=product_ids,
+        ).only(*STATISTIC_COLUMNS).order_by()
+    )
+    if product is None:
+        products, rows = await asyncio.gather(
+            alist(
+                Product.objects.filter(
+                    pk__in=product_ids,
+                ).select_related('owner').order_by(*PRODUCT_ORDERING)
+            ),
+            rows,
+        )
+        catalogue = await product_catalogue.aget_lessons(
+            {item.pk: item.updated_at for item in products})
+    else:
+        products = [product]
+        catalogue, rows = await asyncio.gather(
+            product_catalogue.aget_lessons(
+                {product.pk: product.updated_at}),
+            rows,
+        )
+    statistics = defaultdict(list)
+    _group_statistics(statistics, rows)
+    return UserProducts(
+        products, defaultdict(list), statistics, None, catalogue)
@@ -0,0 +1,129 @@
+"""
+Команда для нагрузочного измерения эндпоинтов API.
+"""
+
+import json
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmark import (run_asgi, run_renderers, run_serializers,
+                           run_test_client, run_wsgi, sample_urls)
+from product.models import Access, Lesson, Product, Statistic, User
+from product.seeding import generate_platform
+
+MODES = ('client', 'wsgi', 'asgi', 'serializers', 'renderers')
+
+
+def get_commit():
+    """
+    Возвращает идентификатор текущего коммита git или None.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет задержки, пропускную способность и количество '
+        'SQL-запросов эндпоинтов API и сохраняет результаты в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Количество запросов к каждому эндпоинту.')
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Количество параллельных клиентов для HTTP-серверов.')
+        parser.add_argument(
+            '--modes', default=','.join(MODES),
+            help='Режимы измерения через запятую: client, wsgi, asgi, '
+                 'serializers, renderers.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш данных пользователей перед каждым запросом '
+                 'тестового клиента.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел.')
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов в формате JSON; по умолчанию '
+                 'результаты выводятся в stdout.')
+        parser.add_argument(
+            '--generate', action='store_true',
+            help='Сгенерировать данные перед измерением.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--lessons', type=int, default=500)
+        parser.add_argument('--lessons-per-product', type=int, default=20)
+        parser.add_argument('--products-per-user', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            started = time.perf_counter()
+            counts = generate_platform(
+                users=options['users'],
+                products=options['products'],
+                lessons=options['lessons'],
+                lessons_per_product=options['lessons_per_product'],
+                products_per_user=options['products_per_user'],
+                seed=options['seed'],
+            )
+            self.stderr.write(
+                f'Данные сгенерированы за '
+                f'{time.perf_counter() - started:.1f} с: {counts}')
+
+        urls = sample_urls(options['requests'], seed=options['seed'])
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        results = {}
+        for mode in modes:
+            if mode == 'client':
+                results[mode] = run_test_client(urls, cold=options['cold'])
+            elif mode == 'wsgi':
+                results[mode] = run_wsgi(urls, options['concurrency'])
+            elif mode == 'asgi':
+                results[mode] = run_asgi(urls, options['concurrency'])
+                if results[mode] is None:
+                    self.stderr.write('uvicorn не установлен, режим asgi '
+                                      'пропущен')
+            elif mode == 'serializers':
+                results[mode] = run_serializers(
+                    options['requests'], seed=options['seed'])
+            elif mode == 'renderers':
+                results[mode] = run_renderers(
+                    options['requests'], seed=options['seed'])
+            else:
+                self.stderr.write(f'Неизвестный режим: {mode}')
+
+        report = json.dumps(
+            {
+                'commit': get_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'scale': {
+                    'users': User.objects.count(),
+                    'products': Product.objects.count(),
+                    'lessons': Lesson.objects.count(),
+                    'accesses': Access.objects.count(),
+                    'statistics': Statistic.objects.count(),
+                },
+                'options': {
+                    key: options[key]
+                    for key in ('requests', 'concurrency', 'cold', 'seed')
+                },
+                'results': results,
+            },
+            indent=2,
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,64 @@
+"""
+Команда для потоковой выгрузки статистики просмотров.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает статистику просмотров с идентификаторами пользователей, '
+        'продуктов и уроков в CSV или NDJSON по возрастанию id, не загружая '
+        'таблицу в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=tuple(EXPORT_FORMATS),
+            default='csv',
+            help='Формат выгрузки.',
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл выгрузки; по умолчанию stdout.',
+        )
+        parser.add_argument(
+            '--after',
+            type=int,
+            default=0,
+            help='Продолжить выгрузку после строки с указанным id.',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжимать выгрузку в формат gzip.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help='Количество строк, читаемых одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        chunks = export_statistics(
+            options['format'],
+            after=options['after'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            return
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
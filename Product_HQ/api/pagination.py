@@ -0,0 +1,130 @@
+"""
+Модуль, содержащий курсорную (keyset) пагинацию продуктов и уроков.
+
+Продукты упорядочиваются по (name, id), уроки — по (-created_at, id),
+что соответствует Meta.ordering моделей. Курсор хранит значения ключа
+последнего элемента страницы, поэтому следующая страница выбирается
+условием по индексу, а не смещением.
+"""
+
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from rest_framework.exceptions import ValidationError
+
+# Страница: after — ключ последнего элемента предыдущей страницы
+# или None для первой страницы, limit — размер страницы.
+KeysetPage = namedtuple('KeysetPage', ('after', 'limit'))
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+PRODUCT_ORDERING = ('name', 'id')
+
+
+def encode_cursor(values):
+    """
+    Кодирует ключ элемента в курсор для параметра cursor.
+    - values: Кортеж значений ключа.
+    """
+    values = [
+        value.isoformat() if hasattr(value, 'isoformat') else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(
+        json.dumps(values).encode()).decode()
+
+
+def _invalid_cursor():
+    """
+    Возвращает исключение для некорректного параметра cursor.
+    """
+    return ValidationError({'cursor': 'Некорректный курсор.'})
+
+
+def _check_key(after, value_type):
+    """
+    Проверяет типы значений ключа из курсора.
+    - after: Ключ: значение поля упорядочивания и id.
+    - value_type: Ожидаемый тип значения поля упорядочивания.
+    Возвращает ключ; при неверных типах вызывает ValidationError.
+    """
+    value, pk = after
+    if not isinstance(value, value_type) or not isinstance(pk, int) or (
+            isinstance(pk, bool)):
+        raise _invalid_cursor()
+    return value, pk
+
+
+def decode_cursor(cursor):
+    """
+    Декодирует курсор из параметра cursor.
+    - cursor: Строка курсора.
+    Возвращает список значений ключа.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise _invalid_cursor()
+    if not isinstance(values, list) or len(values) != 2:
+        raise _invalid_cursor()
+    return values
+
+
+def get_page(query_params):
+    """
+    Получает страницу из параметров запроса limit и cursor.
+    - query_params: Параметры запроса.
+    Возвращает объект KeysetPage или None, если пагинация не запрошена.
+    """
+    if 'limit' not in query_params and 'cursor' not in query_params:
+        return None
+    try:
+        limit = int(query_params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError({'limit': 'Ожидается целое число.'})
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValidationError(
+            {'limit': f'Допустимы значения от 1 до {MAX_PAGE_SIZE}.'})
+    cursor = query_params.get('cursor')
+    return KeysetPage(decode_cursor(cursor) if cursor else None, limit)
+
+
+def product_keyset_filter(after, prefix=''):
+    """
+    Возвращает условие выборки продуктов после ключа (name, id).
+    - after: Ключ последнего продукта предыдущей страницы.
+    При неверных типах значений ключа вызывает ValidationError.
+    - prefix: Префикс пути к продукту в условиях фильтрации.
+    """
+    name, pk = _check_key(after, str)
+    return (
+        Q(**{f'{prefix}name__gt': name})
+        | Q(**{f'{prefix}name': name, f'{prefix}id__gt': pk})
+    )
+
+
+def lesson_keyset_filter(after, prefix=''):
+    """
+    Возвращает условие выборки уроков после ключа (created_at, id)
+    при порядке (-created_at, id).
+    - after: Ключ последнего урока предыдущей страницы.
+    При неверных типах значений ключа или дате вызывает ValidationError.
+    - prefix: Префикс пути к уроку в условиях фильтрации.
+    """
+    created_at, pk = _check_key(after, str)
+    try:
+        created_at = parse_datetime(created_at)
+    except ValueError:
+        created_at = None
+    if created_at is None:
+        raise _invalid_cursor()
+    return (
+        Q(**{f'{prefix}created_at__lt': created_at})
+        | Q(**{f'{prefix}created_at': created_at, f'{prefix}id__gt': pk})
+    )
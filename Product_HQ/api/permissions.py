@@ -0,0 +1,37 @@
+"""
+Модуль, содержащий классы разрешений API.
+"""
+
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+
+class CanWriteProgress(BasePermission):
+    """
+    Разрешение на запись прогресса просмотра.
+
+    Администраторы (is_staff), в том числе служебные учётные записи
+    сервисов приёма событий, могут записывать прогресс любых
+    пользователей и читать показатели приёма. Остальные
+    аутентифицированные пользователи могут записывать только
+    собственный прогресс: поле user каждого события должно совпадать
+    с именем пользователя запроса.
+    """
+    message = 'Можно записывать только собственный прогресс просмотра.'
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        if user.is_staff:
+            return True
+        if request.method in SAFE_METHODS:
+            return False
+        events = request.data
+        if not isinstance(events, list):
+            # Некорректное тело запроса отклоняется сериализатором.
+            return True
+        return all(
+            not isinstance(event, dict)
+            or event.get('user') == user.get_username()
+            for event in events
+        )
@@ -0,0 +1,79 @@
+"""
+Модуль, содержащий ускоренный рендерер JSON для ответов API.
+
+Если установлен пакет orjson, данные кодируются им: даты, время и UUID
+кодируются напрямую, а прочие типы (Decimal, ленивые строки, выборки)
+— методом default JSONEncoder REST framework. Без orjson, а также для
+форматированного вывода (indent) и при настройках UNICODE_JSON=False
+или COMPACT_JSON=False используется стандартный модуль json. Результат
+совпадает с JSONRenderer REST framework.
+
+Рендерер подключается в представлении через renderer_classes или для
+всех представлений в настройке REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].
+"""
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Символы, которые JSONRenderer экранирует, чтобы JSON оставался
+# подмножеством JavaScript.
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+def _orjson_dumps(data, default):
+    """
+    Кодирует данные с помощью orjson так же, как JSONRenderer.
+    """
+    output = orjson.dumps(
+        data,
+        default=default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+    )
+    for character, escaped in LINE_SEPARATORS:
+        if character in output:
+            output = output.replace(character, escaped)
+    return output
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Рендерер JSON, использующий orjson, если он установлен.
+    """
+    # Использовать orjson, если он установлен.
+    accelerated = orjson is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Кодирует данные в JSON и возвращает строку байтов.
+        """
+        if (
+            data is None
+            or not self.accelerated
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return _orjson_dumps(data, self.encoder_class().default)
+        except orjson.JSONEncodeError:
+            # Например, целые числа больше 64 бит.
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+_renderer = FastJSONRenderer()
+
+
+def encode_json(data):
+    """
+    Кодирует данные в JSON так же, как FastJSONRenderer.
+    Возвращает строку байтов.
+    """
+    return _renderer.render(data)
@@ -2,11 +2,13 @@
 Модуль, содержащий сериализаторы для различных моделей.
 """
 
-from django.db.models import Sum, Value
+from django.conf import settings
 
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 
-from product.models import Access, Lesson, Product, Statistic, User
+from api.loaders import load_user_products
+from product.models import Lesson, Product, Statistic, User, WatchRollup
 
 
 class StatisticSerializer(serializers.ModelSerializer):
@@ -24,10 +26,27 @@ class StatisticSerializer(serializers.ModelSerializer):
         )
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class SelectableFieldsMixin:
+    """
+    Примесь к сериализатору, оставляющая только поля, перечисленные
+    в контексте под ключом selected_fields_key. Если ключа в контексте
+    нет или его значение None, выводятся все поля.
+    """
+    selected_fields_key = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.context.get(self.selected_fields_key)
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class LessonSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Lesson.
     """
+    selected_fields_key = 'lesson_fields'
     created_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
     statistics = serializers.SerializerMethodField()
 
@@ -51,11 +70,15 @@ class LessonSerializer(serializers.ModelSerializer):
         """
         user = self.context.get('user')
         product = self.context.get('product')
-        statistics = Statistic.objects.filter(
-            lesson=lesson,
-            product=product,
-            user=user,
-        )
+        if 'statistics' in self.context:
+            statistics = self.context['statistics'].get(
+                (product.pk, lesson.pk), [])
+        else:
+            statistics = Statistic.objects.filter(
+                lesson=lesson,
+                product=product,
+                user=user,
+            )
         serializer = StatisticSerializer(
             statistics,
             many=True,
@@ -63,10 +86,11 @@ class LessonSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Product.
     """
+    selected_fields_key = 'product_fields'
 
     created_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
     owner = serializers.StringRelatedField()
@@ -89,18 +113,51 @@ class ProductSerializer(serializers.ModelSerializer):
         - product: Объект продукта.
         Возвращает сериализованные данные уроков для данного продукта.
         """
+        if self.context.get('catalogue') is not None:
+            return self.merge_statistics(
+                product, self.context['catalogue'].get(product.pk, []))
         user = self.context.get('user')
-        lessons = product.lessons.all()
+        context = {
+            'user': user,
+            'product': product,
+            'lesson_fields': self.context.get('lesson_fields'),
+        }
+        if 'lessons' in self.context:
+            lessons = self.context['lessons'].get(product.pk, [])
+            context['statistics'] = self.context['statistics']
+        else:
+            lessons = product.lessons.all()
         serializer = LessonSerializer(
             lessons,
             many=True,
-            context={
-                'user': user,
-                'product': product,
-            },
+            context=context,
         )
         return serializer.data
 
+    def merge_statistics(self, product, entries):
+        """
+        Добавляет статистику пользователя к сериализованным урокам
+        из каталога уроков.
+        - product: Объект продукта.
+        - entries: Список (id урока, данные урока) из каталога.
+        Возвращает данные уроков в формате LessonSerializer.
+        """
+        lesson_fields = self.context.get('lesson_fields')
+        statistics = self.context['statistics']
+        output = []
+        for lesson_id, data in entries:
+            data = {
+                name: value for name, value in data.items()
+                if lesson_fields is None or name in lesson_fields
+            }
+            if lesson_fields is None or 'statistics' in lesson_fields:
+                data['statistics'] = StatisticSerializer(
+                    statistics.get((product.pk, lesson_id), []),
+                    many=True,
+                ).data
+            output.append(data)
+        return output
+
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -120,16 +177,19 @@ class UserSerializer(serializers.ModelSerializer):
         Задаёт свой метод для получения продуктов для данного пользователя.
         - user: Объект пользователя.
         Возвращает сериализованные данные продуктов для данного пользователя.
+        Продукты, уроки и статистика загружаются фиксированным числом
+        запросов, независимо от количества продуктов и уроков.
         """
-        if not self.context.get('product'):
-            user_accesses = Access.objects.filter(
-                user=user,
-                access_granted=True).order_by('product')
-            output = [user_access.product for user_access in user_accesses]
-        else:
-            output = [self.context['product']]
+        loaded = self.context.get('loaded') or load_user_products(
+            user,
+            product=self.context.get('product'),
+        )
+        output, lessons, statistics = loaded[:3]
         context = self.context.copy() if self.context else {}
         context['user'] = user
+        context['lessons'] = lessons
+        context['statistics'] = statistics
+        context['catalogue'] = loaded.catalogue
         product_serializer = ProductSerializer(
             output,
             many=True,
@@ -138,15 +198,121 @@ class UserSerializer(serializers.ModelSerializer):
         return product_serializer.data
 
 
+def get_field_selection(query_params):
+    """
+    Получает выводимые поля продуктов и уроков из параметров запроса
+    fields и omit. Поля уроков указываются с префиксом 'lessons.',
+    например: ?omit=text,lessons.text.
+    - query_params: Параметры запроса.
+    Возвращает кортеж (product_fields, lesson_fields) множеств
+    выводимых полей; None означает все поля.
+    """
+    product_all = set(ProductSerializer.Meta.fields)
+    lesson_all = set(LessonSerializer.Meta.fields)
+    selection = {}
+    for param in ('fields', 'omit'):
+        product_names, lesson_names = set(), set()
+        for name in query_params.get(param, '').split(','):
+            name = name.strip()
+            if name.startswith('lessons.'):
+                lesson_names.add(name[len('lessons.'):])
+            elif name:
+                product_names.add(name)
+        unknown = sorted(
+            (product_names - product_all)
+            | {f'lessons.{name}' for name in lesson_names - lesson_all}
+        )
+        if unknown:
+            raise ValidationError(
+                {param: f'Неизвестные поля: {", ".join(unknown)}.'})
+        selection[param] = product_names, lesson_names
+
+    product_fields, lesson_fields = selection['fields']
+    if lesson_fields:
+        product_fields = product_fields and product_fields | {'lessons'}
+    product_fields = (product_fields or product_all) - selection['omit'][0]
+    lesson_fields = (lesson_fields or lesson_all) - selection['omit'][1]
+    return (
+        None if product_fields == product_all else product_fields,
+        None if lesson_fields == lesson_all else lesson_fields,
+    )
+
+
+class ProgressEventSerializer(serializers.Serializer):
+    """
+    Сериализатор события прогресса просмотра урока, присылаемого
+    видеоплеером.
+    """
+    user = serializers.CharField(max_length=150)
+    product = serializers.SlugField(max_length=64)
+    lesson = serializers.SlugField(max_length=64)
+    time_duration = serializers.IntegerField(min_value=0)
+    last_viewed_date = serializers.DateTimeField()
+
+
+class WatchTimeseriesQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров запроса временного ряда просмотров.
+    Диапазон дней задаётся включительно; количество интервалов
+    ограничено настройкой WATCH_TIMESERIES_MAX_POINTS.
+    """
+    product = serializers.SlugField(max_length=64)
+    lesson = serializers.SlugField(max_length=64, required=False)
+    start = serializers.DateField()
+    end = serializers.DateField()
+    granularity = serializers.ChoiceField(
+        choices=WatchRollup.GRANULARITIES,
+        default=WatchRollup.DAY,
+    )
+
+    def validate(self, data):
+        if data['end'] < data['start']:
+            raise ValidationError('Дата end раньше даты start.')
+        points = (data['end'] - data['start']).days + 1
+        if data['granularity'] == WatchRollup.HOUR:
+            points *= 24
+        if points > settings.WATCH_TIMESERIES_MAX_POINTS:
+            raise ValidationError(
+                f'Диапазон содержит {points} интервалов, допускается '
+                f'не больше {settings.WATCH_TIMESERIES_MAX_POINTS}.')
+        return data
+
+
+class WatchPointSerializer(serializers.Serializer):
+    """
+    Сериализатор интервала временного ряда просмотров.
+    """
+    bucket = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
+    seconds = serializers.IntegerField()
+    events = serializers.IntegerField()
+
+
+class StatisticExportQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров запроса выгрузки статистики просмотров.
+    """
+    output = serializers.ChoiceField(
+        choices=('csv', 'ndjson'),
+        default='csv',
+    )
+    after = serializers.IntegerField(min_value=0, default=0)
+
+
 class MainProductSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели Product, используемый для получения
     основной статистики.
+
+    Ожидает выборку продуктов, подготовленную функцией
+    api.statistics.annotate_main_statistics, и общее количество
+    пользователей в контексте под ключом 'num_users'.
     """
-    num_lessons_viewed_all_students = serializers.SerializerMethodField()
-    num_lessons = serializers.SerializerMethodField()
-    time_all_students_spent_seconds = serializers.SerializerMethodField()
-    num_students_on_product = serializers.SerializerMethodField()
+    num_lessons_viewed_all_students = serializers.IntegerField(
+        read_only=True)
+    num_lessons = serializers.IntegerField(read_only=True)
+    time_all_students_spent_seconds = serializers.IntegerField(
+        read_only=True)
+    num_students_on_product = serializers.IntegerField(read_only=True)
     product_acquisition_percentage = serializers.SerializerMethodField()
 
     class Meta:
@@ -160,48 +326,15 @@ class MainProductSerializer(serializers.ModelSerializer):
             'product_acquisition_percentage',
         )
 
-    def get_num_lessons(self, product):
-        """
-        Получает количество уроков для данного продукта.
-        - product: Объект продукта.
-        Возвращает количество уроков.
-        """
-        return product.lessons.all().count()
-
-    def get_num_lessons_viewed_all_students(self, product):
-        """
-        Получает количество уроков, которые были просмотрены всеми
-        студентами для данного продукта.
-        - product: Объект продукта.
-        Возвращает количество уроков, просмотренных всеми студентами.
-        """
-        return Statistic.objects.filter(
-            product=product,
-            status=True,
-        ).count()
-
-    def get_time_all_students_spent_seconds(self, product):
-        """
-        Получает общее время, которое все студенты провели на данном продукте.
-        - product: Объект продукта.
-        Возвращает общее время в секундах.
-        """
-        from django.db.models.functions import Coalesce
-        return Statistic.objects.filter(product=product).aggregate(
-            total_duration=Coalesce(Sum('time_duration'), Value(0)))[
-            'total_duration']
-
-    def get_num_students_on_product(self, product):
+    def get_product_acquisition_percentage(self, product):
         """
-        Получает количество студентов, имеющих доступ к данному продукту.
-        - product: Объект продукта.
-        Возвращает количество студентов.
+        Получает процент приобретения данного продукта.
+        - product: Объект продукта с аннотацией num_students_on_product.
+        Возвращает отношение количества студентов на продукте к общему
+        количеству пользователей в процентах или 0, если пользователей
+        на платформе нет.
         """
-        self.num_students_on_product = Access.objects.filter(
-            product=product,
-            access_granted=True,
-        ).count()
-        return self.num_students_on_product
-
-    def get_product_acquisition_percentage(self, product):
-        return self.num_students_on_product / User.objects.all().count() * 100
+        if not self.context['num_users']:
+            return 0
+        return (product.num_students_on_product
+                / self.context['num_users'] * 100)
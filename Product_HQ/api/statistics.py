@@ -0,0 +1,49 @@
+"""
+Модуль, содержащий получение основной статистики по продуктам.
+
+Показатели продуктов читаются из денормализованной таблицы ProductStats,
+которая обновляется инкрементально при записи статистики и доступов,
+а количество пользователей платформы — из счётчика
+(product.stats.get_platform_user_count).
+"""
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from product.models import Product
+from product.stats import get_platform_user_count
+
+# Соответствие полей ответа API полям ProductStats.
+MAIN_STATISTICS_FIELDS = {
+    'num_lessons': 'stats__num_lessons',
+    'num_lessons_viewed_all_students': 'stats__num_lessons_viewed',
+    'time_all_students_spent_seconds': 'stats__time_spent_seconds',
+    'num_students_on_product': 'stats__num_students',
+}
+
+
+def annotate_main_statistics(queryset):
+    """
+    Добавляет к выборке продуктов показатели основной статистики
+    из таблицы ProductStats.
+    - queryset: Выборка продуктов.
+    Возвращает выборку с аннотациями num_lessons,
+    num_lessons_viewed_all_students, time_all_students_spent_seconds
+    и num_students_on_product.
+    """
+    return queryset.annotate(**{
+        name: Coalesce(F(field), 0)
+        for name, field in MAIN_STATISTICS_FIELDS.items()
+    })
+
+
+def get_main_statistics():
+    """
+    Получает основную статистику по всем продуктам.
+    Возвращает кортеж (products, num_users), где:
+    - products: Выборка продуктов с аннотациями показателей.
+    - num_users: Общее количество пользователей на платформе.
+    """
+    products = annotate_main_statistics(Product.objects.all())
+    num_users = get_platform_user_count()
+    return products, num_users
@@ -0,0 +1,137 @@
+"""
+Модуль, содержащий потоковую отдачу больших списков в формате JSON
+или NDJSON.
+
+Элементы сериализуются по одному по мере чтения из базы данных,
+поэтому потребление памяти не зависит от количества элементов,
+а первые байты ответа отправляются сразу.
+
+Под ASGI Django 4.2 читает синхронное содержимое StreamingHttpResponse
+целиком до отправки первого байта, поэтому для запросов ASGI
+содержимое оборачивается в асинхронный итератор (stream_for_request),
+читающий синхронный итератор частями в потоке.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from rest_framework.exceptions import ValidationError
+
+from api.renderers import encode_json
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Количество строк, читаемых из базы данных за один раз.
+STREAM_CHUNK_SIZE = 2000
+
+# Минимальный размер части ответа в байтах, читаемой из синхронного
+# итератора за один переход в поток под ASGI.
+ASYNC_PART_SIZE = 64 * 1024
+
+
+def iter_json_array(rows):
+    """
+    Кодирует последовательность элементов в массив JSON по частям.
+    - rows: Итерируемая последовательность сериализованных элементов.
+    """
+    separator = b'['
+    for row in rows:
+        yield separator + encode_json(row)
+        separator = b','
+    yield b'[]' if separator == b'[' else b']'
+
+
+def iter_ndjson(rows):
+    """
+    Кодирует последовательность элементов в NDJSON: по одному объекту
+    JSON на строку.
+    - rows: Итерируемая последовательность сериализованных элементов.
+    """
+    for row in rows:
+        yield encode_json(row) + b'\n'
+
+
+def _read_part(chunks, size):
+    """
+    Читает из итератора байтовые строки общей длиной не меньше size.
+    - chunks: Итератор байтовых строк.
+    - size: Минимальная длина части.
+    Возвращает объединение прочитанных строк или None, если итератор
+    исчерпан.
+    """
+    parts = []
+    length = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            break
+    return b''.join(parts) if parts else None
+
+
+async def aiter_in_thread(chunks, size=ASYNC_PART_SIZE):
+    """
+    Асинхронно читает синхронную последовательность байтовых строк
+    частями не меньше size байт, кроме последней. Каждая часть
+    читается в потоке через sync_to_async, поэтому синхронный итератор
+    может обращаться к базе данных.
+    - chunks: Итерируемая последовательность байтовых строк.
+    - size: Минимальный размер части.
+    """
+    chunks = iter(chunks)
+    read_part = sync_to_async(_read_part)
+    while True:
+        part = await read_part(chunks, size)
+        if part is None:
+            return
+        yield part
+
+
+def stream_for_request(request, chunks):
+    """
+    Возвращает содержимое потокового ответа, подходящее серверу
+    запроса: для запроса ASGI — асинхронный итератор aiter_in_thread,
+    иначе исходную последовательность.
+    - request: Объект запроса HTTP (Django или REST framework).
+    - chunks: Итерируемая последовательность байтовых строк.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return aiter_in_thread(chunks)
+    return chunks
+
+
+def get_stream_format(query_params, param='stream'):
+    """
+    Получает формат потоковой отдачи из параметра запроса.
+    - query_params: Параметры запроса.
+    - param: Имя параметра.
+    Возвращает 'json', 'ndjson' или None, если потоковая отдача
+    не запрошена.
+    """
+    stream_format = query_params.get(param)
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        raise ValidationError({
+            param: f'Допустимые значения: {", ".join(STREAM_FORMATS)}.'})
+    return stream_format
+
+
+def streaming_response(request, rows, stream_format):
+    """
+    Создаёт потоковый HTTP-ответ.
+    - request: Объект запроса HTTP.
+    - rows: Итерируемая последовательность сериализованных элементов.
+    - stream_format: 'json' для массива JSON или 'ndjson'.
+    Возвращает объект StreamingHttpResponse.
+    """
+    chunks = (
+        iter_json_array(rows) if stream_format == 'json'
+        else iter_ndjson(rows)
+    )
+    return StreamingHttpResponse(
+        stream_for_request(request, chunks),
+        content_type=STREAM_FORMATS[stream_format],
+    )
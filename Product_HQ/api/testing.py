@@ -0,0 +1,46 @@
+"""
+Модуль, содержащий вспомогательные функции тестов API для контроля
+количества SQL-запросов.
+
+Пример:
+
+    with assert_query_budget(url_name='api:users'):
+        response = self.client.get(url)
+    metrics = get_request_metrics(response)
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from api.instrumentation import QueryBudgetExceeded, collect_metrics
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, url_name=None):
+    """
+    Проверяет, что внутри блока выполнено не больше max_queries
+    SQL-запросов, иначе вызывает исключение QueryBudgetExceeded
+    со списком повторяющихся запросов.
+    - max_queries: Допустимое количество запросов.
+    - url_name: Имя URL, бюджет которого берётся из настройки
+      API_QUERY_BUDGETS, если max_queries не указано.
+    Возвращает объект RequestMetrics.
+    """
+    if max_queries is None:
+        max_queries = settings.API_QUERY_BUDGETS[url_name]
+    with collect_metrics() as metrics:
+        yield metrics
+    if metrics.queries > max_queries:
+        raise QueryBudgetExceeded(
+            f'{metrics.queries} SQL-запросов при бюджете {max_queries}; '
+            f'повторяющиеся запросы: {metrics.duplicates}'
+        )
+
+
+def get_request_metrics(response):
+    """
+    Возвращает показатели запроса (RequestMetrics), записанные
+    промежуточным слоем QueryInstrumentationMiddleware, или None.
+    """
+    return getattr(response, 'request_metrics', None)
@@ -0,0 +1,602 @@
+"""
+Тесты API.
+"""
+
+import base64
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from api.async_views import (MAIN_STATISTICS_UNSUPPORTED_PARAMS,
+                             USER_UNSUPPORTED_PARAMS)
+from api.cache import user_payload_cache
+from api.catalogue import product_catalogue
+from api.exports import EXPORT_FORMATS, accepts_gzip, export_statistics
+from api.instrumentation import QueryBudgetExceeded
+from api.pagination import encode_cursor
+from api.testing import assert_query_budget, get_request_metrics
+from product.entitlements import access_index
+from product.models import Access, Lesson, Product, Statistic, User
+from product.versions import bump_user_versions
+
+
+def create_catalogue(username, num_products, num_lessons):
+    """
+    Создаёт пользователя с доступом к num_products продуктам
+    по num_lessons уроков, каждый из которых он просмотрел.
+    - username: Имя пользователя.
+    - num_products: Количество продуктов.
+    - num_lessons: Количество уроков каждого продукта.
+    Возвращает кортеж (пользователь, первый продукт).
+    """
+    user = User.objects.create(username=username)
+    owner = User.objects.create(username=f'{username}-owner')
+    products = []
+    for product_number in range(num_products):
+        product = Product.objects.create(
+            name=f'{username} {product_number}',
+            slug=f'{username}-{product_number}',
+            text='Описание',
+            owner=owner,
+        )
+        lessons = [
+            Lesson.objects.create(
+                name=f'{product.name} {lesson_number}',
+                slug=f'{product.slug}-{lesson_number}',
+                text='Описание',
+                video_url=f'https://example.com/{product.slug}/'
+                          f'{lesson_number}',
+                video_duration=100,
+            )
+            for lesson_number in range(num_lessons)
+        ]
+        product.lessons.set(lessons)
+        Access.objects.create(user=user, product=product, access_granted=True)
+        for lesson in lessons:
+            Statistic.objects.create(
+                user=user,
+                product=product,
+                lesson=lesson,
+                time_duration=90,
+                last_viewed_date=timezone.now(),
+            )
+        products.append(product)
+    return user, products[0]
+
+
+@override_settings(API_QUERY_BUDGET_ACTION='raise')
+class APITestCase(TestCase):
+    """
+    Тест API, в котором превышение бюджета SQL-запросов эндпоинта
+    (API_QUERY_BUDGETS) вызывает исключение QueryBudgetExceeded,
+    в том числе при чтении потокового ответа.
+    """
+
+    def setUp(self):
+        user_payload_cache.clear()
+        product_catalogue.clear()
+        access_index.clear()
+
+
+class UserProductsQueryCountTests(APITestCase):
+    """
+    Количество SQL-запросов эндпоинтов данных пользователя не зависит
+    от количества продуктов и уроков.
+    """
+
+    def count_queries(self, url):
+        """
+        Возвращает количество SQL-запросов GET-запроса к url.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, get_url):
+        """
+        Проверяет, что количество запросов одинаково для небольшого
+        и большого каталога.
+        - get_url: Функция (пользователь, продукт), возвращающая адрес.
+        """
+        small = self.count_queries(get_url(*create_catalogue('small', 2, 2)))
+        user, product = create_catalogue('large', 8, 12)
+        with self.assertNumQueries(small):
+            response = self.client.get(get_url(user, product))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.json()['products'][0]['lessons']), 12)
+
+    def list_url(self, user, product):
+        return reverse('api:users', kwargs={'user_slug': user.username})
+
+    def detail_url(self, user, product):
+        return reverse('api:users', kwargs={
+            'user_slug': user.username,
+            'product_slug': product.slug,
+        })
+
+    def test_list(self):
+        self.assert_constant_queries(self.list_url)
+
+    def test_detail(self):
+        self.assert_constant_queries(self.detail_url)
+
+    @override_settings(API_FAST_SERIALIZERS=False)
+    def test_list_reference_serializers(self):
+        self.assert_constant_queries(self.list_url)
+
+    @override_settings(API_FAST_SERIALIZERS=False)
+    def test_detail_reference_serializers(self):
+        self.assert_constant_queries(self.detail_url)
+
+
+class ConditionalRequestTests(APITestCase):
+    """
+    Ответы с данными пользователя содержат валидаторы ETag
+    и Last-Modified, которые меняются вместе с данными.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.product = create_catalogue('student', 2, 2)
+        self.url = reverse('api:users', kwargs={
+            'user_slug': self.user.username})
+
+    def assert_changed(self, previous, text):
+        """
+        Проверяет, что ответ изменился: ETag отличается от previous,
+        а тело содержит text. Возвращает новый ответ.
+        """
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=previous)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], previous)
+        self.assertContains(response, text)
+        return response
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_async_view_shares_validators(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(
+            reverse('api:async-users', kwargs={
+                'user_slug': self.user.username}),
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_statistic_change(self):
+        etag = self.client.get(self.url)['ETag']
+        statistic = Statistic.objects.filter(user=self.user).first()
+        statistic.time_duration = 77
+        statistic.save()
+        self.assert_changed(etag, '"time_duration":77')
+
+    def test_lesson_change(self):
+        etag = self.client.get(self.url)['ETag']
+        lesson = self.product.lessons.first()
+        lesson.name = 'Новое название'
+        lesson.save()
+        self.assert_changed(etag, 'Новое название')
+
+    def test_owner_rename(self):
+        etag = self.client.get(self.url)['ETag']
+        owner = self.product.owner
+        owner.username = 'renamed-owner'
+        owner.save()
+        self.assert_changed(etag, 'renamed-owner')
+
+    def test_cached_payload_keyed_on_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        # Изменение без сигналов, как в другом процессе: кэш этого
+        # процесса не получает уведомления об изменении.
+        Statistic.objects.filter(user=self.user).update(time_duration=55)
+        bump_user_versions([self.user.pk])
+        self.assert_changed(etag, '"time_duration":55')
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Эндпоинты укладываются в бюджеты SQL-запросов из настройки
+    API_QUERY_BUDGETS.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.product = create_catalogue('student', 3, 4)
+
+    def get_within_budget(self, url_name, url):
+        """
+        Выполняет GET-запрос, проверяя бюджет SQL-запросов url_name;
+        тело потокового ответа читается внутри проверки.
+        Возвращает тело ответа.
+        """
+        with assert_query_budget(url_name=url_name):
+            response = self.client.get(url)
+            content = (
+                b''.join(response.streaming_content) if response.streaming
+                else response.content
+            )
+        self.assertEqual(response.status_code, 200)
+        return content
+
+    def test_users(self):
+        for url_name in ('api:users', 'api:async-users'):
+            with self.subTest(url_name=url_name):
+                self.get_within_budget(url_name, reverse(url_name, kwargs={
+                    'user_slug': self.user.username}))
+                self.get_within_budget(url_name, reverse(url_name, kwargs={
+                    'user_slug': self.user.username,
+                    'product_slug': self.product.slug,
+                }))
+
+    def test_main_statistics(self):
+        for url_name in ('api:main-statistics', 'api:async-main-statistics'):
+            with self.subTest(url_name=url_name):
+                self.get_within_budget(url_name, reverse(url_name))
+
+    def test_main_statistics_streaming(self):
+        url = reverse('api:main-statistics')
+        for stream_format in ('json', 'ndjson'):
+            with self.subTest(stream_format=stream_format):
+                content = self.get_within_budget(
+                    'api:main-statistics', f'{url}?stream={stream_format}')
+                self.assertIn(self.product.name.encode(), content)
+
+    def test_streaming_queries_counted(self):
+        url = reverse('api:main-statistics')
+        with override_settings(API_QUERY_BUDGETS={'api:main-statistics': 1}):
+            response = self.client.get(f'{url}?stream=ndjson')
+            self.assertEqual(get_request_metrics(response).queries, 1)
+            with self.assertRaises(QueryBudgetExceeded):
+                b''.join(response.streaming_content)
+        self.assertEqual(get_request_metrics(response).queries, 2)
+
+
+class FastSerializerTests(APITestCase):
+    """
+    Быстрые сериализаторы (API_FAST_SERIALIZERS) выводят те же данные,
+    что и эталонные сериализаторы rest_framework.
+    """
+
+    QUERIES = (
+        '',
+        '?fields=name,owner',
+        '?omit=text,lessons.text',
+        '?fields=lessons.name,lessons.statistics',
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.product = create_catalogue('student', 3, 4)
+        # Урок без статистики и статистика с пустой датой просмотра.
+        lesson = Lesson.objects.create(
+            name='Урок без просмотров',
+            slug='unwatched',
+            text='Описание',
+            video_url='https://example.com/unwatched',
+            video_duration=100,
+        )
+        self.product.lessons.add(lesson)
+        Statistic.objects.filter(user=self.user).update(
+            last_viewed_date=None)
+
+    def get_json(self, url, fast):
+        """
+        Возвращает ответ JSON с быстрыми или эталонными сериализаторами.
+        """
+        user_payload_cache.clear()
+        product_catalogue.clear()
+        with override_settings(API_FAST_SERIALIZERS=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def assert_same_output(self, url):
+        for query in self.QUERIES:
+            with self.subTest(url=url + query):
+                self.assertEqual(
+                    self.get_json(url + query, fast=True),
+                    self.get_json(url + query, fast=False),
+                )
+
+    def test_list(self):
+        self.assert_same_output(reverse('api:users', kwargs={
+            'user_slug': self.user.username}))
+
+    def test_detail(self):
+        self.assert_same_output(reverse('api:users', kwargs={
+            'user_slug': self.user.username,
+            'product_slug': self.product.slug,
+        }))
+
+
+class StatisticsBulkTests(APITestCase):
+    """
+    Массовая запись прогресса просмотра: значения не уменьшаются,
+    некорректные события отклоняются, пользователи без прав
+    администратора записывают только собственный прогресс.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.product = create_catalogue('student', 1, 2)
+        self.lessons = list(self.product.lessons.order_by('slug'))
+        self.url = reverse('api:statistics-bulk')
+        self.client.force_login(
+            User.objects.create(username='ingest', is_staff=True))
+
+    def event(self, lesson, time_duration, last_viewed_date, **kwargs):
+        return {
+            'user': self.user.username,
+            'product': self.product.slug,
+            'lesson': lesson.slug,
+            'time_duration': time_duration,
+            'last_viewed_date': last_viewed_date.isoformat(),
+            **kwargs,
+        }
+
+    def post(self, events):
+        return self.client.post(
+            self.url, events, content_type='application/json')
+
+    def statistic(self, lesson):
+        return Statistic.objects.get(
+            user=self.user, product=self.product, lesson=lesson)
+
+    def test_progress_does_not_decrease(self):
+        lesson = self.lessons[0]
+        saved = self.statistic(lesson)
+        earlier = saved.last_viewed_date - timedelta(days=1)
+        response = self.post([self.event(lesson, 10, earlier)])
+        self.assertEqual(response.status_code, 200)
+        statistic = self.statistic(lesson)
+        self.assertEqual(statistic.time_duration, saved.time_duration)
+        self.assertEqual(statistic.last_viewed_date, saved.last_viewed_date)
+
+        later = saved.last_viewed_date + timedelta(minutes=5)
+        response = self.post([
+            self.event(lesson, 95, later),
+            self.event(lesson, 92, later - timedelta(minutes=1)),
+        ])
+        self.assertEqual(response.json(), {'saved': 1, 'rejected': []})
+        statistic = self.statistic(lesson)
+        self.assertEqual(statistic.time_duration, 95)
+        self.assertEqual(statistic.last_viewed_date, later)
+
+    def test_invalid_events_rejected(self):
+        other, _ = create_catalogue('other', 1, 1)
+        foreign_lesson = Lesson.objects.get(slug='other-0-0')
+        now = timezone.now()
+        response = self.post([
+            self.event(self.lessons[0], 99, now),
+            self.event(self.lessons[1], 99, now, user=other.username),
+            self.event(foreign_lesson, 99, now),
+            self.event(self.lessons[1], 99, now, product='missing'),
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'saved': 1, 'rejected': [1, 2, 3]})
+        self.assertFalse(Statistic.objects.filter(user=other).exclude(
+            lesson__slug='other-0-0').exists())
+
+    @override_settings(PROGRESS_EVENTS_MAX_BATCH=2)
+    def test_batch_size_limited(self):
+        now = timezone.now()
+        response = self.post([self.event(self.lessons[0], 10, now)] * 3)
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_staff_writes_own_progress_only(self):
+        self.client.force_login(self.user)
+        now = timezone.now()
+        response = self.post([self.event(self.lessons[0], 99, now)])
+        self.assertEqual(response.status_code, 200)
+        other, _ = create_catalogue('other', 1, 1)
+        response = self.post([
+            self.event(self.lessons[0], 99, now, user=other.username)])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class CursorPaginationTests(APITestCase):
+    """
+    Курсорная пагинация продуктов и уроков проходит все элементы
+    по одному разу, а некорректные курсоры отклоняются с ответом 400.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.product = create_catalogue('student', 7, 5)
+        self.list_url = reverse('api:users', kwargs={
+            'user_slug': self.user.username})
+        self.detail_url = reverse('api:users', kwargs={
+            'user_slug': self.user.username,
+            'product_slug': self.product.slug,
+        })
+
+    def walk(self, url, limit, get_items):
+        """
+        Проходит все страницы url и возвращает список элементов.
+        """
+        items = []
+        params = {'limit': limit}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            page = get_items(data)
+            self.assertLessEqual(len(page), limit)
+            items.extend(page)
+            if data['next'] is None:
+                return items
+            params = {'limit': limit, 'cursor': data['next']}
+
+    def test_products(self):
+        full = self.client.get(self.list_url).json()['products']
+        names = self.walk(
+            self.list_url, 3,
+            lambda data: [item['name'] for item in data['products']])
+        self.assertEqual(names, [item['name'] for item in full])
+
+    def test_lessons(self):
+        full = self.client.get(self.detail_url).json()['products'][0]
+        slugs = self.walk(
+            self.detail_url, 2,
+            lambda data: [
+                item['slug'] for item in data['products'][0]['lessons']])
+        self.assertEqual(slugs, [item['slug'] for item in full['lessons']])
+
+    def test_invalid_cursor(self):
+        cursors = {
+            'not base64': 'Не курсор',
+            'not json': base64.urlsafe_b64encode(b'{').decode(),
+            'not a pair': encode_cursor(['name']),
+            'wrong types': encode_cursor([1, 'id']),
+            'bool id': encode_cursor(['name', True]),
+        }
+        for name, cursor in cursors.items():
+            for url in (self.list_url, self.detail_url):
+                with self.subTest(cursor=name, url=url):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('cursor', response.json())
+        response = self.client.get(
+            self.detail_url, {'cursor': encode_cursor(['not a date', 1])})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_limit(self):
+        for limit in ('0', '101', 'ten'):
+            with self.subTest(limit=limit):
+                response = self.client.get(self.list_url, {'limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', response.json())
+
+
+class AsyncViewParamsTests(APITestCase):
+    """
+    Асинхронные представления отвечают 400 на параметры, которые они
+    не поддерживают, вместо того чтобы молча их игнорировать.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.product = create_catalogue('student', 1, 1)
+
+    def test_unsupported_params(self):
+        urls = {
+            reverse('api:async-users', kwargs={
+                'user_slug': self.user.username,
+            }): USER_UNSUPPORTED_PARAMS,
+            reverse('api:async-users', kwargs={
+                'user_slug': self.user.username,
+                'product_slug': self.product.slug,
+            }): USER_UNSUPPORTED_PARAMS,
+            reverse('api:async-main-statistics'):
+                MAIN_STATISTICS_UNSUPPORTED_PARAMS,
+        }
+        for url, params in urls.items():
+            self.assertEqual(self.client.get(url).status_code, 200)
+            for param in params:
+                with self.subTest(url=url, param=param):
+                    response = self.client.get(url, {param: '1'})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(list(response.json()), [param])
+
+
+class AcceptsGzipTests(SimpleTestCase):
+    """
+    Разбор заголовка Accept-Encoding с учётом весов q.
+    """
+
+    def test_accepts_gzip(self):
+        cases = {
+            '': False,
+            'gzip': True,
+            'GZIP': True,
+            'deflate, gzip;q=0.5': True,
+            'gzip;q=0': False,
+            'gzip; q=0.0, *': False,
+            'br, *': True,
+            '*;q=0': False,
+            'x-gzip': True,
+            'gzip;q=abc': False,
+            'identity': False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertIs(accepts_gzip(header), expected)
+
+
+class StatisticsExportTests(APITestCase):
+    """
+    Потоковая выгрузка статистики просмотров.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.product = create_catalogue('student', 2, 3)
+        self.url = reverse('api:statistics-export')
+        self.client.force_login(
+            User.objects.create(username='admin', is_staff=True))
+
+    def export(self, params=None, **headers):
+        response = self.client.get(self.url, params or {}, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], EXPORT_FORMATS['csv'])
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(
+            [int(row['id']) for row in rows],
+            list(Statistic.objects.order_by('pk').values_list(
+                'pk', flat=True)),
+        )
+        self.assertEqual(rows[0]['username'], self.user.username)
+
+    def test_ndjson_after(self):
+        first = Statistic.objects.order_by('pk').first()
+        _, content = self.export({'output': 'ndjson', 'after': first.pk})
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), Statistic.objects.count() - 1)
+        self.assertTrue(all(row['id'] > first.pk for row in rows))
+
+    def test_gzip(self):
+        _, plain = self.export()
+        response, compressed = self.export(
+            HTTP_ACCEPT_ENCODING='deflate, gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+        response, content = self.export(HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(content, plain)
+
+    def test_chunked_reading(self):
+        expected = b''.join(export_statistics('ndjson'))
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(export_statistics('ndjson', chunk_size=2))
+        self.assertEqual(content, expected)
+        # Шесть строк читаются четырьмя запросами по две строки.
+        self.assertEqual(len(queries), 4)
+
+    def test_admin_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from api import views
+from api import async_views, views
 
 app_name = 'api'
 
@@ -22,4 +22,46 @@ urlpatterns = [
         views.MainStatisticsView.as_view(),
         name='main-statistics',
     ),
+
+    path(
+        'statistics/bulk/',
+        views.StatisticsBulkView.as_view(),
+        name='statistics-bulk',
+    ),
+
+    path(
+        'statistics/heartbeat/',
+        views.StatisticsHeartbeatView.as_view(),
+        name='statistics-heartbeat',
+    ),
+
+    path(
+        'statistics/timeseries/',
+        views.StatisticsTimeseriesView.as_view(),
+        name='statistics-timeseries',
+    ),
+
+    path(
+        'statistics/export/',
+        views.StatisticsExportView.as_view(),
+        name='statistics-export',
+    ),
+
+    path(
+        'async/users/<slug:user_slug>/',
+        async_views.AsyncUserProductsListView.as_view(),
+        name='async-users',
+    ),
+
+    path(
+        'async/users/<slug:user_slug>/products/<slug:product_slug>/',
+        async_views.AsyncUserProductsDetailView.as_view(),
+        name='async-users',
+    ),
+
+    path(
+        'async/main-statistics/',
+        async_views.AsyncMainStatisticsView.as_view(),
+        name='async-main-statistics',
+    ),
 ]
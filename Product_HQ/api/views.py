@@ -2,14 +2,93 @@
 Модуль, содержащий представления API для работы с продуктами и пользователями.
 """
 
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
 
+from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.serializers import MainProductSerializer, UserSerializer
-from product.models import Access, Product, User
+from api.cache import user_payload_cache
+from api.conditional import conditional_response, get_validators
+from api.exports import EXPORT_FORMATS, accepts_gzip, export_statistics
+from api.fast_serializers import serialize_user_products_fast
+from api.instrumentation import measure
+from api.loaders import load_user_products
+from api.pagination import encode_cursor, get_page
+from api.permissions import CanWriteProgress
+from api.serializers import (MainProductSerializer, ProgressEventSerializer,
+                             StatisticExportQuerySerializer, UserSerializer,
+                             WatchPointSerializer,
+                             WatchTimeseriesQuerySerializer,
+                             get_field_selection)
+from api.statistics import get_main_statistics
+from api.streaming import (STREAM_CHUNK_SIZE, get_stream_format,
+                           stream_for_request, streaming_response)
+from product.buffer import get_progress_buffer
+from product.entitlements import access_index
+from product.models import Lesson, Product, User
+from product.rollups import get_watch_timeseries
+from product.services import ProgressEvent, save_progress_events
+
+
+@measure('serialize')
+def serialize_user_products(user, product=None, query_params=None):
+    """
+    Сериализует данные пользователя с учётом параметров запроса
+    пагинации (limit, cursor) и выбора полей (fields, omit).
+    - user: Объект пользователя.
+    - product: Объект продукта; если указан, выводится только он,
+      а пагинация применяется к его урокам.
+    - query_params: Параметры запроса.
+    Возвращает данные пользователя; при пагинации в них добавляется
+    курсор следующей страницы next. Без пагинации при включённой
+    настройке API_FAST_SERIALIZERS используются быстрые сериализаторы.
+    """
+    query_params = query_params or {}
+    page = get_page(query_params)
+    product_fields, lesson_fields = get_field_selection(query_params)
+    if page is None and settings.API_FAST_SERIALIZERS:
+        return serialize_user_products_fast(
+            user,
+            product=product,
+            product_fields=product_fields,
+            lesson_fields=lesson_fields,
+        )
+    loaded = load_user_products(
+        user,
+        product=product,
+        product_fields=product_fields,
+        lesson_fields=lesson_fields,
+        page=page,
+    )
+    data = UserSerializer(
+        user,
+        context={
+            'product': product,
+            'loaded': loaded,
+            'product_fields': product_fields,
+            'lesson_fields': lesson_fields,
+        },
+    ).data
+    if page is not None:
+        data['next'] = loaded.next and encode_cursor(loaded.next)
+    return data
+
+
+def is_default_representation(query_params):
+    """
+    Проверяет, запрошено ли представление по умолчанию, без пагинации
+    и выбора полей. Только такое представление кэшируется.
+    """
+    return not any(
+        param in query_params
+        for param in ('limit', 'cursor', 'fields', 'omit')
+    )
 
 
 class UserProductsListView(APIView):
@@ -21,10 +100,30 @@ class UserProductsListView(APIView):
         Обработчик GET-запроса для получения списка продуктов пользователя.
         - user_slug: Строка - Слаг пользователя.
         Возвращает данные пользователя в виде HTTP-ответа.
+        Поддерживает параметры limit и cursor для постраничного вывода
+        продуктов и fields, omit для выбора выводимых полей, а также
+        условные запросы с заголовками If-None-Match и If-Modified-Since.
         """
         user = get_object_or_404(User, username=user_slug)
-        serializer = UserSerializer(user)
-        return Response(serializer.data)
+        validators = get_validators(user, query_params=request.query_params)
+        return conditional_response(
+            request,
+            validators,
+            lambda: Response(
+                self.get_data(user, request.query_params, validators[0])),
+        )
+
+    def get_data(self, user, query_params, etag):
+        """
+        Получает данные пользователя; представление по умолчанию
+        берётся из кэша по ETag.
+        """
+        if not is_default_representation(query_params):
+            return serialize_user_products(user, query_params=query_params)
+        return user_payload_cache.get_or_build(
+            etag,
+            lambda: serialize_user_products(user),
+        )
 
 
 class UserProductsDetailView(APIView):
@@ -37,25 +136,41 @@ class UserProductsDetailView(APIView):
         - user_slug: Строка — Слаг пользователя.
         - product_slug: Строка — Слаг продукта.
         Возвращает данные пользователя в виде HTTP-ответа.
+        Поддерживает параметры limit и cursor для постраничного вывода
+        уроков продукта и fields, omit для выбора выводимых полей, а также
+        условные запросы с заголовками If-None-Match и If-Modified-Since.
         """
         user = get_object_or_404(User, username=user_slug)
         product = get_object_or_404(Product, slug=product_slug)
 
-        access = Access.objects.filter(
-            user=user,
-            product=product,
-            access_granted=True,
-        ).exists()
-
-        if not access:
+        if not access_index.has_access(user.pk, product.pk):
             raise PermissionDenied(
                 "У данного пользователя нет доступа к данному продукту")
 
-        serializer = UserSerializer(
-            user,
-            context={'product': product},
+        validators = get_validators(
+            user, product=product, query_params=request.query_params)
+        return conditional_response(
+            request,
+            validators,
+            lambda: Response(self.get_data(
+                user, product, request.query_params, validators[0])),
+        )
+
+    def get_data(self, user, product, query_params, etag):
+        """
+        Получает данные пользователя по продукту; представление
+        по умолчанию берётся из кэша по ETag.
+        """
+        if not is_default_representation(query_params):
+            return serialize_user_products(
+                user,
+                product=product,
+                query_params=query_params,
+            )
+        return user_payload_cache.get_or_build(
+            etag,
+            lambda: serialize_user_products(user, product=product),
         )
-        return Response(serializer.data)
 
 
 class MainStatisticsView(APIView):
@@ -67,7 +182,225 @@ class MainStatisticsView(APIView):
         Обработчик GET-запроса для получения основной статистики.
         - request: Объект запроса HTTP.
         Возвращает данные основной статистики в виде HTTP-ответа.
+        С параметром stream=json или stream=ndjson данные отдаются
+        потоково, по мере чтения продуктов из базы данных.
         """
-        products = Product.objects.all()
-        serializer = MainProductSerializer(products, many=True)
-        return Response(serializer.data)
+        stream_format = get_stream_format(request.query_params)
+        products, num_users = get_main_statistics()
+        if stream_format is not None:
+            serializer = MainProductSerializer(
+                context={'num_users': num_users})
+            return streaming_response(
+                request,
+                (
+                    serializer.to_representation(product)
+                    for product in products.iterator(
+                        chunk_size=STREAM_CHUNK_SIZE)
+                ),
+                stream_format,
+            )
+        serializer = MainProductSerializer(
+            products,
+            many=True,
+            context={'num_users': num_users},
+        )
+        with measure('serialize'):
+            data = serializer.data
+        return Response(data)
+
+
+def resolve_progress_events(events):
+    """
+    Преобразует проверенные ProgressEventSerializer события, содержащие
+    слаги, в события с идентификаторами тремя запросами.
+    - events: Список проверенных данных событий.
+    Возвращает кортеж (progress, keys), где:
+    - progress: Список объектов ProgressEvent для найденных объектов.
+    - keys: Список ключей (user_id, product_id, lesson_id) для каждого
+      события; вместо ненайденного объекта в ключе стоит None.
+    """
+    users = dict(User.objects.filter(
+        username__in={event['user'] for event in events},
+    ).values_list('username', 'pk'))
+    products = dict(Product.objects.filter(
+        slug__in={event['product'] for event in events},
+    ).values_list('slug', 'pk'))
+    lessons = dict(Lesson.objects.filter(
+        slug__in={event['lesson'] for event in events},
+    ).values_list('slug', 'pk'))
+
+    keys = [
+        (
+            users.get(event['user']),
+            products.get(event['product']),
+            lessons.get(event['lesson']),
+        )
+        for event in events
+    ]
+    progress = [
+        ProgressEvent(*key, event['time_duration'],
+                      event['last_viewed_date'])
+        for key, event in zip(keys, events)
+        if None not in key
+    ]
+    return progress, keys
+
+
+class StatisticsBulkView(APIView):
+    """
+    Представление для массовой записи прогресса просмотра уроков.
+    Администраторы могут записывать прогресс любых пользователей,
+    остальные пользователи — только собственный.
+    """
+    permission_classes = (CanWriteProgress,)
+
+    def post(self, request):
+        """
+        Обработчик POST-запроса со списком событий прогресса просмотра.
+        - request: Объект запроса HTTP; тело запроса — список событий
+          с полями user, product, lesson, time_duration, last_viewed_date;
+          не больше PROGRESS_EVENTS_MAX_BATCH событий.
+        Возвращает количество записанных строк статистики и индексы
+        отклонённых событий в виде HTTP-ответа.
+        """
+        serializer = ProgressEventSerializer(
+            data=request.data,
+            many=True,
+            max_length=settings.PROGRESS_EVENTS_MAX_BATCH,
+        )
+        serializer.is_valid(raise_exception=True)
+        progress, keys = resolve_progress_events(serializer.validated_data)
+        saved, rejected = save_progress_events(progress)
+        rejected = set(rejected)
+        return Response({
+            'saved': saved,
+            'rejected': [
+                index for index, key in enumerate(keys)
+                if None in key or key in rejected
+            ],
+        })
+
+
+class StatisticsHeartbeatView(APIView):
+    """
+    Представление для приёма частых событий прогресса просмотра
+    с отложенной записью через буфер процесса.
+    Администраторы могут записывать прогресс любых пользователей
+    и читать показатели буфера, остальные пользователи — только
+    записывать собственный прогресс.
+    """
+    permission_classes = (CanWriteProgress,)
+
+    def post(self, request):
+        """
+        Обработчик POST-запроса со списком событий прогресса просмотра.
+        - request: Объект запроса HTTP; тело запроса — список событий
+          с полями user, product, lesson, time_duration, last_viewed_date;
+          не больше PROGRESS_EVENTS_MAX_BATCH событий.
+        Возвращает количество принятых в буфер событий и индексы
+        отклонённых событий в виде HTTP-ответа со статусом 202.
+        Проверка доступа выполняется при записи буфера в базу данных.
+        """
+        serializer = ProgressEventSerializer(
+            data=request.data,
+            many=True,
+            max_length=settings.PROGRESS_EVENTS_MAX_BATCH,
+        )
+        serializer.is_valid(raise_exception=True)
+        progress, keys = resolve_progress_events(serializer.validated_data)
+        buffer = get_progress_buffer()
+        accepted = sum(buffer.add(event) for event in progress)
+        return Response(
+            {
+                'accepted': accepted,
+                'rejected': [
+                    index for index, key in enumerate(keys) if None in key
+                ],
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    def get(self, request):
+        """
+        Обработчик GET-запроса для получения показателей буфера.
+        - request: Объект запроса HTTP.
+        Возвращает показатели буфера в виде HTTP-ответа.
+        """
+        return Response(get_progress_buffer().metrics())
+
+
+class StatisticsTimeseriesView(APIView):
+    """
+    Представление для получения временного ряда просмотров продукта.
+    """
+    def get(self, request):
+        """
+        Обработчик GET-запроса для получения временного ряда
+        просмотренных секунд продукта по часам или дням.
+        - request: Объект запроса HTTP с параметрами product, lesson
+          (необязательный), start, end (дни включительно, UTC)
+          и granularity (hour или day, по умолчанию day).
+        Возвращает интервалы диапазона с суммой просмотренных секунд
+        и количеством событий в виде HTTP-ответа. Данные строятся
+        по агрегатам и не содержат ещё не агрегированных событий.
+        """
+        query = WatchTimeseriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        product = get_object_or_404(Product, slug=params['product'])
+        lesson = None
+        if 'lesson' in params:
+            lesson = get_object_or_404(Lesson, slug=params['lesson'])
+        points = get_watch_timeseries(
+            product.pk,
+            params['start'],
+            params['end'],
+            params['granularity'],
+            lesson_id=lesson and lesson.pk,
+        )
+        return Response({
+            'product': product.slug,
+            'lesson': lesson and lesson.slug,
+            'granularity': params['granularity'],
+            'start': params['start'],
+            'end': params['end'],
+            'points': WatchPointSerializer(points, many=True).data,
+        })
+
+
+class StatisticsExportView(APIView):
+    """
+    Представление для потоковой выгрузки статистики просмотров.
+    Доступно только администраторам.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """
+        Обработчик GET-запроса для выгрузки статистики просмотров.
+        - request: Объект запроса HTTP с параметрами output (csv или
+          ndjson, по умолчанию csv) и after (первичный ключ, после
+          которого продолжается выгрузка).
+        Возвращает потоковый HTTP-ответ со строками по возрастанию id.
+        Если клиент принимает gzip (заголовок Accept-Encoding с учётом
+        весов q), ответ сжимается по мере отдачи. Под ASGI выгрузка
+        читается частями через асинхронный итератор.
+        """
+        query = StatisticExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        compress = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        response = StreamingHttpResponse(
+            stream_for_request(request, export_statistics(
+                params['output'],
+                after=params['after'],
+                compress=compress,
+            )),
+            content_type=EXPORT_FORMATS[params['output']],
+        )
+        filename = f'statistics.{params["output"]}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
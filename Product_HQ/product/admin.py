@@ -1,6 +1,56 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
 
-from product.models import Access, Lesson, Product, Statistic
+from product.models import Access, Lesson, Product, Statistic, User
+from product.services import set_product_access
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который для выборок без фильтров в PostgreSQL берёт
+    оценку количества строк из статистики планировщика (pg_class)
+    вместо COUNT(*) по всей таблице. Оценка меньше exact_count_threshold
+    заменяется точным количеством. Для других баз данных и выборок
+    с фильтрами количество считается как обычно.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        estimate = None
+        if (
+            hasattr(queryset, 'query')
+            and not queryset.query.has_filters()
+            and connections[queryset.db].vendor == 'postgresql'
+        ):
+            estimate = self.estimate(queryset)
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+    @staticmethod
+    def estimate(queryset):
+        """
+        Возвращает оценку количества строк таблицы модели выборки
+        или None, если таблица ещё не анализировалась.
+        """
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
 
 
 class LessonInline(admin.TabularInline):
@@ -24,13 +74,17 @@ class ProductAdmin(admin.ModelAdmin):
         'owner',
     )
 
+    list_select_related = (
+        'owner',
+    )
+
     search_fields = (
         'name',
-        'owner',
+        'owner__username',
     )
 
     list_filter = (
-        'owner',
+        ('owner', admin.RelatedOnlyFieldListFilter),
     )
 
     list_display_links = (
@@ -103,17 +157,30 @@ class AccessAdmin(admin.ModelAdmin):
         'access_granted',
     )
 
-    search_fields = (
+    # Product.__str__ выводит владельца продукта.
+    list_select_related = (
         'user',
-        'product',
+        'product__owner',
     )
 
-    list_filter = (
+    autocomplete_fields = (
         'user',
         'product',
+    )
+
+    search_fields = (
+        '=user__username',
+        '=product__slug',
+    )
+
+    list_filter = (
         'access_granted',
     )
 
+    paginator = EstimatedCountPaginator
+
+    show_full_result_count = False
+
     list_display_links = (
         'user',
     )
@@ -139,24 +206,107 @@ class StatisticAdmin(admin.ModelAdmin):
         'time_duration',
     )
 
-    search_fields = (
+    list_select_related = (
         'user',
-        'product',
+        'product__owner',
         'lesson',
     )
 
-    list_filter = (
+    autocomplete_fields = (
         'user',
         'product',
         'lesson',
     )
 
+    search_fields = (
+        '=user__username',
+        '=product__slug',
+        '=lesson__slug',
+    )
+
+    list_filter = (
+        'status',
+    )
+
+    paginator = EstimatedCountPaginator
+
+    show_full_result_count = False
+
     list_display_links = (
         'user',
         'lesson',
     )
 
 
+class ProductAccessForm(forms.Form):
+    """
+    Форма выбора продукта и действия для массового изменения доступов.
+    """
+    product = forms.ModelChoiceField(
+        queryset=Product.objects.order_by('name'),
+        label='Продукт',
+    )
+    access_granted = forms.TypedChoiceField(
+        choices=((True, 'Предоставить доступ'), (False, 'Отозвать доступ')),
+        coerce=lambda value: value == 'True',
+        label='Действие',
+    )
+
+
+@admin.action(description='Изменить доступ к продукту')
+def change_product_access(modeladmin, request, queryset):
+    """
+    Действие администратора, массово предоставляющее или отзывающее
+    доступ выбранных пользователей к продукту через
+    product.services.set_product_access.
+    """
+    form = ProductAccessForm(request.POST if 'apply' in request.POST else None)
+    if form.is_valid():
+        changed, missing = set_product_access(
+            form.cleaned_data['product'].pk,
+            queryset.values_list('pk', flat=True).iterator(),
+            access_granted=form.cleaned_data['access_granted'],
+        )
+        modeladmin.message_user(
+            request,
+            f'Изменено доступов: {changed}',
+            messages.SUCCESS,
+        )
+        return None
+    return TemplateResponse(
+        request,
+        'admin/product/change_product_access.html',
+        {
+            **modeladmin.admin_site.each_context(request),
+            'title': 'Изменение доступа к продукту',
+            'opts': modeladmin.model._meta,
+            'form': form,
+            'count': queryset.count(),
+            # Отмеченные на странице объекты передаются повторно:
+            # без них список изменений не выполнит действие,
+            # даже если выбраны все объекты (select_across).
+            'select_across': request.POST.get('select_across') == '1',
+            'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'action': 'change_product_access',
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+            'media': modeladmin.media,
+        },
+    )
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    """
+    Класс администратора для модели User с действием массового
+    изменения доступа к продукту.
+    """
+
+    actions = (change_product_access,)
+
+
 admin.site.empty_value_display = 'Не задано'
 admin.site.site_title = 'Администрирование Products_HQ'
 admin.site.site_header = 'Администрирование Products_HQ'
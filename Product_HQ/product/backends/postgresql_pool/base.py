@@ -0,0 +1,124 @@
+"""
+Модуль, содержащий бэкенд PostgreSQL с пулом соединений.
+
+Бэкенд подключается в настройке DATABASES как
+ENGINE = 'product.backends.postgresql_pool' и требует пакетов psycopg
+(версии 3) и psycopg_pool. Соединения берутся из пула процесса,
+общего для всех потоков, и возвращаются в него при закрытии соединения
+Django, поэтому CONN_MAX_AGE должен быть равен 0. Это полезно под
+ASGI-сервером, где постоянные соединения CONN_MAX_AGE не переиспользуются
+между запросами.
+
+Параметры пула (min_size, max_size, timeout, max_idle и другие
+аргументы psycopg_pool.ConnectionPool) задаются в OPTIONS['pool'].
+Размер пула, количество свободных соединений и ожидающих запросов,
+а также время ожидания соединения выводятся в метриках product.metrics.
+"""
+
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import (
+    IsolationLevel, is_psycopg3,
+)
+
+from product.metrics import metrics
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError as error:
+    raise ImproperlyConfigured(
+        f'Для бэкенда postgresql_pool требуется пакет psycopg_pool: {error}'
+    )
+
+# Пулы соединений процесса по псевдониму базы данных.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    """
+    Возвращает пул соединений базы данных, создавая его при первом
+    обращении.
+    - alias: Псевдоним базы данных.
+    - conn_params: Параметры соединения psycopg.
+    - options: Аргументы ConnectionPool.
+    """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            options = {'check': ConnectionPool.check_connection, **options}
+            pool = _pools[alias] = ConnectionPool(
+                kwargs=conn_params, name=alias, open=True, **options)
+        return pool
+
+
+def record_pool_stats(alias, pool):
+    """
+    Записывает показатели пула в метрики.
+    """
+    stats = pool.get_stats()
+    metrics.set('db_pool_size', stats.get('pool_size', 0), alias=alias)
+    metrics.set(
+        'db_pool_available', stats.get('pool_available', 0), alias=alias)
+    metrics.set(
+        'db_pool_requests_waiting', stats.get('requests_waiting', 0),
+        alias=alias)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Обёртка соединения PostgreSQL, берущая соединения из пула.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not is_psycopg3:
+            raise ImproperlyConfigured(
+                'Для бэкенда postgresql_pool требуется psycopg версии 3')
+        if self.settings_dict['CONN_MAX_AGE']:
+            raise ImproperlyConfigured(
+                'Для бэкенда postgresql_pool CONN_MAX_AGE должен быть '
+                'равен 0: соединения переиспользуются через пул')
+
+    @property
+    def pool_options(self):
+        return self.settings_dict['OPTIONS'].get('pool', {})
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        # Уровень изоляции устанавливается так же, как в бэкенде
+        # postgresql, но соединение берётся из пула.
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(
+                IsolationLevel.READ_COMMITTED
+                if isolation_level is None else isolation_level)
+        except ValueError:
+            raise ImproperlyConfigured(
+                f'Invalid transaction isolation level {isolation_level} '
+                f'specified. Use one of the psycopg.IsolationLevel values.'
+            )
+        pool = get_pool(self.alias, conn_params, self.pool_options)
+        started = time.perf_counter()
+        connection = pool.getconn()
+        metrics.observe(
+            'db_pool_wait_seconds', time.perf_counter() - started,
+            alias=self.alias)
+        record_pool_stats(self.alias, pool)
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            pool = _pools[self.alias]
+            with self.wrap_database_errors:
+                pool.putconn(self.connection)
+            record_pool_stats(self.alias, pool)
@@ -0,0 +1,199 @@
+"""
+Модуль, содержащий буфер отложенной записи прогресса просмотра уроков.
+
+Частые события прогресса (heartbeat) от видеоплеера накапливаются
+в памяти процесса по ключу (пользователь, продукт, урок) и сбрасываются
+в таблицу Statistic фоновым потоком пакетами через
+product.services.save_progress_events.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from product.services import merge_progress_events, save_progress_events
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBuffer:
+    """
+    Буфер отложенной записи событий прогресса просмотра.
+
+    Для каждого ключа хранится одно событие с максимальным количеством
+    просмотренных секунд и самой поздней датой просмотра. Статус
+    "Просмотрено" вычисляется при сбросе по правилу Statistic.save.
+    Если записать события не удалось, они возвращаются в буфер
+    и записываются при следующем сбросе.
+
+    Параметры:
+    - max_keys: Максимальное количество ключей в буфере; события
+      с новыми ключами сверх него отбрасываются.
+    - flush_size: Количество ключей, при котором буфер сбрасывается,
+      не дожидаясь истечения flush_interval.
+    - flush_interval: Интервал сброса буфера в секундах.
+    """
+
+    def __init__(self, max_keys=100000, flush_size=1000, flush_interval=1.0):
+        self.max_keys = max_keys
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._events = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.received_events = 0
+        self.dropped_events = 0
+        self.rejected_events = 0
+        self.flushed_events = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def add(self, event):
+        """
+        Добавляет событие в буфер.
+        - event: Объект product.services.ProgressEvent.
+        Возвращает False, если событие отброшено из-за переполнения.
+        """
+        key = event[:3]
+        with self._lock:
+            self.received_events += 1
+            previous = self._events.get(key)
+            if previous is not None:
+                self._events[key] = merge_progress_events(previous, event)
+            elif len(self._events) >= self.max_keys:
+                self.dropped_events += 1
+                return False
+            else:
+                self._events[key] = event
+            depth = len(self._events)
+        if depth >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """
+        Записывает накопленные события в таблицу Statistic.
+        Возвращает количество записанных строк статистики.
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, {}
+            if not events:
+                return 0
+            started = time.monotonic()
+            try:
+                saved, rejected = save_progress_events(events.values())
+            except Exception:
+                logger.exception(
+                    'Не удалось записать %d событий прогресса, события '
+                    'возвращены в буфер', len(events))
+                self._requeue(events)
+                return 0
+            finally:
+                close_old_connections()
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.flushes += 1
+                self.flushed_events += saved
+                self.rejected_events += len(rejected)
+                self.last_flush_seconds = elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            return saved
+
+    def _requeue(self, events):
+        """
+        Возвращает в буфер события, которые не удалось записать, для
+        повторной записи при следующем сбросе. События объединяются
+        с полученными за время записи; события с новыми ключами сверх
+        max_keys отбрасываются.
+        - events: Словарь {ключ: событие ProgressEvent}.
+        """
+        with self._lock:
+            self.failed_flushes += 1
+            for key, event in events.items():
+                current = self._events.get(key)
+                if current is not None:
+                    self._events[key] = merge_progress_events(event, current)
+                elif len(self._events) >= self.max_keys:
+                    self.dropped_events += 1
+                else:
+                    self._events[key] = event
+
+    def _run(self):
+        """
+        Цикл фонового потока: сбрасывает буфер по таймеру или по размеру.
+        """
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self):
+        """
+        Запускает фоновый поток сброса буфера, если он ещё не запущен.
+        Буфер сбрасывается также при завершении процесса.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name='progress-buffer',
+                daemon=True,
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Останавливает фоновый поток и записывает оставшиеся события.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def metrics(self):
+        """
+        Возвращает показатели работы буфера.
+        """
+        with self._lock:
+            return {
+                'queue_depth': len(self._events),
+                'received_events': self.received_events,
+                'dropped_events': self.dropped_events,
+                'rejected_events': self.rejected_events,
+                'flushed_events': self.flushed_events,
+                'flushes': self.flushes,
+                'failed_flushes': self.failed_flushes,
+                'last_flush_seconds': self.last_flush_seconds,
+                'max_flush_seconds': self.max_flush_seconds,
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_progress_buffer():
+    """
+    Возвращает буфер процесса, создавая и запуская его при первом вызове
+    с параметрами из настройки PROGRESS_BUFFER.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = ProgressBuffer(**settings.PROGRESS_BUFFER)
+            _buffer.start()
+    return _buffer
@@ -0,0 +1,182 @@
+"""
+Модуль, содержащий бэкенды кэша для кэшей приложения.
+
+Доступны два бэкенда с одинаковым интерфейсом:
+- LRUCacheBackend: ограниченный по размеру кэш в памяти процесса;
+- DjangoCacheBackend: обёртка над кэшем Django из настройки CACHES,
+  позволяющая разделять кэш между процессами.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from product.metrics import metrics
+
+
+class LRUCacheBackend:
+    """
+    Кэш в памяти процесса, вытесняющий давно не использованные записи.
+
+    Параметры:
+    - max_entries: Максимальное количество записей.
+    - timeout: Время жизни записей в секундах; None — без ограничения.
+      Ограничивает время, в течение которого процесс может видеть
+      данные, изменённые в другом процессе.
+    """
+
+    def __init__(self, max_entries=1024, timeout=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        """
+        Возвращает значение записи или None, если записи нет или она
+        устарела. Вызывается под блокировкой.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get(key)
+        return default if value is None else value
+
+    def get_many(self, keys):
+        with self._lock:
+            result = {}
+            for key in keys:
+                value = self._get(key)
+                if value is not None:
+                    result[key] = value
+            return result
+
+    def set(self, key, value):
+        expires = (
+            None if self.timeout is None
+            else time.monotonic() + self.timeout
+        )
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheBackend:
+    """
+    Обёртка над кэшем Django.
+
+    Параметры:
+    - alias: Имя кэша в настройке CACHES.
+    - timeout: Время жизни записей в секундах; None — без ограничения.
+    - key_prefix: Префикс ключей, отделяющий записи данного кэша.
+    """
+
+    def __init__(self, alias='default', timeout=None, key_prefix=''):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def _make_key(self, key):
+        return f'{self.key_prefix}{key}'
+
+    def get(self, key, default=None):
+        return self.cache.get(self._make_key(key), default)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = self.cache.get_many([self._make_key(key) for key in keys])
+        return {
+            key: found[self._make_key(key)]
+            for key in keys if self._make_key(key) in found
+        }
+
+    def set(self, key, value):
+        self.cache.set(self._make_key(key), value, self.timeout)
+
+    def delete_many(self, keys):
+        self.cache.delete_many([self._make_key(key) for key in keys])
+
+    def clear(self):
+        self.cache.clear()
+
+
+def create_backend(config):
+    """
+    Создаёт бэкенд кэша по настройке.
+    - config: Словарь с ключами 'BACKEND' (путь к классу бэкенда)
+      и 'OPTIONS' (параметры конструктора).
+    Возвращает объект бэкенда.
+    """
+    backend_class = import_string(config['BACKEND'])
+    return backend_class(**config.get('OPTIONS', {}))
+
+
+class CacheCounters:
+    """
+    Потокобезопасные счётчики попаданий и промахов кэша.
+    Попадания и промахи также учитываются в метриках cache_hits_total
+    и cache_misses_total с меткой cache.
+
+    Параметры:
+    - name: Имя кэша в метриках.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self, count=1):
+        with self._lock:
+            self.hits += count
+        if count:
+            metrics.inc('cache_hits_total', count, cache=self.name)
+
+    def miss(self, count=1):
+        with self._lock:
+            self.misses += count
+        if count:
+            metrics.inc('cache_misses_total', count, cache=self.name)
+
+    def as_dict(self):
+        """
+        Возвращает значения счётчиков и долю попаданий.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
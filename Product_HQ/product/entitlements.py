@@ -0,0 +1,117 @@
+"""
+Модуль, содержащий индекс прав доступа пользователей к продуктам.
+
+Индекс кэширует множество продуктов с разрешённым доступом для каждого
+пользователя и множество уроков для каждого продукта, так что проверка
+доступа при записи статистики и при просмотре продукта сводится
+к поиску в словаре. Записи индекса удаляются обработчиками сигналов
+при изменении доступов и уроков продуктов.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from product.cache import CacheCounters, create_backend
+from product.models import Access, Product
+
+
+class AccessIndex:
+    """
+    Индекс прав доступа пользователей к продуктам и уроков продуктов.
+
+    Параметры:
+    - backend: Бэкенд кэша из модуля product.cache.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = CacheCounters('access_index')
+
+    def _get_or_load(self, key, load):
+        """
+        Получает множество из кэша или загружает его из базы данных.
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            self.counters.hit()
+            return value
+        self.counters.miss()
+        value = frozenset(load())
+        self.backend.set(key, value)
+        return value
+
+    def granted_products(self, user_id):
+        """
+        Получает идентификаторы продуктов, к которым пользователю
+        разрешён доступ.
+        - user_id: Идентификатор пользователя.
+        """
+        return self._get_or_load(
+            f'access-user:{user_id}',
+            lambda: Access.objects.filter(
+                user_id=user_id,
+                access_granted=True,
+            ).order_by().values_list('product_id', flat=True),
+        )
+
+    def product_lessons(self, product_id):
+        """
+        Получает идентификаторы уроков продукта.
+        - product_id: Идентификатор продукта.
+        """
+        return self._get_or_load(
+            f'access-product-lessons:{product_id}',
+            lambda: Product.lessons.through.objects.filter(
+                product_id=product_id,
+            ).values_list('lesson_id', flat=True),
+        )
+
+    def has_access(self, user_id, product_id):
+        """
+        Проверяет, разрешён ли пользователю доступ к продукту.
+        """
+        return product_id in self.granted_products(user_id)
+
+    def has_lesson(self, product_id, lesson_id):
+        """
+        Проверяет, связан ли урок с продуктом.
+        """
+        return lesson_id in self.product_lessons(product_id)
+
+    def _delete(self, keys):
+        """
+        Удаляет записи индекса сразу и повторно после фиксации транзакции,
+        чтобы параллельный запрос не сохранил в индексе данные,
+        прочитанные до фиксации.
+        """
+        keys = list(keys)
+        if keys:
+            self.backend.delete_many(keys)
+            transaction.on_commit(lambda: self.backend.delete_many(keys))
+
+    def invalidate_users(self, user_ids):
+        """
+        Удаляет из индекса доступы пользователей.
+        - user_ids: Идентификаторы пользователей.
+        """
+        self._delete(f'access-user:{user_id}' for user_id in set(user_ids))
+
+    def invalidate_products(self, product_ids):
+        """
+        Удаляет из индекса уроки продуктов.
+        - product_ids: Идентификаторы продуктов.
+        """
+        self._delete(
+            f'access-product-lessons:{product_id}'
+            for product_id in set(product_ids)
+        )
+
+    def clear(self):
+        """
+        Очищает индекс и счётчики попаданий.
+        """
+        self.backend.clear()
+        self.counters.reset()
+
+
+access_index = AccessIndex(create_backend(settings.ACCESS_INDEX_CACHE))
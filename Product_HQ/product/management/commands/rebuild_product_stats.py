@@ -0,0 +1,58 @@
+"""
+Команда для перестроения и проверки таблицы статистики продуктов
+и счётчика пользователей платформы.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.stats import (rebuild_product_stats,
+                           reconcile_platform_user_count,
+                           verify_platform_user_count, verify_product_stats)
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает таблицу ProductStats по таблицам Statistic, Access '
+        'и урокам продуктов и счётчик пользователей платформы, затем '
+        'сверяет их с исходными таблицами. Рассчитана также '
+        'на периодический запуск.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить таблицу и счётчик, не перестраивая их.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество продуктов, записываемых за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            total = rebuild_product_stats(chunk_size=options['chunk_size'])
+            self.stdout.write(f'Перестроено строк статистики: {total}')
+            num_users = reconcile_platform_user_count()
+            self.stdout.write(f'Пользователей платформы: {num_users}')
+        mismatches = verify_product_stats()
+        for product_id, field, stored, expected in mismatches:
+            self.stderr.write(
+                f'Продукт {product_id}: {field} = {stored}, '
+                f'ожидается {expected}'
+            )
+        user_count_mismatch = verify_platform_user_count()
+        if user_count_mismatch is not None:
+            self.stderr.write(
+                'Счётчик пользователей платформы = {}, ожидается {}'.format(
+                    *user_count_mismatch)
+            )
+            mismatches.append(user_count_mismatch)
+        if mismatches:
+            raise CommandError(
+                f'Найдено расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS(
+            'Статистика продуктов и счётчик пользователей совпадают '
+            'с исходными таблицами'))
@@ -0,0 +1,47 @@
+"""
+Команда для агрегации событий просмотра по часам и дням.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from product.rollups import prune_watch_events, rollup_watch_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Агрегирует новые события просмотра WatchEvent в часовые и дневные '
+        'агрегаты WatchRollup и при необходимости удаляет старые '
+        'агрегированные события.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Количество событий, агрегируемых за одну транзакцию.',
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=None,
+            help='Удалить агрегированные события старше указанного '
+                 'количества дней.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = rollup_watch_events(batch_size=options['batch_size'])
+            if not processed:
+                break
+            total += processed
+        self.stdout.write(f'Агрегировано событий просмотра: {total}')
+        if options['keep_days'] is not None:
+            before = timezone.now().date() - timedelta(
+                days=options['keep_days'])
+            deleted = prune_watch_events(before)
+            self.stdout.write(f'Удалено событий просмотра: {deleted}')
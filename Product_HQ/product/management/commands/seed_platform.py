@@ -0,0 +1,79 @@
+"""
+Команда для заполнения платформы синтетическими данными.
+"""
+
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from product.seeding import generate_platform
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет платформу синтетическими пользователями, продуктами, '
+        'уроками, доступами и статистикой просмотров и выводит скорость '
+        'записи по таблицам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--lessons', type=int, default=500)
+        parser.add_argument('--lessons-per-product', type=int, default=20)
+        parser.add_argument('--products-per-user', type=int, default=3)
+        parser.add_argument(
+            '--granted-ratio', type=float, default=0.9,
+            help='Доля доступов с разрешённым доступом.')
+        parser.add_argument(
+            '--view-ratio', type=float, default=0.5,
+            help='Доля уроков продукта, просмотренных студентом.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел.')
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей, продуктов и уроков.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество пользователей в пакете и строк в запросе.')
+
+    def handle(self, *args, **options):
+        totals = defaultdict(lambda: [0, 0.0])
+
+        def report(table, rows, seconds):
+            totals[table][0] += rows
+            totals[table][1] += seconds
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{table}: {rows} строк, {self._rate(rows, seconds)}')
+
+        started = time.perf_counter()
+        generate_platform(
+            users=options['users'],
+            products=options['products'],
+            lessons=options['lessons'],
+            lessons_per_product=options['lessons_per_product'],
+            products_per_user=options['products_per_user'],
+            granted_ratio=options['granted_ratio'],
+            view_ratio=options['view_ratio'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            report=report,
+        )
+        elapsed = time.perf_counter() - started
+
+        for table, (rows, seconds) in totals.items():
+            self.stdout.write(
+                f'{table}: {rows} строк за {seconds:.2f} с, '
+                f'{self._rate(rows, seconds)}')
+        rows = sum(rows for rows, _ in totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего: {rows} строк за {elapsed:.2f} с, '
+            f'{self._rate(rows, elapsed)}'))
+
+    @staticmethod
+    def _rate(rows, seconds):
+        return f'{rows / seconds if seconds else 0:.0f} строк/с'
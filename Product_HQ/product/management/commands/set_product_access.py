@@ -0,0 +1,85 @@
+"""
+Команда для массового предоставления и отзыва доступа к продукту.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.models import Product
+from product.services import read_csv_user_ids, set_product_access
+
+
+class Command(BaseCommand):
+    help = (
+        'Массово предоставляет или отзывает доступ пользователей к продукту. '
+        'Пользователи задаются идентификаторами или файлом CSV со столбцом '
+        'user_id или username.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'product',
+            help='Слаг продукта.',
+        )
+        parser.add_argument(
+            '--user-ids',
+            nargs='+',
+            type=int,
+            default=(),
+            help='Идентификаторы пользователей.',
+        )
+        parser.add_argument(
+            '--csv',
+            help='Файл CSV с пользователями или "-" для стандартного ввода.',
+        )
+        parser.add_argument(
+            '--revoke',
+            action='store_true',
+            help='Отозвать доступ вместо его предоставления.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей, записываемых за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(slug=options['product']).first()
+        if product is None:
+            raise CommandError(f'Продукт {options["product"]} не найден')
+        if not options['user_ids'] and not options['csv']:
+            raise CommandError('Укажите --user-ids или --csv')
+        if options['csv']:
+            stream = (
+                sys.stdin if options['csv'] == '-'
+                else open(options['csv'], newline='')
+            )
+            try:
+                changed, missing = self.apply(
+                    product, read_csv_user_ids(stream), options)
+            except ValueError as error:
+                raise CommandError(error)
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+        else:
+            changed, missing = self.apply(
+                product, options['user_ids'], options)
+        if missing:
+            self.stderr.write(
+                'Не найдены пользователи: '
+                + ', '.join(str(user_id) for user_id in missing)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Изменено доступов к продукту {product.slug}: {changed}'))
+
+    @staticmethod
+    def apply(product, user_ids, options):
+        return set_product_access(
+            product.pk,
+            user_ids,
+            access_granted=not options['revoke'],
+            chunk_size=options['chunk_size'],
+        )
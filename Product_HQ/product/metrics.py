@@ -0,0 +1,337 @@
+"""
+Модуль, содержащий реестр метрик приложения в формате Prometheus.
+
+Метрики (счётчики, показатели и гистограммы) объявляются в METRICS и изменяются
+через реестр metrics. Значения хранятся бэкендом из настройки METRICS:
+- LocalMetricsBackend: значения в памяти процесса, для одного процесса;
+- FileMetricsBackend: каждый процесс периодически сохраняет свои
+  значения в отдельный файл общего каталога, а при выводе значения
+  всех файлов складываются. Подходит для нескольких процессов WSGI
+  на одном сервере. Счётчики и гистограммы завершившихся процессов
+  продолжают учитываться, а их показатели — нет.
+
+Метрики выводятся в текстовом формате Prometheus представлением
+metrics_view.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# Границы интервалов гистограмм длительности в секундах.
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Объявленные метрики: {имя: (тип, описание)}.
+METRICS = {
+    'api_requests_total': (
+        COUNTER, 'Количество запросов к API по представлениям и статусам.'),
+    'api_request_duration_seconds': (
+        HISTOGRAM, 'Длительность обработки запросов по представлениям.'),
+    'api_db_queries_total': (
+        COUNTER, 'Количество SQL-запросов по представлениям.'),
+    'cache_hits_total': (COUNTER, 'Количество попаданий в кэши.'),
+    'cache_misses_total': (COUNTER, 'Количество промахов кэшей.'),
+    'statistic_writes_total': (
+        COUNTER, 'Количество записанных строк статистики просмотров.'),
+    'watch_rollup_late_events_total': (
+        COUNTER, 'Количество событий просмотра, агрегированных после '
+                 'событий с большими номерами.'),
+    'db_pool_size': (
+        GAUGE, 'Количество открытых соединений в пулах баз данных.'),
+    'db_pool_available': (
+        GAUGE, 'Количество свободных соединений в пулах баз данных.'),
+    'db_pool_requests_waiting': (
+        GAUGE, 'Количество запросов, ожидающих соединения из пула.'),
+    'db_pool_wait_seconds': (
+        HISTOGRAM, 'Время ожидания соединения из пула баз данных.'),
+}
+
+
+class LocalMetricsBackend:
+    """
+    Хранит значения метрик в памяти процесса.
+
+    Значения хранятся в словаре {(имя, метки): значение}, где метки —
+    отсортированный кортеж пар (имя, значение), а значение счётчика
+    и показателя — число, гистограммы — список [количества
+    по интервалам..., сумма, количество].
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, key, value, buckets):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[index] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self):
+        """
+        Возвращает копию значений метрик процесса.
+        """
+        with self._lock:
+            return {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in self._values.items()
+            }
+
+    def collect(self):
+        """
+        Возвращает значения метрик для вывода.
+        """
+        return self.snapshot()
+
+
+class FileMetricsBackend(LocalMetricsBackend):
+    """
+    Хранит значения метрик в памяти процесса и периодически сохраняет
+    их в файл процесса в общем каталоге.
+
+    Параметры:
+    - directory: Каталог файлов метрик, общий для процессов; его
+      следует очищать при перезапуске приложения.
+    - flush_interval: Минимальный интервал сохранения файла в секундах.
+    """
+
+    def __init__(self, directory, flush_interval=1.0):
+        super().__init__()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        self._flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+        atexit.register(self.flush, gauges=False)
+
+    def inc(self, key, amount):
+        super().inc(key, amount)
+        self._maybe_flush()
+
+    def set(self, key, value):
+        super().set(key, value)
+        self._maybe_flush()
+
+    def observe(self, key, value, buckets):
+        super().observe(key, value, buckets)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self, gauges=True):
+        """
+        Сохраняет значения метрик процесса в его файл. Файл заменяется
+        целиком, поэтому другие процессы не читают его частично.
+        - gauges: Сохранять ли показатели; при завершении процесса
+          они не сохраняются, так как теряют смысл.
+        """
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            data = [
+                [name, labels, value]
+                for (name, labels), value in self.snapshot().items()
+                if gauges or METRICS[name][0] != GAUGE
+            ]
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w') as output:
+                json.dump(data, output)
+            os.replace(temporary, self.path)
+
+    def collect(self):
+        """
+        Возвращает сумму значений метрик всех процессов. Показатели
+        складываются только по работающим процессам: файл процесса,
+        завершившегося без сохранения при выходе, остаётся в каталоге.
+        """
+        self.flush()
+        totals = {}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            alive = _process_alive(filename)
+            try:
+                with open(os.path.join(self.directory, filename)) as source:
+                    data = json.load(source)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data:
+                if not alive and METRICS[name][0] == GAUGE:
+                    continue
+                key = (name, tuple(tuple(label) for label in labels))
+                if isinstance(value, list):
+                    entry = totals.setdefault(key, [0] * len(value))
+                    for index, item in enumerate(value):
+                        entry[index] += item
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+def _process_alive(filename):
+    """
+    Проверяет по имени файла метрик, работает ли записавший его процесс.
+    - filename: Имя файла вида metrics-<pid>-<суффикс>.json.
+    """
+    try:
+        pid = int(filename.split('-')[1])
+        os.kill(pid, 0)
+    except (IndexError, ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        # Процесс существует, но принадлежит другому пользователю.
+        return True
+    return True
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for name, value in pairs
+    ) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик.
+
+    Параметры:
+    - backend: Бэкенд хранения значений метрик.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(name, labels):
+        if name not in METRICS:
+            raise KeyError(f'Метрика {name} не объявлена')
+        return name, tuple(sorted(
+            (label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Увеличивает счётчик.
+        - name: Имя счётчика.
+        - amount: Приращение.
+        - labels: Метки.
+        """
+        self.backend.inc(self._key(name, labels), amount)
+
+    def set(self, name, value, **labels):
+        """
+        Устанавливает значение показателя.
+        - name: Имя показателя.
+        - value: Значение.
+        - labels: Метки.
+        """
+        self.backend.set(self._key(name, labels), value)
+
+    def observe(self, name, value, **labels):
+        """
+        Добавляет наблюдение в гистограмму.
+        - name: Имя гистограммы.
+        - value: Наблюдаемое значение.
+        - labels: Метки.
+        """
+        self.backend.observe(self._key(name, labels), value, DURATION_BUCKETS)
+
+    def render(self):
+        """
+        Возвращает значения метрик в текстовом формате Prometheus.
+        """
+        values = defaultdict(list)
+        for (name, labels), value in sorted(self.backend.collect().items()):
+            values[name].append((labels, value))
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in values.get(name, ()):
+                if kind != HISTOGRAM:
+                    lines.append(
+                        f'{name}{_format_labels(labels)} '
+                        f'{_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, value):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket'
+                        f'{_format_labels(labels, [("le", bound)])} '
+                        f'{cumulative}')
+                lines.append(
+                    f'{name}_bucket'
+                    f'{_format_labels(labels, [("le", "+Inf")])} '
+                    f'{value[-1]}')
+                lines.append(
+                    f'{name}_sum{_format_labels(labels)} '
+                    f'{_format_value(value[-2])}')
+                lines.append(
+                    f'{name}_count{_format_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def create_metrics_registry(config):
+    """
+    Создаёт реестр метрик по описанию бэкенда.
+    - config: Словарь с ключами BACKEND (путь к классу бэкенда)
+      и OPTIONS (аргументы конструктора).
+    """
+    backend_class = import_string(config['BACKEND'])
+    return MetricsRegistry(backend_class(**config.get('OPTIONS', {})))
+
+
+metrics = create_metrics_registry(settings.METRICS)
+
+
+def metrics_view(request):
+    """
+    Представление, выводящее метрики в текстовом формате Prometheus.
+    """
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def fill_product_stats(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    ProductStats = apps.get_model('product', 'ProductStats')
+    Access = apps.get_model('product', 'Access')
+    Statistic = apps.get_model('product', 'Statistic')
+    stats = {
+        pk: ProductStats(product_id=pk)
+        for pk in Product.objects.values_list('pk', flat=True)
+    }
+    lessons = Product.lessons.through.objects.values('product').annotate(
+        total=Count('pk'))
+    for row in lessons:
+        stats[row['product']].num_lessons = row['total']
+    statistics = Statistic.objects.values('product').annotate(
+        viewed=Count('pk', filter=Q(status=True)),
+        seconds=Sum('time_duration'),
+    )
+    for row in statistics:
+        stats[row['product']].num_lessons_viewed = row['viewed']
+        stats[row['product']].time_spent_seconds = row['seconds'] or 0
+    accesses = Access.objects.values('product').annotate(
+        granted=Count('pk', filter=Q(access_granted=True)),
+        total=Count('pk'),
+    )
+    for row in accesses:
+        stats[row['product']].num_students = row['granted']
+        stats[row['product']].num_accesses = row['total']
+    ProductStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_rename_last_viewed_ddate_statistic_last_viewed_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='product.product', verbose_name='Продукт')),
+                ('num_lessons', models.IntegerField(default=0, verbose_name='Количество уроков')),
+                ('num_lessons_viewed', models.IntegerField(default=0, verbose_name='Количество просмотренных уроков')),
+                ('time_spent_seconds', models.BigIntegerField(default=0, verbose_name='Сколько секунд потрачено на просмотр')),
+                ('num_students', models.IntegerField(default=0, verbose_name='Количество студентов')),
+                ('num_accesses', models.IntegerField(default=0, verbose_name='Количество доступов')),
+            ],
+            options={
+                'verbose_name': 'статистика продукта',
+                'verbose_name_plural': 'Статистика продуктов',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='lesson',
+            options={'get_latest_by': 'created_at', 'ordering': ['-created_at'], 'verbose_name': 'урок', 'verbose_name_plural': 'Список уроков'},
+        ),
+        migrations.AlterField(
+            model_name='statistic',
+            name='status',
+            field=models.BooleanField(default=False, verbose_name='Статус просмотра'),
+        ),
+        migrations.RunPython(fill_product_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_productstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='access',
+            index=models.Index(condition=models.Q(('access_granted', True)), fields=['user', 'product'], name='access_user_granted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='access',
+            index=models.Index(condition=models.Q(('access_granted', True)), fields=['product', 'user'], name='access_product_granted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['-created_at', 'id'], name='lesson_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(condition=models.Q(('status', True)), fields=['product', 'lesson'], name='statistic_product_viewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['product', 'status', 'time_duration'], name='statistic_product_agg_idx'),
+        ),
+        # Связь продуктов и уроков со стороны урока: уникальный индекс
+        # (product_id, lesson_id) уже создан Django.
+        migrations.RunSQL(
+            'CREATE INDEX product_lessons_lesson_product_idx '
+            'ON product_product_lessons (lesson_id, product_id);',
+            'DROP INDEX product_lessons_lesson_product_idx;',
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('product', '0011_counter_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=4, verbose_name='Интервал')),
+                ('bucket', models.DateTimeField(verbose_name='Начало интервала')),
+                ('seconds', models.BigIntegerField(default=0, verbose_name='Сумма просмотренных секунд')),
+                ('events', models.IntegerField(default=0, verbose_name='Количество событий')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product.lesson', verbose_name='Урок')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product.product', verbose_name='Продукт')),
+            ],
+            options={
+                'verbose_name': 'агрегат просмотров',
+                'verbose_name_plural': 'Агрегаты просмотров',
+                'default_related_name': 'watch_rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='WatchEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seconds', models.IntegerField(verbose_name='Прирост просмотренных секунд')),
+                ('occurred_at', models.DateTimeField(verbose_name='Дата и время просмотра')),
+                ('day', models.DateField(verbose_name='День просмотра')),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата и время записи')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product.lesson', verbose_name='Урок')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product.product', verbose_name='Продукт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'событие просмотра',
+                'verbose_name_plural': 'События просмотра',
+                'default_related_name': 'watch_events',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='watchrollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'product', 'bucket', 'lesson'), name='unique_watch_rollup'),
+        ),
+        migrations.AddIndex(
+            model_name='watchevent',
+            index=models.Index(fields=['day', 'id'], name='watchevent_day_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.5 on 2026-10-17 23:20
+
+from django.conf import settings
+from django.db import migrations
+
+PLATFORM_USERS_COUNTER = 'platform:users'
+
+
+def create_platform_user_counter(apps, schema_editor):
+    Counter = apps.get_model('product', 'Counter')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    db_alias = schema_editor.connection.alias
+    Counter.objects.using(db_alias).update_or_create(
+        name=PLATFORM_USERS_COUNTER,
+        defaults={'value': User.objects.using(db_alias).count()},
+    )
+
+
+def delete_platform_user_counter(apps, schema_editor):
+    Counter = apps.get_model('product', 'Counter')
+    Counter.objects.using(schema_editor.connection.alias).filter(
+        name=PLATFORM_USERS_COUNTER,
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('product', '0012_watch_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_platform_user_counter,
+            delete_platform_user_counter,
+        ),
+    ]
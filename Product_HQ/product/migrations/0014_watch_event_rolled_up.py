@@ -0,0 +1,41 @@
+# Generated by Django 4.2.5 on 2026-10-17 23:33
+
+from django.db import migrations, models
+
+HIGH_WATER_MARK = 'watch-rollup:high-water-mark'
+
+
+def mark_rolled_up_events(apps, schema_editor):
+    Counter = apps.get_model('product', 'Counter')
+    WatchEvent = apps.get_model('product', 'WatchEvent')
+    db_alias = schema_editor.connection.alias
+    mark = Counter.objects.using(db_alias).filter(
+        name=HIGH_WATER_MARK,
+    ).values_list('value', flat=True).first()
+    if mark:
+        WatchEvent.objects.using(db_alias).filter(
+            pk__lte=mark,
+        ).update(rolled_up=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0013_platform_user_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watchevent',
+            name='rolled_up',
+            field=models.BooleanField(default=False, verbose_name='Агрегировано'),
+        ),
+        migrations.AddIndex(
+            model_name='watchevent',
+            index=models.Index(condition=models.Q(('rolled_up', False)), fields=['id'], name='watchevent_pending_idx'),
+        ),
+        migrations.RunPython(
+            mark_rolled_up_events,
+            migrations.RunPython.noop,
+        ),
+    ]
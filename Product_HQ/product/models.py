@@ -3,15 +3,33 @@
 доступом и статистикой в приложении.
 """
 
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 
 from rest_framework.exceptions import ValidationError
 
 User = get_user_model()
 
 
+def is_lesson_viewed(time_duration, video_duration):
+    """
+    Проверяет, получает ли урок статус "Просмотрено".
+    - time_duration: Количество просмотренных секунд урока.
+    - video_duration: Длительность видео урока в секундах.
+    Возвращает True, если просмотрена доля видео, заданная настройкой
+    PERCENTAGE_STATUS_TRUE.
+    """
+    return (
+        time_duration // video_duration >=
+        settings.PERCENTAGE_STATUS_TRUE
+    )
+
+
 class Product(models.Model):
     """
     Представляет продукт в приложении.
@@ -21,6 +39,8 @@ class Product(models.Model):
     - slug: SlugField - Идентификатор продукта, используемый в URL.
     - text: TextField - Описание продукта.
     - created_at: DateTimeField - Дата и время публикации продукта.
+    - updated_at: DateTimeField - Дата и время последнего изменения
+      продукта или списка его уроков.
     - owner: ForeignKey - Владелец продукта.
     - lessons: ManyToManyField - Уроки, связанные с продуктом.
     """
@@ -45,6 +65,10 @@ class Product(models.Model):
         help_text='Дата и время публикации продукта',
 
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата и время изменения',
+        auto_now=True,
+    )
     owner = models.ForeignKey(
         User,
         on_delete=models.PROTECT,
@@ -76,6 +100,7 @@ class Lesson(models.Model):
     - slug: SlugField - Идентификатор урока, используемый в URL.
     - text: TextField - Описание урока.
     - created_at: DateTimeField - Дата и время публикации урока.
+    - updated_at: DateTimeField - Дата и время последнего изменения урока.
     - video_url: URLField - Ссылка на видео урока.
     - video_duration: IntegerField - Длительность видео урока в секундах.
 
@@ -100,6 +125,10 @@ class Lesson(models.Model):
         verbose_name='Дата и время публикации продукта',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата и время изменения',
+        auto_now=True,
+    )
     video_url = models.URLField(
         verbose_name='Ссылка на видео',
         help_text='Ссылка на видео',
@@ -115,6 +144,13 @@ class Lesson(models.Model):
         verbose_name_plural = 'Список уроков'
         ordering = ['-created_at']
         get_latest_by = 'created_at'
+        indexes = [
+            # Постраничный вывод уроков в порядке (-created_at, id).
+            models.Index(
+                fields=['-created_at', 'id'],
+                name='lesson_created_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return (f'Урок {self.name}, '
@@ -161,10 +197,44 @@ class Access(models.Model):
                 name='unique_user_product'
             )
         ]
+        indexes = [
+            # Продукты с разрешённым доступом для пользователя.
+            models.Index(
+                fields=['user', 'product'],
+                condition=models.Q(access_granted=True),
+                name='access_user_granted_idx',
+            ),
+            # Студенты продукта с разрешённым доступом.
+            models.Index(
+                fields=['product', 'user'],
+                condition=models.Q(access_granted=True),
+                name='access_product_granted_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.product}, access granted: {self.access_granted}'
 
+    def stats_contribution(self):
+        """
+        Возвращает вклад объекта доступа в статистику продукта
+        в виде кортежа (id продукта, {поле ProductStats: значение}).
+        """
+        return self.product_id, {
+            'num_accesses': 1,
+            'num_students': int(self.access_granted),
+        }
+
+    def save(self, *args, **kwargs):
+        """
+        Переопределение метода save() для инкрементального обновления
+        статистики продукта (ProductStats).
+        """
+        with transaction.atomic():
+            previous = get_saved_contribution(self)
+            super().save(*args, **kwargs)
+            ProductStats.apply(previous, self.stats_contribution())
+
 
 class Statistic(models.Model):
     """
@@ -223,6 +293,19 @@ class Statistic(models.Model):
                 name='unique_user_product_lesson'
             )
         ]
+        indexes = [
+            # Просмотренные уроки продукта.
+            models.Index(
+                fields=['product', 'lesson'],
+                condition=models.Q(status=True),
+                name='statistic_product_viewed_idx',
+            ),
+            # Покрывающий индекс для агрегатов статистики по продукту.
+            models.Index(
+                fields=['product', 'status', 'time_duration'],
+                name='statistic_product_agg_idx',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """
@@ -233,20 +316,383 @@ class Statistic(models.Model):
         сохраняет объект статистики.
         В противном случае, генерирует исключение ValidationError.
         """
+        from product.entitlements import access_index
+
+        if is_lesson_viewed(self.time_duration, self.lesson.video_duration):
+            self.status = True
         if (
-            self.time_duration // self.lesson.video_duration >=
-            settings.PERCENTAGE_STATUS_TRUE
+            access_index.has_access(self.user_id, self.product_id)
+            and access_index.has_lesson(self.product_id, self.lesson_id)
         ):
-            self.status = True
-        access = Access.objects.filter(
-            user=self.user,
-            product=self.product,
-            access_granted=True
-        ).exists()
-        if access and self.product.lessons.filter(pk=self.lesson.pk).exists():
-            super().save(*args, **kwargs)
+            with transaction.atomic():
+                previous = get_saved_contribution(self)
+                super().save(*args, **kwargs)
+                ProductStats.apply(previous, self.stats_contribution())
+                self._record_watch_event(previous)
         else:
             raise ValidationError(
                 "У данного пользователя нет доступа к данному продукту "
                 "или урок не связан с продуктом."
             )
+
+    def _record_watch_event(self, previous):
+        """
+        Записывает событие просмотра с приростом просмотренных секунд.
+        - previous: Прежний вклад объекта в статистику продукта или None.
+        """
+        seconds = self.time_duration
+        if previous is not None:
+            seconds -= previous[1]['time_spent_seconds']
+        event = WatchEvent.build(
+            self.user_id, self.product_id, self.lesson_id, seconds,
+            self.last_viewed_date)
+        if event is not None:
+            event.save()
+
+    def stats_contribution(self):
+        """
+        Возвращает вклад объекта статистики в статистику продукта
+        в виде кортежа (id продукта, {поле ProductStats: значение}).
+        """
+        return self.product_id, {
+            'num_lessons_viewed': int(self.status),
+            'time_spent_seconds': self.time_duration,
+        }
+
+
+class ProductStats(models.Model):
+    """
+    Денормализованная статистика продукта, обновляемая инкрементально
+    при сохранении и удалении объектов Statistic и Access, а также
+    при изменении списка уроков продукта.
+
+    Поля:
+    - product: OneToOneField - Продукт, к которому относится статистика.
+    - num_lessons: IntegerField - Количество уроков продукта.
+    - num_lessons_viewed: IntegerField - Количество уроков, просмотренных
+      всеми студентами (статистики со статусом "Просмотрено").
+    - time_spent_seconds: BigIntegerField - Сколько в сумме секунд все
+      студенты потратили на просмотр уроков продукта.
+    - num_students: IntegerField - Количество студентов с разрешённым
+      доступом к продукту.
+    - num_accesses: IntegerField - Общее количество доступов к продукту.
+
+    Методы:
+    - add: Прибавляет приращения к полям статистики продукта.
+    - apply: Заменяет вклад объекта в статистику на новый.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Продукт',
+    )
+    num_lessons = models.IntegerField(
+        default=0,
+        verbose_name='Количество уроков',
+    )
+    num_lessons_viewed = models.IntegerField(
+        default=0,
+        verbose_name='Количество просмотренных уроков',
+    )
+    time_spent_seconds = models.BigIntegerField(
+        default=0,
+        verbose_name='Сколько секунд потрачено на просмотр',
+    )
+    num_students = models.IntegerField(
+        default=0,
+        verbose_name='Количество студентов',
+    )
+    num_accesses = models.IntegerField(
+        default=0,
+        verbose_name='Количество доступов',
+    )
+
+    class Meta:
+        verbose_name = 'статистика продукта'
+        verbose_name_plural = 'Статистика продуктов'
+
+    def __str__(self):
+        return f'Статистика продукта {self.product_id}'
+
+    @classmethod
+    def add(cls, product_id, **deltas):
+        """
+        Прибавляет приращения к полям статистики продукта с помощью F(),
+        без пересчёта по исходным таблицам.
+        Если строки статистики для продукта ещё нет, создаёт её.
+        - product_id: Идентификатор продукта.
+        - deltas: Приращения полей статистики.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        updates = {
+            field: models.F(field) + delta for field, delta in deltas.items()
+        }
+        if cls.objects.filter(product_id=product_id).update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(product_id=product_id, **deltas)
+        except IntegrityError:
+            # Строку успела создать параллельная транзакция.
+            cls.objects.filter(product_id=product_id).update(**updates)
+
+    @classmethod
+    def apply(cls, previous, current):
+        """
+        Заменяет вклад объекта в статистику продуктов на новый.
+        - previous: Прежний вклад объекта (id продукта, {поле: значение})
+          или None, если объект не был сохранён.
+        - current: Новый вклад объекта в том же виде или None,
+          если объект удалён.
+        """
+        deltas = defaultdict(lambda: defaultdict(int))
+        for sign, contribution in ((-1, previous), (1, current)):
+            if contribution is None:
+                continue
+            product_id, values = contribution
+            for field, value in values.items():
+                deltas[product_id][field] += sign * value
+        for product_id, fields in deltas.items():
+            cls.add(product_id, **fields)
+
+
+class Counter(models.Model):
+    """
+    Именованный счётчик, например версия данных пользователя.
+
+    Поля:
+    - name: CharField - Имя счётчика.
+    - value: BigIntegerField - Значение счётчика.
+    - updated_at: DateTimeField - Дата и время последнего изменения.
+
+    Методы:
+    - increment: Увеличивает значения счётчиков на единицу.
+    """
+
+    name = models.CharField(
+        max_length=128,
+        unique=True,
+        verbose_name='Имя',
+    )
+    value = models.BigIntegerField(
+        default=0,
+        verbose_name='Значение',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата и время изменения',
+    )
+
+    class Meta:
+        verbose_name = 'счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+    @classmethod
+    def increment(cls, names):
+        """
+        Увеличивает значения счётчиков на единицу двумя запросами
+        независимо от их количества. Отсутствующие счётчики создаются.
+        - names: Имена счётчиков.
+        """
+        names = set(names)
+        if not names:
+            return
+        now = timezone.now()
+        cls.objects.bulk_create(
+            [cls(name=name, updated_at=now) for name in names],
+            ignore_conflicts=True,
+        )
+        cls.objects.filter(name__in=names).update(
+            value=models.F('value') + 1,
+            updated_at=now,
+        )
+
+
+class WatchEvent(models.Model):
+    """
+    Событие просмотра урока: прирост просмотренных секунд, записанный
+    при сохранении статистики. События агрегируются в WatchRollup
+    функцией product.rollups.rollup_watch_events, которая отмечает их
+    агрегированными, и удаляются по дням после агрегации.
+
+    Поля:
+    - user: ForeignKey - Пользователь, который просмотрел урок.
+    - product: ForeignKey - Продукт, к которому относится урок.
+    - lesson: ForeignKey - Урок, который был просмотрен.
+    - seconds: IntegerField - Прирост просмотренных секунд.
+    - occurred_at: DateTimeField - Дата и время просмотра.
+    - day: DateField - День просмотра (UTC), по которому события
+      разбиваются на части для агрегации и удаления.
+    - recorded_at: DateTimeField - Дата и время записи события.
+    - rolled_up: BooleanField - Событие учтено в агрегатах WatchRollup.
+
+    Методы:
+    - build: Создаёт событие по приросту просмотренных секунд.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт',
+    )
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,
+        verbose_name='Урок',
+    )
+    seconds = models.IntegerField(
+        verbose_name='Прирост просмотренных секунд',
+    )
+    occurred_at = models.DateTimeField(
+        verbose_name='Дата и время просмотра',
+    )
+    day = models.DateField(
+        verbose_name='День просмотра',
+    )
+    recorded_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата и время записи',
+    )
+    rolled_up = models.BooleanField(
+        default=False,
+        verbose_name='Агрегировано',
+    )
+
+    class Meta:
+        verbose_name = 'событие просмотра'
+        verbose_name_plural = 'События просмотра'
+        default_related_name = 'watch_events'
+        indexes = [
+            # Удаление агрегированных событий по дням.
+            models.Index(
+                fields=['day', 'id'],
+                name='watchevent_day_idx',
+            ),
+            # Выбор ещё не агрегированных событий.
+            models.Index(
+                fields=['id'],
+                condition=models.Q(rolled_up=False),
+                name='watchevent_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return (f'{self.user_id}/{self.product_id}/{self.lesson_id}: '
+                f'{self.seconds} сек.')
+
+    @classmethod
+    def build(cls, user_id, product_id, lesson_id, seconds, occurred_at):
+        """
+        Создаёт несохранённое событие просмотра.
+        - user_id, product_id, lesson_id: Идентификаторы пользователя,
+          продукта и урока.
+        - seconds: Прирост просмотренных секунд.
+        - occurred_at: Дата и время просмотра или None для текущего
+          времени.
+        Возвращает объект WatchEvent или None, если прироста нет.
+        """
+        if seconds <= 0:
+            return None
+        occurred_at = occurred_at or timezone.now()
+        return cls(
+            user_id=user_id,
+            product_id=product_id,
+            lesson_id=lesson_id,
+            seconds=seconds,
+            occurred_at=occurred_at,
+            day=occurred_at.astimezone(dt_timezone.utc).date(),
+        )
+
+
+class WatchRollup(models.Model):
+    """
+    Сумма просмотренных секунд урока продукта за час или день,
+    рассчитанная по событиям WatchEvent.
+
+    Поля:
+    - granularity: CharField - Размер интервала: час или день.
+    - bucket: DateTimeField - Начало интервала (UTC).
+    - product: ForeignKey - Продукт.
+    - lesson: ForeignKey - Урок.
+    - seconds: BigIntegerField - Сумма просмотренных секунд.
+    - events: IntegerField - Количество событий просмотра.
+    """
+
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITIES = (
+        (HOUR, 'Час'),
+        (DAY, 'День'),
+    )
+
+    granularity = models.CharField(
+        max_length=4,
+        choices=GRANULARITIES,
+        verbose_name='Интервал',
+    )
+    bucket = models.DateTimeField(
+        verbose_name='Начало интервала',
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт',
+    )
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,
+        verbose_name='Урок',
+    )
+    seconds = models.BigIntegerField(
+        default=0,
+        verbose_name='Сумма просмотренных секунд',
+    )
+    events = models.IntegerField(
+        default=0,
+        verbose_name='Количество событий',
+    )
+
+    class Meta:
+        verbose_name = 'агрегат просмотров'
+        verbose_name_plural = 'Агрегаты просмотров'
+        default_related_name = 'watch_rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'product', 'bucket', 'lesson'],
+                name='unique_watch_rollup',
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.product_id}/{self.lesson_id} {self.granularity} '
+                f'{self.bucket:%Y-%m-%d %H:%M}: {self.seconds} сек.')
+
+
+def get_saved_contribution(instance):
+    """
+    Получает вклад в статистику продукта сохранённой в базе данных версии
+    объекта Access или Statistic, блокируя его строку до конца транзакции.
+    - instance: Объект Access или Statistic.
+    Возвращает вклад объекта или None, если объект ещё не сохранён.
+    """
+    if instance.pk is None:
+        return None
+    saved = type(instance).objects.select_for_update().filter(
+        pk=instance.pk,
+    ).first()
+    if saved is None:
+        return None
+    return saved.stats_contribution()
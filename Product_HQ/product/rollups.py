@@ -0,0 +1,196 @@
+"""
+Модуль, содержащий агрегацию событий просмотра по часам и дням.
+
+События WatchEvent агрегируются в WatchRollup инкрементально: каждый
+запуск обрабатывает ещё не агрегированные события (поле rolled_up)
+по возрастанию номера и отмечает их агрегированными. Поэтому событие
+транзакции, зафиксированной позже событий с большими номерами, не теряется,
+а агрегируется следующим запуском; такие запоздавшие события
+учитываются в журнале и метрике watch_rollup_late_events_total.
+Агрегируются лишь события, записанные не позднее settle_seconds назад.
+Агрегированные события можно удалять по дням функцией prune_watch_events.
+
+Временные ряды строятся только по агрегатам, поэтому время их
+получения ограничено количеством интервалов в запрошенном диапазоне.
+"""
+
+import logging
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from product.metrics import metrics
+from product.models import Counter, WatchEvent, WatchRollup
+
+logger = logging.getLogger(__name__)
+
+# Имя счётчика с наибольшим номером агрегированного события. Строка
+# счётчика также блокируется на время агрегации.
+HIGH_WATER_MARK = 'watch-rollup:high-water-mark'
+
+# Функции усечения времени события до начала интервала.
+TRUNCATE = {
+    WatchRollup.HOUR: TruncHour,
+    WatchRollup.DAY: TruncDay,
+}
+
+# Длительность интервалов.
+STEPS = {
+    WatchRollup.HOUR: timedelta(hours=1),
+    WatchRollup.DAY: timedelta(days=1),
+}
+
+
+def _add_rollups(granularity, events):
+    """
+    Прибавляет суммы событий к агрегатам одного размера интервала.
+    - granularity: Размер интервала WatchRollup.HOUR или WatchRollup.DAY.
+    - events: Выборка агрегируемых событий.
+    """
+    truncate = TRUNCATE[granularity]
+    totals = {
+        (row['product_id'], row['bucket'], row['lesson_id']): row
+        for row in events.annotate(
+            bucket=truncate('occurred_at', tzinfo=dt_timezone.utc),
+        ).values('product_id', 'lesson_id', 'bucket').annotate(
+            total_seconds=Sum('seconds'),
+            total_events=Count('pk'),
+        ).order_by()
+    }
+    if not totals:
+        return
+    existing = {
+        (rollup.product_id, rollup.bucket, rollup.lesson_id): rollup
+        for rollup in WatchRollup.objects.filter(
+            granularity=granularity,
+            product_id__in={key[0] for key in totals},
+            bucket__in={key[1] for key in totals},
+        ).only('product_id', 'bucket', 'lesson_id', 'seconds', 'events')
+    }
+    rollups = []
+    for key, row in totals.items():
+        product_id, bucket, lesson_id = key
+        previous = existing.get(key)
+        rollups.append(WatchRollup(
+            granularity=granularity,
+            bucket=bucket,
+            product_id=product_id,
+            lesson_id=lesson_id,
+            seconds=row['total_seconds'] + (
+                previous.seconds if previous else 0),
+            events=row['total_events'] + (previous.events if previous else 0),
+        ))
+    WatchRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=['granularity', 'product', 'bucket', 'lesson'],
+        update_fields=['seconds', 'events'],
+    )
+
+
+def rollup_watch_events(batch_size=None, now=None):
+    """
+    Агрегирует очередной пакет ещё не агрегированных событий просмотра
+    в часовые и дневные агрегаты и отмечает события агрегированными.
+    Строка высшей отметки блокируется до конца транзакции, поэтому
+    параллельные запуски выполняются по очереди. События с номерами
+    ниже отметки зафиксированы после уже агрегированных событий
+    с большими номерами; они агрегируются как обычно и учитываются
+    в журнале и метрике watch_rollup_late_events_total.
+    - batch_size: Максимальное количество событий в пакете; по умолчанию
+      из настройки WATCH_ROLLUP.
+    - now: Текущее время; по умолчанию timezone.now().
+    Возвращает количество агрегированных событий.
+    """
+    config = settings.WATCH_ROLLUP
+    batch_size = batch_size or config['batch_size']
+    settled = (now or timezone.now()) - timedelta(
+        seconds=config['settle_seconds'])
+    with transaction.atomic():
+        Counter.objects.bulk_create(
+            [Counter(name=HIGH_WATER_MARK)], ignore_conflicts=True)
+        mark = Counter.objects.select_for_update().get(name=HIGH_WATER_MARK)
+        pending = WatchEvent.objects.filter(
+            rolled_up=False,
+            recorded_at__lte=settled,
+        ).order_by('pk').values_list('pk', flat=True)
+        ids = list(pending[:batch_size])
+        if not ids:
+            return 0
+        late = bisect_left(ids, mark.value)
+        if late:
+            logger.warning(
+                'Запоздавших событий просмотра с номерами ниже отметки '
+                '%d: %d', mark.value, late)
+            transaction.on_commit(
+                lambda: metrics.inc('watch_rollup_late_events_total', late))
+        events = WatchEvent.objects.filter(pk__in=ids)
+        for granularity in TRUNCATE:
+            _add_rollups(granularity, events)
+        events.update(rolled_up=True)
+        if ids[-1] > mark.value:
+            mark.value = ids[-1]
+            mark.save(update_fields=['value', 'updated_at'])
+    return len(ids)
+
+
+def prune_watch_events(before):
+    """
+    Удаляет агрегированные события просмотра за дни до указанного.
+    - before: Дата; удаляются события за более ранние дни.
+    Возвращает количество удалённых событий.
+    """
+    deleted, _ = WatchEvent.objects.filter(
+        day__lt=before,
+        rolled_up=True,
+    ).delete()
+    return deleted
+
+
+def get_watch_timeseries(product_id, start, end, granularity,
+                         lesson_id=None):
+    """
+    Получает временной ряд просмотренных секунд продукта по агрегатам.
+    - product_id: Идентификатор продукта.
+    - start: Первый день диапазона (UTC).
+    - end: Последний день диапазона (UTC) включительно.
+    - granularity: Размер интервала WatchRollup.HOUR или WatchRollup.DAY.
+    - lesson_id: Идентификатор урока или None для всех уроков продукта.
+    Возвращает список словарей с ключами bucket, seconds и events
+    для каждого интервала диапазона, включая интервалы без просмотров.
+    """
+    first = datetime.combine(start, time.min, tzinfo=dt_timezone.utc)
+    stop = datetime.combine(
+        end + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+    rollups = WatchRollup.objects.filter(
+        granularity=granularity,
+        product_id=product_id,
+        bucket__gte=first,
+        bucket__lt=stop,
+    )
+    if lesson_id is not None:
+        rollups = rollups.filter(lesson_id=lesson_id)
+    totals = {
+        row['bucket']: row
+        for row in rollups.values('bucket').annotate(
+            total_seconds=Sum('seconds'),
+            total_events=Sum('events'),
+        ).order_by()
+    }
+    points = []
+    bucket = first
+    while bucket < stop:
+        row = totals.get(bucket)
+        points.append({
+            'bucket': bucket,
+            'seconds': row['total_seconds'] if row else 0,
+            'events': row['total_events'] if row else 0,
+        })
+        bucket += STEPS[granularity]
+    return points
@@ -0,0 +1,104 @@
+"""
+Модуль, содержащий маршрутизацию запросов к реплике базы данных.
+
+Если в настройке DATABASES объявлена база данных 'replica' (реплика
+основной базы данных 'default'), чтение внутри блока replica_reads()
+выполняется с реплики. ReplicaReadMiddleware включает чтение с реплики
+для GET- и HEAD-запросов к представлениям, имена URL которых указаны
+в настройке DATABASE_REPLICA_VIEWS. Запись, в том числе статистики
+просмотров, и чтение внутри транзакции всегда выполняются в основной
+базе данных.
+"""
+
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import Resolver404, resolve
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Разрешено ли чтение с реплики в текущем контексте.
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+# Методы запросов, которые не изменяют данные.
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Разрешает (или запрещает) чтение с реплики внутри блока.
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Маршрутизатор, направляющий чтение на реплику, если оно разрешено
+    в текущем контексте, а запись — в основную базу данных.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            _replica_reads.get()
+            and REPLICA_DB_ALIAS in settings.DATABASES
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная база данных.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMiddleware:
+    """
+    Промежуточный слой, разрешающий чтение с реплики для GET- и
+    HEAD-запросов к представлениям из настройки DATABASE_REPLICA_VIEWS.
+    Поддерживает синхронные и асинхронные обработчики.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def use_replica(request):
+        """
+        Возвращает True, если запрос можно обслужить с реплики.
+        """
+        if request.method not in SAFE_METHODS:
+            return False
+        try:
+            match = resolve(
+                request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        return match.view_name in settings.DATABASE_REPLICA_VIEWS
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.use_replica(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with replica_reads(self.use_replica(request)):
+            return await self.get_response(request)
@@ -0,0 +1,207 @@
+"""
+Модуль, содержащий генерацию синтетических данных платформы:
+пользователей, продуктов, уроков, доступов и статистики просмотров.
+
+Данные записываются пакетами через bulk_create, минуя поштучные проверки
+Statistic.save, но соблюдают его инварианты: статистика создаётся только
+для уроков продукта и только при разрешённом доступе пользователя
+к продукту, а статус просмотра вычисляется по тому же правилу.
+При одинаковом seed на пустой базе данных генерируются одинаковые данные.
+"""
+
+import datetime
+import random
+import time
+
+from django.db import transaction
+
+from product.models import (Access, Lesson, Product, Statistic, User,
+                            is_lesson_viewed)
+from product.stats import (rebuild_product_stats,
+                           reconcile_platform_user_count)
+
+# Начало периода, за который генерируются даты просмотров.
+BASE_DATE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+VIEW_PERIOD_DAYS = 90
+
+
+def _bulk_create(model, objects, batch_size, report):
+    """
+    Записывает объекты пакетами и сообщает о скорости записи.
+    - model: Модель объектов.
+    - objects: Список объектов.
+    - batch_size: Количество строк в одном запросе INSERT.
+    - report: Функция report(table, rows, seconds) или None.
+    Возвращает количество записанных строк.
+    """
+    started = time.perf_counter()
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    if report is not None:
+        report(model._meta.db_table, len(objects),
+               time.perf_counter() - started)
+    return len(objects)
+
+
+def generate_platform(users=1000, products=50, lessons=500,
+                      lessons_per_product=20, products_per_user=3,
+                      granted_ratio=0.9, view_ratio=0.5, seed=0,
+                      prefix='seed', batch_size=1000, report=None):
+    """
+    Генерирует синтетические данные платформы.
+    - users: Количество пользователей.
+    - products: Количество продуктов.
+    - lessons: Количество уроков; уроки распределяются между продуктами
+      случайно, поэтому один урок может входить в несколько продуктов.
+    - lessons_per_product: Количество уроков в продукте.
+    - products_per_user: Количество доступов на пользователя.
+    - granted_ratio: Доля доступов с разрешённым доступом.
+    - view_ratio: Доля уроков продукта, просмотренных студентом.
+    - seed: Начальное значение генератора случайных чисел.
+    - prefix: Префикс имён пользователей, продуктов и уроков.
+    - batch_size: Количество пользователей, обрабатываемых за один пакет,
+      и количество строк в одном запросе INSERT.
+    - report: Функция report(table, rows, seconds), вызываемая после
+      записи каждого пакета строк, или None.
+    Доступы и статистика записываются в отдельной транзакции для каждого
+    пакета пользователей, поэтому объём транзакции не зависит от объёма
+    данных. В конце перестраивается таблица ProductStats.
+    Возвращает словарь с количеством созданных строк по таблицам.
+    """
+    rnd = random.Random(seed)
+    counts = dict.fromkeys(
+        ('users', 'products', 'lessons', 'links', 'accesses', 'statistics'),
+        0,
+    )
+
+    with transaction.atomic():
+        for start in range(0, users, batch_size):
+            counts['users'] += _bulk_create(
+                User,
+                [
+                    User(username=f'{prefix}-user-{index}', password='!')
+                    for index in range(start, min(start + batch_size, users))
+                ],
+                batch_size,
+                report,
+            )
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}-user-',
+        ).order_by('pk').values_list('pk', flat=True))
+
+        counts['lessons'] = _bulk_create(
+            Lesson,
+            [
+                Lesson(
+                    name=f'{prefix} lesson {index}',
+                    slug=f'{prefix}-lesson-{index}',
+                    text=f'Описание урока {index}',
+                    video_url=f'https://video.example.com/{prefix}/{index}',
+                    video_duration=rnd.randint(60, 3600),
+                )
+                for index in range(lessons)
+            ],
+            batch_size,
+            report,
+        )
+        durations = dict(Lesson.objects.filter(
+            slug__startswith=f'{prefix}-lesson-',
+        ).values_list('pk', 'video_duration'))
+        lesson_ids = sorted(durations)
+
+        counts['products'] = _bulk_create(
+            Product,
+            [
+                Product(
+                    name=f'{prefix} product {index}',
+                    slug=f'{prefix}-product-{index}',
+                    text=f'Описание продукта {index}',
+                    owner_id=rnd.choice(user_ids),
+                )
+                for index in range(products)
+            ],
+            batch_size,
+            report,
+        )
+        product_ids = list(Product.objects.filter(
+            slug__startswith=f'{prefix}-product-',
+        ).order_by('pk').values_list('pk', flat=True))
+
+        product_lessons = {
+            product_id: rnd.sample(
+                lesson_ids, min(lessons_per_product, len(lesson_ids)))
+            for product_id in product_ids
+        }
+        counts['links'] = _bulk_create(
+            Product.lessons.through,
+            [
+                Product.lessons.through(
+                    product_id=product_id, lesson_id=lesson_id)
+                for product_id, ids in product_lessons.items()
+                for lesson_id in ids
+            ],
+            batch_size,
+            report,
+        )
+
+    for start in range(0, len(user_ids), batch_size):
+        accesses, statistics = _generate_activity(
+            rnd,
+            user_ids[start:start + batch_size],
+            product_lessons,
+            durations,
+            products_per_user,
+            granted_ratio,
+            view_ratio,
+        )
+        with transaction.atomic():
+            counts['accesses'] += _bulk_create(
+                Access, accesses, batch_size, report)
+            counts['statistics'] += _bulk_create(
+                Statistic, statistics, batch_size, report)
+
+    rebuild_product_stats()
+    reconcile_platform_user_count()
+    return counts
+
+
+def _generate_activity(rnd, user_ids, product_lessons, durations,
+                       products_per_user, granted_ratio, view_ratio):
+    """
+    Генерирует доступы и статистику просмотров для пакета пользователей.
+    - rnd: Генератор случайных чисел.
+    - user_ids: Идентификаторы пользователей пакета.
+    - product_lessons: Словарь {id продукта: список id уроков}.
+    - durations: Словарь {id урока: длительность видео}.
+    Остальные параметры описаны в generate_platform.
+    Возвращает кортеж (список Access, список Statistic).
+    """
+    product_ids = list(product_lessons)
+    accesses = []
+    statistics = []
+    for user_id in user_ids:
+        for product_id in rnd.sample(
+            product_ids, min(products_per_user, len(product_ids))
+        ):
+            granted = rnd.random() < granted_ratio
+            accesses.append(Access(
+                user_id=user_id,
+                product_id=product_id,
+                access_granted=granted,
+            ))
+            if not granted:
+                continue
+            for lesson_id in product_lessons[product_id]:
+                if rnd.random() >= view_ratio:
+                    continue
+                time_duration = rnd.randint(0, durations[lesson_id])
+                statistics.append(Statistic(
+                    user_id=user_id,
+                    product_id=product_id,
+                    lesson_id=lesson_id,
+                    time_duration=time_duration,
+                    last_viewed_date=BASE_DATE + datetime.timedelta(
+                        seconds=rnd.randint(0, VIEW_PERIOD_DAYS * 86400)),
+                    status=is_lesson_viewed(
+                        time_duration, durations[lesson_id]),
+                ))
+    return accesses, statistics
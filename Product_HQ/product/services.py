@@ -0,0 +1,334 @@
+"""
+Модуль, содержащий сервисные функции для массовой записи данных.
+
+Массовые операции проверяют и записывают данные пакетами, минуя
+поштучные проверки в методах save() моделей, и поддерживают
+таблицу ProductStats и кэши так же, как поштучные операции.
+"""
+
+import csv
+from collections import defaultdict, namedtuple
+from itertools import islice
+
+from django.db import transaction
+
+from product.models import (Access, Lesson, Product, ProductStats, Statistic,
+                            User, WatchEvent, is_lesson_viewed)
+from product.signals import accesses_bulk_saved, statistics_bulk_saved
+
+# Событие прогресса просмотра урока пользователем.
+ProgressEvent = namedtuple(
+    'ProgressEvent',
+    ('user_id', 'product_id', 'lesson_id', 'time_duration',
+     'last_viewed_date'),
+)
+
+
+def merge_progress_events(previous, event):
+    """
+    Объединяет два события с одинаковым ключом (пользователь, продукт, урок).
+    - previous: Ранее полученное событие ProgressEvent.
+    - event: Новое событие ProgressEvent.
+    Возвращает событие с максимальным количеством просмотренных секунд
+    и самой поздней датой просмотра.
+    """
+    dates = [
+        date for date in (previous.last_viewed_date, event.last_viewed_date)
+        if date is not None
+    ]
+    return previous._replace(
+        time_duration=max(previous.time_duration, event.time_duration),
+        last_viewed_date=max(dates) if dates else None,
+    )
+
+
+def coalesce_progress_events(events):
+    """
+    Объединяет события с одинаковым ключом (пользователь, продукт, урок).
+    - events: Последовательность объектов ProgressEvent.
+    Возвращает словарь {ключ: объединённое событие}.
+    """
+    coalesced = {}
+    for event in events:
+        key = event[:3]
+        previous = coalesced.get(key)
+        coalesced[key] = (
+            event if previous is None
+            else merge_progress_events(previous, event)
+        )
+    return coalesced
+
+
+def save_progress_events(events, chunk_size=1000):
+    """
+    Сохраняет пакет событий прогресса просмотра уроков.
+
+    События с одинаковым ключом объединяются и записываются пакетами
+    по chunk_size ключей, каждый пакет — в отдельной транзакции
+    функцией _save_progress_chunk, поэтому списки IN (...) в запросах
+    ограничены размером пакета.
+    - events: Последовательность объектов ProgressEvent.
+    - chunk_size: Количество ключей в пакете.
+    Возвращает кортеж (saved, rejected), где:
+    - saved: Количество записанных строк статистики.
+    - rejected: Список ключей (user_id, product_id, lesson_id) событий,
+      не прошедших проверку.
+    """
+    saved = 0
+    rejected = []
+    coalesced = coalesce_progress_events(events)
+    for chunk in _chunks(coalesced.items(), chunk_size):
+        chunk_saved, chunk_rejected = _save_progress_chunk(dict(chunk))
+        saved += chunk_saved
+        rejected.extend(chunk_rejected)
+    return saved, rejected
+
+
+def _save_progress_chunk(coalesced):
+    """
+    Сохраняет пакет объединённых событий прогресса просмотра уроков.
+
+    Доступ пользователей к продуктам и связь уроков с продуктами
+    проверяются для всего пакета тремя запросами; события уроков
+    без длительности видео отклоняются. Для ключей без строки
+    статистики сначала создаются пустые строки (INSERT ... ON CONFLICT
+    DO NOTHING), после чего все строки пакета блокируются: так
+    параллельный пакет с тем же ключом ждёт фиксации транзакции и видит
+    записанные значения, а не считает ключ новым. Статистика
+    записывается одним запросом INSERT ... ON CONFLICT по ограничению
+    unique_user_product_lesson, а приросты просмотренных секунд
+    относительно заблокированных строк — событиями WatchEvent.
+    Количество просмотренных секунд и дата просмотра не уменьшаются:
+    событие объединяется с записанной строкой, как события в пакете.
+    - coalesced: Словарь {ключ: объединённое событие ProgressEvent}.
+    Возвращает кортеж (saved, rejected), как save_progress_events.
+    """
+    if not coalesced:
+        return 0, []
+    user_ids = {key[0] for key in coalesced}
+    product_ids = {key[1] for key in coalesced}
+    lesson_ids = {key[2] for key in coalesced}
+
+    granted = set(Access.objects.filter(
+        user_id__in=user_ids,
+        product_id__in=product_ids,
+        access_granted=True,
+    ).values_list('user_id', 'product_id'))
+    linked = set(Product.lessons.through.objects.filter(
+        product_id__in=product_ids,
+        lesson_id__in=lesson_ids,
+    ).values_list('product_id', 'lesson_id'))
+    durations = dict(Lesson.objects.filter(
+        pk__in=lesson_ids,
+    ).values_list('pk', 'video_duration'))
+
+    valid = {}
+    rejected = []
+    for key, event in coalesced.items():
+        user_id, product_id, lesson_id = key
+        # Статус урока без длительности видео вычислить нельзя.
+        if (user_id, product_id) in granted and (
+                (product_id, lesson_id) in linked) and (
+                durations.get(lesson_id, 0) > 0):
+            valid[key] = event
+        else:
+            rejected.append(key)
+    if not valid:
+        return 0, rejected
+
+    with transaction.atomic():
+        # Ключи упорядочены, чтобы параллельные пакеты блокировали
+        # строки в одном порядке.
+        Statistic.objects.bulk_create(
+            [
+                Statistic(
+                    user_id=user_id,
+                    product_id=product_id,
+                    lesson_id=lesson_id,
+                    time_duration=0,
+                )
+                for user_id, product_id, lesson_id in sorted(valid)
+            ],
+            ignore_conflicts=True,
+        )
+        saved = {
+            (row.user_id, row.product_id, row.lesson_id): row
+            for row in Statistic.objects.select_for_update().filter(
+                user_id__in={key[0] for key in valid},
+                product_id__in={key[1] for key in valid},
+                lesson_id__in={key[2] for key in valid},
+            ).order_by('pk').only('user_id', 'product_id', 'lesson_id',
+                                  'time_duration', 'last_viewed_date',
+                                  'status')
+        }
+        rows = []
+        watch_events = []
+        deltas = defaultdict(lambda: defaultdict(int))
+        for key, event in valid.items():
+            previous = saved.get(key)
+            if previous is not None:
+                # Записанные значения не уменьшаются: событие, пришедшее
+                # не по порядку или из другого процесса, объединяется
+                # с записанным по правилу merge_progress_events.
+                event = merge_progress_events(
+                    ProgressEvent(*key, previous.time_duration,
+                                  previous.last_viewed_date),
+                    event,
+                )
+            status = (
+                previous is not None and previous.status
+            ) or is_lesson_viewed(event.time_duration, durations[key[2]])
+            rows.append(Statistic(
+                user_id=event.user_id,
+                product_id=event.product_id,
+                lesson_id=event.lesson_id,
+                time_duration=event.time_duration,
+                last_viewed_date=event.last_viewed_date,
+                status=status,
+            ))
+            product_deltas = deltas[event.product_id]
+            product_deltas['time_spent_seconds'] += event.time_duration
+            product_deltas['num_lessons_viewed'] += int(status)
+            if previous is not None:
+                product_deltas['time_spent_seconds'] -= previous.time_duration
+                product_deltas['num_lessons_viewed'] -= int(previous.status)
+            watch_events.append(WatchEvent.build(
+                *key,
+                event.time_duration - (
+                    previous.time_duration if previous is not None else 0),
+                event.last_viewed_date,
+            ))
+        Statistic.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user', 'product', 'lesson'],
+            update_fields=['time_duration', 'last_viewed_date', 'status'],
+        )
+        WatchEvent.objects.bulk_create(
+            [event for event in watch_events if event is not None])
+        for product_id, fields in deltas.items():
+            ProductStats.add(product_id, **fields)
+        statistics_bulk_saved.send(
+            sender=Statistic,
+            user_ids={key[0] for key in valid},
+            product_ids=set(deltas),
+            count=len(rows),
+        )
+    return len(rows), rejected
+
+
+def _chunks(items, chunk_size):
+    """
+    Разбивает последовательность на списки длиной не больше chunk_size,
+    не читая её целиком.
+    """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def set_product_access(product_id, user_ids, access_granted=True,
+                       chunk_size=1000):
+    """
+    Массово предоставляет или отзывает доступ пользователей к продукту.
+
+    Пользователи обрабатываются пакетами по chunk_size, каждый пакет —
+    в отдельной транзакции: доступы записываются одним запросом
+    INSERT ... ON CONFLICT по ограничению unique_user_product,
+    статистика продукта (ProductStats) обновляется одним запросом,
+    а кэши и версии данных пользователей — сигналом accesses_bulk_saved
+    вместо поштучных сигналов post_save. Доступ отзывается только
+    у пользователей, у которых он был предоставлен.
+    - product_id: Идентификатор продукта.
+    - user_ids: Итерируемая последовательность идентификаторов
+      пользователей; читается по пакетам.
+    - access_granted: True для предоставления доступа, False для отзыва.
+    - chunk_size: Количество пользователей в пакете.
+    Возвращает кортеж (changed, missing), где:
+    - changed: Количество доступов, которые были созданы или изменены.
+    - missing: Список идентификаторов несуществующих пользователей.
+    """
+    changed_total = 0
+    missing = []
+    for chunk in _chunks(user_ids, chunk_size):
+        chunk = list(dict.fromkeys(chunk))
+        with transaction.atomic():
+            existing_users = set(User.objects.filter(
+                pk__in=chunk,
+            ).values_list('pk', flat=True))
+            missing.extend(
+                user_id for user_id in chunk if user_id not in existing_users)
+            saved = dict(Access.objects.select_for_update().filter(
+                product_id=product_id,
+                user_id__in=existing_users,
+            ).values_list('user_id', 'access_granted'))
+            if access_granted:
+                changed = [
+                    user_id for user_id in chunk
+                    if user_id in existing_users and not saved.get(user_id)
+                ]
+            else:
+                changed = [user_id for user_id in chunk if saved.get(user_id)]
+            if not changed:
+                continue
+            Access.objects.bulk_create(
+                [
+                    Access(
+                        user_id=user_id,
+                        product_id=product_id,
+                        access_granted=access_granted,
+                    )
+                    for user_id in changed
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['access_granted'],
+            )
+            ProductStats.add(
+                product_id,
+                num_accesses=sum(
+                    user_id not in saved for user_id in changed),
+                num_students=(
+                    len(changed) if access_granted else -len(changed)),
+            )
+            accesses_bulk_saved.send(
+                sender=Access,
+                user_ids=set(changed),
+                product_ids={product_id},
+                count=len(changed),
+            )
+        changed_total += len(changed)
+    return changed_total, missing
+
+
+def read_csv_user_ids(stream, chunk_size=1000):
+    """
+    Читает идентификаторы пользователей из CSV с заголовком, содержащим
+    столбец user_id или username. Имена пользователей преобразуются
+    в идентификаторы пакетами по chunk_size одним запросом на пакет;
+    неизвестные имена пропускаются.
+    - stream: Текстовый поток CSV.
+    - chunk_size: Количество имён пользователей в пакете.
+    Возвращает генератор идентификаторов пользователей.
+    """
+    reader = csv.DictReader(stream)
+    fields = reader.fieldnames or []
+    if 'user_id' in fields:
+        for row in reader:
+            if row['user_id'].strip():
+                yield int(row['user_id'])
+    elif 'username' in fields:
+        usernames = (
+            row['username'].strip() for row in reader
+            if row['username'].strip()
+        )
+        for chunk in _chunks(usernames, chunk_size):
+            ids = dict(User.objects.filter(
+                username__in=chunk,
+            ).values_list('username', 'pk'))
+            yield from (ids[name] for name in chunk if name in ids)
+    else:
+        raise ValueError('CSV должен содержать столбец user_id или username')
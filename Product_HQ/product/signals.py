@@ -0,0 +1,212 @@
+"""
+Модуль, содержащий обработчики сигналов моделей приложения product.
+"""
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+
+from product.entitlements import access_index
+from product.metrics import metrics
+from product.models import (Access, Lesson, Product, ProductStats,
+                            Statistic, User, get_saved_contribution)
+from product.stats import add_platform_users, refresh_num_lessons
+from product.versions import bump_user_versions, touch_products
+
+# Отправляется после массовой записи статистики, минующей сигналы
+# post_save. Аргументы: user_ids, product_ids — идентификаторы
+# затронутых пользователей и продуктов, count — количество записанных
+# строк.
+statistics_bulk_saved = Signal()
+
+# Отправляется после массовой записи доступов, минующей сигналы
+# post_save. Аргументы: user_ids, product_ids — идентификаторы
+# затронутых пользователей и продуктов, count — количество записанных
+# строк.
+accesses_bulk_saved = Signal()
+
+
+@receiver(m2m_changed, sender=Product.lessons.through)
+def lessons_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Обновляет количество уроков в статистике продуктов
+    при изменении связи продуктов и уроков.
+    """
+    if action == 'pre_clear' and reverse:
+        # После очистки связи со стороны урока продукты уже не найти.
+        instance._cleared_product_ids = list(
+            instance.products.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == 'post_clear':
+        product_ids = instance.__dict__.pop('_cleared_product_ids', [])
+    else:
+        product_ids = pk_set
+    refresh_num_lessons(product_ids)
+    touch_products(product_ids)
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, **kwargs):
+    """
+    Обновляет дату изменения продуктов изменённого урока: она входит
+    в ключ каталога уроков и в валидаторы данных пользователей.
+    """
+    if not created:
+        touch_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Lesson)
+def lesson_deleted(sender, instance, **kwargs):
+    """
+    Обновляет дату изменения и количество уроков продуктов удаляемого
+    урока: связь с продуктами удаляется каскадно, без сигнала
+    m2m_changed. Продукты запоминаются до удаления связи, а количество
+    уроков пересчитывается после фиксации транзакции удаления.
+    """
+    product_ids = list(instance.products.values_list('pk', flat=True))
+    touch_products(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: refresh_num_lessons(product_ids))
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    """
+    Увеличивает счётчик пользователей платформы при создании пользователя.
+    """
+    if created:
+        add_platform_users(1)
+
+
+@receiver(post_save, sender=User)
+def user_updated(sender, instance, created, update_fields, **kwargs):
+    """
+    Увеличивает версию данных пользователя при изменении пользователя,
+    а при возможном изменении имени также обновляет дату изменения его
+    продуктов: имя выводится в данных их студентов как владелец.
+    """
+    if created:
+        return
+    if update_fields is None or 'username' in update_fields:
+        bump_user_versions([instance.pk])
+        touch_products(
+            Product.objects.filter(owner=instance).values_list(
+                'pk', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """
+    Уменьшает счётчик пользователей платформы при удалении пользователя.
+    """
+    add_platform_users(-1)
+
+
+@receiver(pre_delete, sender=Statistic)
+@receiver(pre_delete, sender=Access)
+def stats_object_deleting(sender, instance, **kwargs):
+    """
+    Запоминает вклад удаляемого доступа или статистики в статистику
+    продукта, блокируя строку до конца транзакции удаления. Сигнал
+    отправляется и при удалении выборкой (QuerySet.delete(), действие
+    «Удалить выбранные» админ-панели), минующем метод delete() модели.
+    """
+    instance._saved_stats_contribution = get_saved_contribution(instance)
+
+
+@receiver(post_delete, sender=Statistic)
+@receiver(post_delete, sender=Access)
+def stats_object_deleted(sender, instance, **kwargs):
+    """
+    Вычитает вклад удалённого доступа или статистики из статистики
+    продукта (ProductStats).
+    """
+    ProductStats.apply(
+        instance.__dict__.pop('_saved_stats_contribution', None), None)
+
+
+@receiver(post_save, sender=Statistic)
+@receiver(post_delete, sender=Statistic)
+@receiver(post_save, sender=Access)
+@receiver(post_delete, sender=Access)
+def user_data_changed(sender, instance, **kwargs):
+    """
+    Увеличивает версию данных пользователя при изменении его статистики
+    или доступов.
+    """
+    bump_user_versions([instance.user_id])
+
+
+@receiver(statistics_bulk_saved)
+@receiver(accesses_bulk_saved)
+def user_data_bulk_changed(sender, user_ids, **kwargs):
+    """
+    Увеличивает версии данных пользователей после массовой записи
+    статистики или доступов.
+    """
+    bump_user_versions(user_ids)
+
+
+@receiver(post_save, sender=Access)
+@receiver(post_delete, sender=Access)
+def access_changed(sender, instance, **kwargs):
+    """
+    Удаляет доступы пользователя из индекса прав доступа.
+    """
+    access_index.invalidate_users([instance.user_id])
+
+
+@receiver(accesses_bulk_saved)
+def accesses_bulk_changed(sender, user_ids, **kwargs):
+    """
+    Удаляет доступы пользователей из индекса прав доступа после
+    массовой записи доступов.
+    """
+    access_index.invalidate_users(user_ids)
+
+
+@receiver(m2m_changed, sender=Product.lessons.through)
+def lessons_access_changed(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """
+    Удаляет уроки продуктов из индекса прав доступа при изменении
+    связи продуктов и уроков.
+    """
+    if action == 'pre_clear' and reverse:
+        access_index.invalidate_products(
+            instance.products.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            access_index.invalidate_products([instance.pk])
+        elif pk_set:
+            access_index.invalidate_products(pk_set)
+
+
+def count_statistic_writes(count, source):
+    """
+    Учитывает записанные строки статистики в метрике
+    statistic_writes_total после фиксации транзакции.
+    """
+    transaction.on_commit(
+        lambda: metrics.inc('statistic_writes_total', count, source=source))
+
+
+@receiver(post_save, sender=Statistic)
+def statistic_saved(sender, **kwargs):
+    """
+    Учитывает запись статистики в метриках.
+    """
+    count_statistic_writes(1, 'save')
+
+
+@receiver(statistics_bulk_saved)
+def statistics_bulk_counted(sender, count=0, **kwargs):
+    """
+    Учитывает массовую запись статистики в метриках.
+    """
+    count_statistic_writes(count, 'bulk')
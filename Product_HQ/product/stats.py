@@ -0,0 +1,273 @@
+"""
+Модуль, содержащий вычисление статистики продуктов по исходным таблицам
+и поддержку денормализованной таблицы ProductStats.
+
+Показатели всех продуктов вычисляются одним запросом с подзапросами-
+агрегатами. Эти вычисления используются для перестроения и проверки
+ProductStats, а не при обработке запросов к API.
+
+Количество пользователей платформы хранится в счётчике Counter,
+который изменяется обработчиками сигналов при создании и удалении
+пользователей и периодически сверяется с таблицей пользователей.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import (Count, F, IntegerField, OuterRef, Subquery,
+                              Sum)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from product.models import (Access, Counter, Product, ProductStats,
+                            Statistic, User)
+
+# Имя счётчика с количеством пользователей платформы.
+PLATFORM_USERS_COUNTER = 'platform:users'
+
+# Поля ProductStats, вычисляемые по исходным таблицам.
+STATS_FIELDS = (
+    'num_lessons',
+    'num_lessons_viewed',
+    'time_spent_seconds',
+    'num_students',
+    'num_accesses',
+)
+
+
+def _aggregate_subquery(queryset, aggregate):
+    """
+    Превращает выборку, связанную с продуктом, в подзапрос-агрегат.
+    - queryset: Выборка, отфильтрованная по product=OuterRef('pk').
+    - aggregate: Агрегатная функция.
+    Возвращает выражение со значением агрегата или 0, если строк нет.
+    """
+    subquery = queryset.order_by().values('product').annotate(
+        value=aggregate,
+    ).values('value')
+    return Coalesce(
+        Subquery(subquery, output_field=IntegerField()),
+        0,
+    )
+
+
+def _num_lessons_subquery():
+    """
+    Возвращает подзапрос с количеством уроков продукта по связи
+    Product.lessons.
+    """
+    return _aggregate_subquery(
+        Product.lessons.through.objects.filter(product=OuterRef('pk')),
+        Count('pk'),
+    )
+
+
+def annotate_base_statistics(queryset):
+    """
+    Добавляет к выборке продуктов показатели, вычисленные по исходным
+    таблицам Product.lessons, Statistic и Access.
+    - queryset: Выборка продуктов.
+    Возвращает выборку с аннотациями, названными как поля ProductStats.
+    """
+    return queryset.annotate(
+        num_lessons=_num_lessons_subquery(),
+        num_lessons_viewed=_aggregate_subquery(
+            Statistic.objects.filter(
+                product=OuterRef('pk'),
+                status=True,
+            ),
+            Count('pk'),
+        ),
+        time_spent_seconds=_aggregate_subquery(
+            Statistic.objects.filter(product=OuterRef('pk')),
+            Sum('time_duration'),
+        ),
+        num_students=_aggregate_subquery(
+            Access.objects.filter(
+                product=OuterRef('pk'),
+                access_granted=True,
+            ),
+            Count('pk'),
+        ),
+        num_accesses=_aggregate_subquery(
+            Access.objects.filter(product=OuterRef('pk')),
+            Count('pk'),
+        ),
+    )
+
+
+def refresh_num_lessons(product_ids):
+    """
+    Пересчитывает количество уроков для указанных продуктов одним
+    подзапросом к связи Product.lessons, без остальных показателей.
+    - product_ids: Идентификаторы продуктов.
+    """
+    products = Product.objects.filter(pk__in=product_ids).annotate(
+        num_lessons=_num_lessons_subquery(),
+    ).values_list('pk', 'num_lessons')
+    for product_id, num_lessons in products:
+        ProductStats.objects.update_or_create(
+            product_id=product_id,
+            defaults={'num_lessons': num_lessons},
+        )
+
+
+def rebuild_product_stats(chunk_size=1000):
+    """
+    Перестраивает таблицу ProductStats по исходным таблицам.
+
+    Продукты обрабатываются пакетами по chunk_size, каждый пакет —
+    в отдельной транзакции функцией _rebuild_chunk. Строки пакета
+    блокируются до вычисления показателей, поэтому перестроение можно
+    запускать под нагрузкой: приращения ProductStats.add параллельных
+    транзакций применяются либо до, либо после перестроения строки
+    и не теряются.
+    - chunk_size: Количество продуктов в пакете.
+    Возвращает количество перестроенных строк.
+    """
+    total = 0
+    after = 0
+    while True:
+        product_ids = list(Product.objects.filter(
+            pk__gt=after,
+        ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not product_ids:
+            return total
+        total += _rebuild_chunk(product_ids)
+        after = product_ids[-1]
+
+
+def _rebuild_chunk(product_ids):
+    """
+    Перестраивает строки ProductStats пакета продуктов в одной
+    транзакции. Недостающие строки создаются, после чего строки
+    пакета блокируются (SELECT ... FOR UPDATE) и только затем
+    показатели вычисляются по исходным таблицам.
+    - product_ids: Упорядоченный список идентификаторов продуктов.
+    Возвращает количество перестроенных строк.
+    """
+    with transaction.atomic():
+        ProductStats.objects.bulk_create(
+            [ProductStats(product_id=product_id)
+             for product_id in product_ids],
+            ignore_conflicts=True,
+        )
+        list(ProductStats.objects.select_for_update().filter(
+            product_id__in=product_ids,
+        ).order_by('pk').values_list('pk', flat=True))
+        products = annotate_base_statistics(
+            Product.objects.filter(pk__in=product_ids),
+        )
+        return _write_stats([
+            ProductStats(
+                product_id=product.pk,
+                **{field: getattr(product, field) for field in STATS_FIELDS},
+            )
+            for product in products
+        ])
+
+
+def _write_stats(rows):
+    """
+    Записывает строки статистики, заменяя существующие.
+    - rows: Список объектов ProductStats.
+    Возвращает количество записанных строк.
+    """
+    ProductStats.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=STATS_FIELDS,
+    )
+    return len(rows)
+
+
+def verify_product_stats():
+    """
+    Сверяет таблицу ProductStats с исходными таблицами.
+    Возвращает список расхождений в виде кортежей
+    (id продукта, поле, значение в ProductStats, ожидаемое значение).
+    """
+    stored = {
+        row['product_id']: row
+        for row in ProductStats.objects.values('product_id', *STATS_FIELDS)
+    }
+    mismatches = []
+    expected = annotate_base_statistics(Product.objects.order_by('pk'))
+    for product in expected.values('pk', *STATS_FIELDS).iterator():
+        row = stored.get(product['pk'], {})
+        for field in STATS_FIELDS:
+            if row.get(field, 0) != product[field]:
+                mismatches.append(
+                    (product['pk'], field, row.get(field, 0), product[field])
+                )
+    return mismatches
+
+
+def reconcile_platform_user_count():
+    """
+    Записывает в счётчик количество пользователей платформы, посчитанное
+    по таблице пользователей.
+    Возвращает количество пользователей.
+    """
+    with transaction.atomic():
+        num_users = User.objects.count()
+        Counter.objects.update_or_create(
+            name=PLATFORM_USERS_COUNTER,
+            defaults={'value': num_users},
+        )
+    return num_users
+
+
+def get_platform_user_count():
+    """
+    Получает количество пользователей платформы из счётчика одним
+    запросом. Если счётчика ещё нет, создаёт его по таблице
+    пользователей.
+    """
+    num_users = Counter.objects.filter(
+        name=PLATFORM_USERS_COUNTER,
+    ).values_list('value', flat=True).first()
+    if num_users is None:
+        num_users = reconcile_platform_user_count()
+    return num_users
+
+
+async def aget_platform_user_count():
+    """
+    Асинхронный вариант get_platform_user_count.
+    """
+    num_users = await Counter.objects.filter(
+        name=PLATFORM_USERS_COUNTER,
+    ).values_list('value', flat=True).afirst()
+    if num_users is None:
+        num_users = await sync_to_async(reconcile_platform_user_count)()
+    return num_users
+
+
+def add_platform_users(delta):
+    """
+    Прибавляет приращение к счётчику пользователей платформы. Если
+    счётчика ещё нет, он будет создан по таблице пользователей при
+    первом чтении.
+    - delta: Приращение количества пользователей.
+    """
+    Counter.objects.filter(name=PLATFORM_USERS_COUNTER).update(
+        value=F('value') + delta,
+        updated_at=timezone.now(),
+    )
+
+
+def verify_platform_user_count():
+    """
+    Сверяет счётчик пользователей платформы с таблицей пользователей.
+    Возвращает кортеж (значение счётчика, ожидаемое значение)
+    при расхождении или None. Отсутствующий счётчик расхождением
+    не считается.
+    """
+    stored = Counter.objects.filter(
+        name=PLATFORM_USERS_COUNTER,
+    ).values_list('value', flat=True).first()
+    expected = User.objects.count()
+    if stored is None or stored == expected:
+        return None
+    return stored, expected
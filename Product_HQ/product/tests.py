@@ -0,0 +1,635 @@
+"""
+Тесты приложения product.
+"""
+
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from product.buffer import ProgressBuffer
+from product.metrics import (FileMetricsBackend, LocalMetricsBackend,
+                             MetricsRegistry)
+from product.models import (Access, Lesson, Product, ProductStats,
+                            Statistic, User, WatchEvent, WatchRollup)
+from product.rollups import prune_watch_events, rollup_watch_events
+from product.services import (ProgressEvent, save_progress_events,
+                              set_product_access)
+from product.stats import rebuild_product_stats, verify_product_stats
+
+# Индексы миграции 0010_api_access_indexes по таблицам.
+API_INDEXES = {
+    'product_access': (
+        'access_user_granted_idx',
+        'access_product_granted_idx',
+    ),
+    'product_lesson': ('lesson_created_id_idx',),
+    'product_statistic': (
+        'statistic_product_viewed_idx',
+        'statistic_product_agg_idx',
+    ),
+    'product_product_lessons': ('product_lessons_lesson_product_idx',),
+}
+
+
+class IndexUsageTests(TestCase):
+    """
+    Запросы API к таблицам доступов, статистики и уроков продуктов
+    выполняются по индексу, а не полным просмотром таблицы (EXPLAIN).
+
+    На PostgreSQL последовательный просмотр отключается
+    (enable_seqscan = off): на маленьких тестовых таблицах он дешевле
+    индекса, а при отключении планировщик выбирает его, только если
+    применимого индекса нет.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='student')
+        cls.product = Product.objects.create(
+            name='Продукт',
+            slug='product',
+            text='Описание',
+            owner=User.objects.create(username='owner'),
+        )
+        cls.lesson = Lesson.objects.create(
+            name='Урок',
+            slug='lesson',
+            text='Описание',
+            video_url='https://example.com/lesson',
+            video_duration=100,
+        )
+        cls.product.lessons.add(cls.lesson)
+        Access.objects.create(
+            user=cls.user, product=cls.product, access_granted=True)
+        Statistic.objects.create(
+            user=cls.user,
+            product=cls.product,
+            lesson=cls.lesson,
+            time_duration=90,
+            last_viewed_date=timezone.now(),
+        )
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        elif connection.vendor != 'sqlite':
+            self.skipTest('Планы запросов проверяются для SQLite '
+                          'и PostgreSQL.')
+
+    def assert_index_scan(self, queryset, table):
+        """
+        Проверяет, что таблица table читается в плане запроса по индексу.
+        - queryset: Проверяемая выборка.
+        - table: Имя таблицы базы данных.
+        """
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertRegex(
+                plan, rf'SEARCH {table} USING (COVERING )?INDEX')
+            self.assertNotRegex(plan, rf'SCAN {table}\b')
+        else:
+            self.assertIn(f' on {table}', plan)
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            for table, indexes in API_INDEXES.items():
+                constraints = connection.introspection.get_constraints(
+                    cursor, table)
+                for index in indexes:
+                    with self.subTest(index=index):
+                        self.assertIn(index, constraints)
+
+    def test_access_by_user(self):
+        self.assert_index_scan(
+            Access.objects.filter(
+                user=self.user, access_granted=True,
+            ).order_by().values('product_id'),
+            'product_access',
+        )
+
+    def test_access_by_product(self):
+        self.assert_index_scan(
+            Access.objects.filter(
+                product=self.product, access_granted=True,
+            ).order_by().values('product').annotate(
+                value=Count('pk')).values('value'),
+            'product_access',
+        )
+
+    def test_statistic_viewed_by_product(self):
+        self.assert_index_scan(
+            Statistic.objects.filter(
+                product=self.product, status=True,
+            ).order_by().values('lesson_id'),
+            'product_statistic',
+        )
+
+    def test_statistic_aggregate_by_product(self):
+        self.assert_index_scan(
+            Statistic.objects.filter(
+                product=self.product,
+            ).order_by().values('product').annotate(
+                value=Sum('time_duration')).values('value'),
+            'product_statistic',
+        )
+
+    def test_statistic_by_key(self):
+        self.assert_index_scan(
+            Statistic.objects.filter(
+                user=self.user, product=self.product, lesson=self.lesson,
+            ).order_by(),
+            'product_statistic',
+        )
+
+    def test_product_lessons_by_product(self):
+        self.assert_index_scan(
+            Product.lessons.through.objects.filter(
+                product=self.product,
+            ).values('lesson_id'),
+            'product_product_lessons',
+        )
+
+    def test_product_lessons_by_lesson(self):
+        self.assert_index_scan(
+            Product.lessons.through.objects.filter(
+                lesson=self.lesson,
+            ).values('product_id'),
+            'product_product_lessons',
+        )
+
+    def test_lessons_ordered_by_index(self):
+        plan = Lesson.objects.order_by('-created_at', 'id')[:20].explain()
+        self.assertIn('lesson_created_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertNotIn('Sort', plan)
+
+
+class ProductStatsTests(TestCase):
+    """
+    Инкрементально обновляемая статистика продуктов (ProductStats)
+    совпадает со статистикой, посчитанной по исходным таблицам.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.users = [
+            User.objects.create(username=f'student-{number}')
+            for number in range(3)
+        ]
+        cls.product = Product.objects.create(
+            name='Продукт',
+            slug='product',
+            text='Описание',
+            owner=cls.owner,
+        )
+        cls.lessons = [
+            Lesson.objects.create(
+                name=f'Урок {number}',
+                slug=f'lesson-{number}',
+                text='Описание',
+                video_url=f'https://example.com/lesson/{number}',
+                video_duration=100,
+            )
+            for number in range(2)
+        ]
+        cls.product.lessons.set(cls.lessons)
+
+    def assert_stats_consistent(self):
+        """
+        Проверяет, что ProductStats совпадает с пересчётом по исходным
+        таблицам, и что полный пересчёт ничего не меняет.
+        """
+        self.assertEqual(verify_product_stats(), [])
+        stored = list(ProductStats.objects.order_by('pk').values())
+        rebuild_product_stats()
+        self.assertEqual(
+            list(ProductStats.objects.order_by('pk').values()), stored)
+
+    def stats(self):
+        return ProductStats.objects.get(product=self.product)
+
+    def create_statistic(self, user, lesson, time_duration):
+        return Statistic.objects.create(
+            user=user,
+            product=self.product,
+            lesson=lesson,
+            time_duration=time_duration,
+            last_viewed_date=timezone.now(),
+        )
+
+    def test_access_create_update_delete(self):
+        access = Access.objects.create(
+            user=self.users[0], product=self.product, access_granted=False)
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().num_accesses, 1)
+        self.assertEqual(self.stats().num_students, 0)
+
+        access.access_granted = True
+        access.save()
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().num_students, 1)
+
+        access.delete()
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().num_accesses, 0)
+        self.assertEqual(self.stats().num_students, 0)
+
+    def test_statistic_create_update_delete(self):
+        Access.objects.create(
+            user=self.users[0], product=self.product, access_granted=True)
+        statistic = self.create_statistic(self.users[0], self.lessons[0], 30)
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().time_spent_seconds, 30)
+        self.assertEqual(self.stats().num_lessons_viewed, 0)
+
+        statistic.time_duration = 100
+        statistic.save()
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().time_spent_seconds, 100)
+        self.assertEqual(self.stats().num_lessons_viewed, 1)
+
+        statistic.delete()
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().time_spent_seconds, 0)
+        self.assertEqual(self.stats().num_lessons_viewed, 0)
+
+    def test_queryset_delete(self):
+        for user in self.users:
+            Access.objects.create(
+                user=user, product=self.product, access_granted=True)
+            for lesson in self.lessons:
+                self.create_statistic(user, lesson, 90)
+        self.assert_stats_consistent()
+
+        Statistic.objects.filter(user__in=self.users[:2]).delete()
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().time_spent_seconds, 180)
+
+        Access.objects.filter(user__in=self.users[:2]).delete()
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().num_accesses, 1)
+
+    def test_set_product_access(self):
+        user_ids = [user.pk for user in self.users]
+        set_product_access(self.product.pk, user_ids, chunk_size=2)
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().num_students, 3)
+
+        set_product_access(
+            self.product.pk, user_ids[:2], access_granted=False)
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().num_students, 1)
+        self.assertEqual(self.stats().num_accesses, 3)
+
+    def test_save_progress_events(self):
+        for user in self.users[:2]:
+            Access.objects.create(
+                user=user, product=self.product, access_granted=True)
+        self.create_statistic(self.users[0], self.lessons[0], 50)
+        now = timezone.now()
+        events = [
+            ProgressEvent(user.pk, self.product.pk, lesson.pk, 100, now)
+            for user in self.users
+            for lesson in self.lessons
+        ]
+        save_progress_events(events, chunk_size=3)
+        self.assert_stats_consistent()
+        self.assertEqual(self.stats().time_spent_seconds, 400)
+        self.assertEqual(self.stats().num_lessons_viewed, 4)
+
+
+class WatchRollupTests(TestCase):
+    """
+    Агрегация событий просмотра учитывает каждое событие ровно один раз,
+    в том числе событие, записанное с номером ниже уже агрегированных.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='student')
+        cls.product = Product.objects.create(
+            name='Продукт',
+            slug='product',
+            text='Описание',
+            owner=User.objects.create(username='owner'),
+        )
+        cls.lesson = Lesson.objects.create(
+            name='Урок',
+            slug='lesson',
+            text='Описание',
+            video_url='https://example.com/lesson',
+            video_duration=100,
+        )
+
+    def create_event(self, seconds, **kwargs):
+        occurred_at = timezone.now() - timedelta(hours=1)
+        return WatchEvent.objects.create(
+            user=self.user,
+            product=self.product,
+            lesson=self.lesson,
+            seconds=seconds,
+            occurred_at=occurred_at,
+            day=occurred_at.date(),
+            **kwargs,
+        )
+
+    def rolled_up_seconds(self):
+        return {
+            granularity: WatchRollup.objects.filter(
+                granularity=granularity,
+            ).aggregate(total=Sum('seconds'))['total']
+            for granularity in (WatchRollup.HOUR, WatchRollup.DAY)
+        }
+
+    def rollup(self):
+        return rollup_watch_events(
+            now=timezone.now() + timedelta(minutes=10))
+
+    def test_events_rolled_up_once(self):
+        self.create_event(10)
+        self.create_event(20)
+        self.assertEqual(self.rollup(), 2)
+        self.assertEqual(self.rollup(), 0)
+        self.assertEqual(
+            self.rolled_up_seconds(),
+            {WatchRollup.HOUR: 30, WatchRollup.DAY: 30},
+        )
+
+    def test_unsettled_events_wait(self):
+        self.create_event(10)
+        self.create_event(20, recorded_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.rollup(), 1)
+        self.assertEqual(
+            self.rolled_up_seconds()[WatchRollup.DAY], 10)
+
+    def test_late_event_below_high_water_mark(self):
+        first = self.create_event(10)
+        self.create_event(20)
+        self.create_event(30)
+        WatchEvent.objects.filter(pk=first.pk).delete()
+        self.assertEqual(self.rollup(), 2)
+        # Событие транзакции, зафиксированной после агрегации событий
+        # с большими номерами.
+        self.create_event(5, pk=first.pk)
+        with self.assertLogs('product.rollups', 'WARNING'):
+            self.assertEqual(self.rollup(), 1)
+        self.assertEqual(
+            self.rolled_up_seconds(),
+            {WatchRollup.HOUR: 55, WatchRollup.DAY: 55},
+        )
+
+    def test_prune_keeps_pending_events(self):
+        self.create_event(10)
+        self.rollup()
+        pending = self.create_event(
+            20, recorded_at=timezone.now() + timedelta(hours=1))
+        deleted = prune_watch_events(timezone.now().date() + timedelta(days=1))
+        self.assertEqual(deleted, 1)
+        self.assertEqual(list(WatchEvent.objects.all()), [pending])
+
+
+@mock.patch('product.buffer.close_old_connections', mock.Mock())
+class ProgressBufferTests(TestCase):
+    """
+    Буфер отложенной записи прогресса объединяет события по ключу
+    и возвращает в буфер события, которые не удалось записать.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='student')
+        cls.product = Product.objects.create(
+            name='Продукт',
+            slug='product',
+            text='Описание',
+            owner=User.objects.create(username='owner'),
+        )
+        cls.lessons = [
+            Lesson.objects.create(
+                name=f'Урок {number}',
+                slug=f'lesson-{number}',
+                text='Описание',
+                video_url=f'https://example.com/lesson/{number}',
+                video_duration=100,
+            )
+            for number in range(2)
+        ]
+        cls.product.lessons.set(cls.lessons)
+        Access.objects.create(
+            user=cls.user, product=cls.product, access_granted=True)
+
+    def event(self, lesson, time_duration, minutes=0):
+        return ProgressEvent(
+            self.user.pk, self.product.pk, lesson.pk, time_duration,
+            timezone.now() + timedelta(minutes=minutes),
+        )
+
+    def test_events_coalesced(self):
+        buffer = ProgressBuffer()
+        buffer.add(self.event(self.lessons[0], 30))
+        buffer.add(self.event(self.lessons[0], 20, minutes=1))
+        self.assertEqual(buffer.metrics()['queue_depth'], 1)
+        self.assertEqual(buffer.flush(), 1)
+        statistic = Statistic.objects.get(lesson=self.lessons[0])
+        self.assertEqual(statistic.time_duration, 30)
+
+    def test_failed_flush_requeued(self):
+        buffer = ProgressBuffer()
+        buffer.add(self.event(self.lessons[0], 30))
+        buffer.add(self.event(self.lessons[1], 40))
+
+        def fail(events):
+            # Событие, полученное во время неудачной записи.
+            buffer.add(self.event(self.lessons[0], 50, minutes=1))
+            raise DatabaseError('database is unavailable')
+
+        with mock.patch('product.buffer.save_progress_events', fail), \
+                self.assertLogs('product.buffer', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        metrics = buffer.metrics()
+        self.assertEqual(metrics['failed_flushes'], 1)
+        self.assertEqual(metrics['queue_depth'], 2)
+        self.assertEqual(metrics['dropped_events'], 0)
+        self.assertFalse(Statistic.objects.exists())
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(
+            dict(Statistic.objects.values_list('lesson_id', 'time_duration')),
+            {self.lessons[0].pk: 50, self.lessons[1].pk: 40},
+        )
+        self.assertEqual(buffer.metrics()['queue_depth'], 0)
+
+    def test_requeue_respects_max_keys(self):
+        buffer = ProgressBuffer(max_keys=1)
+        buffer.add(self.event(self.lessons[0], 30))
+
+        def fail(events):
+            buffer.add(self.event(self.lessons[1], 40))
+            raise DatabaseError('database is unavailable')
+
+        with mock.patch('product.buffer.save_progress_events', fail), \
+                self.assertLogs('product.buffer', 'ERROR'):
+            buffer.flush()
+        metrics = buffer.metrics()
+        self.assertEqual(metrics['queue_depth'], 1)
+        self.assertEqual(metrics['dropped_events'], 1)
+
+
+class MetricsTests(SimpleTestCase):
+    """
+    Метрики выводятся в текстовом формате Prometheus, а файловый бэкенд
+    складывает значения процессов.
+    """
+
+    def render_lines(self, registry):
+        return registry.render().splitlines()
+
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry(LocalMetricsBackend())
+        registry.inc('cache_hits_total', 2, cache='user_payload')
+        registry.inc('cache_hits_total', cache='user_payload')
+        registry.set('db_pool_size', 4, alias='default')
+        lines = self.render_lines(registry)
+        self.assertIn('# TYPE cache_hits_total counter', lines)
+        self.assertIn('cache_hits_total{cache="user_payload"} 3', lines)
+        self.assertIn('# TYPE db_pool_size gauge', lines)
+        self.assertIn('db_pool_size{alias="default"} 4', lines)
+
+    def test_label_escaping(self):
+        registry = MetricsRegistry(LocalMetricsBackend())
+        registry.inc('api_requests_total', view='a"b\\c\nd', status=200)
+        self.assertIn(
+            'api_requests_total{status="200",view="a\\"b\\\\c\\nd"} 1',
+            self.render_lines(registry),
+        )
+
+    def test_histogram(self):
+        registry = MetricsRegistry(LocalMetricsBackend())
+        for value in (0.003, 0.02, 0.02, 20.0):
+            registry.observe('api_request_duration_seconds', value, view='v')
+        lines = self.render_lines(registry)
+        name = 'api_request_duration_seconds'
+        self.assertIn(f'{name}_bucket{{view="v",le="0.005"}} 1', lines)
+        self.assertIn(f'{name}_bucket{{view="v",le="0.025"}} 3', lines)
+        self.assertIn(f'{name}_bucket{{view="v",le="10.0"}} 3', lines)
+        self.assertIn(f'{name}_bucket{{view="v",le="+Inf"}} 4', lines)
+        self.assertIn(f'{name}_count{{view="v"}} 4', lines)
+        self.assertIn(f'{name}_sum{{view="v"}} 20.043', lines)
+
+    def test_undeclared_metric(self):
+        registry = MetricsRegistry(LocalMetricsBackend())
+        with self.assertRaises(KeyError):
+            registry.inc('undeclared_total')
+
+    def test_file_backend_sums_processes(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('product.metrics.atexit'):
+            first = MetricsRegistry(
+                FileMetricsBackend(directory, flush_interval=0))
+            second = MetricsRegistry(
+                FileMetricsBackend(directory, flush_interval=0))
+            first.inc('statistic_writes_total', 2, source='bulk')
+            second.inc('statistic_writes_total', 3, source='bulk')
+            first.set('db_pool_size', 1, alias='default')
+            second.set('db_pool_size', 2, alias='default')
+            # Файл завершившегося процесса: его показатели не учитываются.
+            with open(os.path.join(
+                    directory, 'metrics-99999999-dead.json'), 'w') as output:
+                json.dump([
+                    ['statistic_writes_total', [['source', 'bulk']], 5],
+                    ['db_pool_size', [['alias', 'default']], 10],
+                ], output)
+            lines = self.render_lines(first)
+        self.assertIn('statistic_writes_total{source="bulk"} 10', lines)
+        self.assertIn('db_pool_size{alias="default"} 3', lines)
+
+    def test_metrics_view(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'# TYPE api_requests_total counter', response.content)
+
+
+class SetProductAccessTests(TestCase):
+    """
+    Массовое изменение доступа к продукту возвращает количество
+    изменённых доступов и несуществующих пользователей и обновляет
+    счётчики ProductStats.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Продукт',
+            slug='product',
+            text='Описание',
+            owner=User.objects.create(username='owner'),
+        )
+        cls.users = [
+            User.objects.create(username=f'student-{number}')
+            for number in range(5)
+        ]
+        cls.user_ids = [user.pk for user in cls.users]
+
+    def stats(self):
+        return ProductStats.objects.values(
+            'num_accesses', 'num_students').get(product=self.product)
+
+    def test_grant(self):
+        missing_id = max(self.user_ids) + 100
+        changed, missing = set_product_access(
+            self.product.pk,
+            self.user_ids[:3] + [self.user_ids[0], missing_id],
+            chunk_size=2,
+        )
+        self.assertEqual((changed, missing), (3, [missing_id]))
+        self.assertEqual(
+            self.stats(), {'num_accesses': 3, 'num_students': 3})
+        self.assertEqual(verify_product_stats(), [])
+
+        # Повторное предоставление меняет только новые доступы.
+        changed, missing = set_product_access(
+            self.product.pk, self.user_ids, chunk_size=2)
+        self.assertEqual((changed, missing), (2, []))
+        self.assertEqual(
+            self.stats(), {'num_accesses': 5, 'num_students': 5})
+
+    def test_revoke(self):
+        Access.objects.create(
+            user=self.users[0], product=self.product, access_granted=False)
+        set_product_access(self.product.pk, self.user_ids[1:3])
+        changed, missing = set_product_access(
+            self.product.pk, self.user_ids, access_granted=False)
+        self.assertEqual((changed, missing), (2, []))
+        self.assertEqual(
+            self.stats(), {'num_accesses': 3, 'num_students': 0})
+        self.assertEqual(verify_product_stats(), [])
+        self.assertFalse(
+            Access.objects.filter(access_granted=True).exists())
+
+    def test_command_with_csv(self):
+        csv_file = io.StringIO(
+            'username\n' + '\n'.join(
+                user.username for user in self.users[:2]) + '\nunknown\n')
+        stdout = io.StringIO()
+        with mock.patch('sys.stdin', csv_file):
+            call_command(
+                'set_product_access', self.product.slug, '--csv', '-',
+                stdout=stdout)
+        self.assertIn(
+            'Изменено доступов к продукту product: 2', stdout.getvalue())
+        self.assertEqual(
+            self.stats(), {'num_accesses': 2, 'num_students': 2})
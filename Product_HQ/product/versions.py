@@ -0,0 +1,41 @@
+"""
+Модуль, содержащий версии данных пользователей и продуктов.
+
+Версия данных пользователя — счётчик Counter, увеличиваемый при каждой
+записи его доступов и статистики. Вместе с датами изменения продуктов
+и уроков она служит валидатором условных HTTP-запросов к данным
+пользователя. Версии обновляются обработчиками сигналов в той же
+транзакции, что и изменённые данные.
+"""
+
+from django.utils import timezone
+
+from product.models import Counter, Product
+
+
+def user_version_name(user_id):
+    """
+    Возвращает имя счётчика версии данных пользователя.
+    - user_id: Идентификатор пользователя.
+    """
+    return f'user-version:{user_id}'
+
+
+def bump_user_versions(user_ids):
+    """
+    Увеличивает версии данных пользователей.
+    - user_ids: Идентификаторы пользователей.
+    """
+    Counter.increment(user_version_name(user_id) for user_id in user_ids)
+
+
+def touch_products(product_ids):
+    """
+    Обновляет дату изменения продуктов, например при изменении списка
+    их уроков, которое не сохраняет сам продукт.
+    - product_ids: Идентификаторы продуктов.
+    """
+    product_ids = set(product_ids)
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(
+            updated_at=timezone.now())